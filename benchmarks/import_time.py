@@ -0,0 +1,137 @@
+"""
+Check that the core random walk API imports quickly, without heavy dependencies.
+
+Every batch job and joblib worker process pays the import cost of the modules it uses.
+This script imports each module in a fresh Python process, several times, and fails if
+the fastest import exceeds the time budget, or if it loads a heavy optional dependency
+(networkx, matplotlib, tqdm, joblib, bs4, BigQuery) that should only load on first use.
+
+Run it from the root of the repository:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget 1.5 --repeats 5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+# the modules making up the core walk API
+CORE_MODULES = [
+    "src.utils.walk_engine",
+    "src.utils.csr_graph",
+    "src.utils.randomwalks",
+    "src.utils.create_functional_network",
+    "src.make_data.make_topology_matrix",
+]
+
+# dependencies that should only be imported by the functions that use them
+HEAVY_MODULES = [
+    "networkx",
+    "matplotlib",
+    "tqdm",
+    "joblib",
+    "bs4",
+    "google.cloud.bigquery",
+    "scipy.stats",
+]
+
+# default import time budget, in seconds, per module
+DEFAULT_BUDGET = 1.0
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def time_import(module: str, repeats: int = 3) -> Dict:
+    """
+    Time importing `module` in fresh Python processes.
+
+    Args:
+        module: the dotted module name
+        repeats: the number of processes to time
+    Returns:
+        A dictionary with the fastest import time in `seconds`, and the heavy modules
+        loaded by the import, `heavy`.
+    """
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    probes = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        probes.append(json.loads(output.strip().splitlines()[-1]))
+
+    return {
+        "seconds": min(probe["seconds"] for probe in probes),
+        "heavy": probes[0]["heavy"],
+    }
+
+
+def check_imports(
+    modules: List[str], budget: float = DEFAULT_BUDGET, repeats: int = 3
+) -> List[str]:
+    """
+    Time the import of each module, and report those over budget.
+
+    Args:
+        modules: the dotted module names
+        budget: the import time budget, in seconds, per module
+        repeats: the number of processes to time per module
+    Returns:
+        A list of failure messages; empty if every module is within budget.
+    """
+    failures = []
+    for module in modules:
+        result = time_import(module, repeats=repeats)
+        print(f"{module:45s} {result['seconds']:6.3f}s  {', '.join(result['heavy'])}")
+        if result["seconds"] > budget:
+            failures.append(
+                f"{module} took {result['seconds']:.3f}s to import "
+                f"(budget {budget:.3f}s)"
+            )
+        if result["heavy"]:
+            failures.append(f"{module} imports {', '.join(result['heavy'])}")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=float(os.getenv("IMPORT_TIME_BUDGET", DEFAULT_BUDGET)),
+        help="import time budget in seconds, per module",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=3, help="processes to time per module"
+    )
+    parser.add_argument("modules", nargs="*", default=CORE_MODULES)
+    args = parser.parse_args()
+
+    failures = check_imports(args.modules, budget=args.budget, repeats=args.repeats)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
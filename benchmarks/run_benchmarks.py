@@ -0,0 +1,356 @@
+"""
+Time and memory-profile each stage of the functional network pipeline on synthetic
+data, and compare the results with a stored baseline.
+
+The data come from the deterministic generators in `src.make_data.make_synthetic_data`,
+so every run at a given scale works on identical inputs. Each stage is timed with
+`time.perf_counter`, and its peak Python memory allocation (including numpy and pandas
+buffers) is measured with `tracemalloc`.
+
+Run it from the root of the repository:
+
+    python benchmarks/run_benchmarks.py --scale tiny
+    python benchmarks/run_benchmarks.py --scale small --save-baseline
+    python benchmarks/run_benchmarks.py --nodes 20000 --hits 500000
+
+Baselines are JSON files in `benchmarks/baselines`, one per scale; only the `tiny`
+baseline is committed. Without `--save-baseline`, each stage is compared with the
+baseline. The run fails if a stage's peak memory is more than `--memory-tolerance`
+times the baseline's: the inputs are identical on every run, so peak memory only
+changes when the code does. Stages more than `--tolerance` times slower are reported,
+but timings vary with the machine and its load, so they only fail the run with
+`--strict-timing`. Stages taking less than `--min-seconds`, or allocating less than
+`--min-mb`, in both runs are not compared, as their measurements are mostly noise.
+Tracing memory slows some stages down, so runs are only compared with baselines saved
+with the same `--no-memory` setting.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.make_data import make_synthetic_data  # noqa: E402
+
+BASELINES = Path(__file__).resolve().parent / "baselines"
+
+# number of pages and page hits at each scale
+SCALES = {
+    "tiny": {"nodes": 2_000, "hits": 100_000},
+    "small": {"nodes": 10_000, "hits": 1_000_000},
+    "medium": {"nodes": 100_000, "hits": 10_000_000},
+    "large": {"nodes": 1_000_000, "hits": 100_000_000},
+}
+
+# random walk settings for the walk stages
+WALKS = {"steps": 50, "repeats": 100, "seeds": 10}
+
+# pages in the topology matrix stage; `create_topology_matrix_pd` is dense
+TOPOLOGY_PAGES = 2_000
+
+
+def measure(stage: Callable, memory: bool = True) -> Dict:
+    """
+    Run one pipeline stage, timing it and measuring its peak memory allocation.
+
+    Args:
+        stage: a function with no arguments
+        memory: if False, do not trace memory, which slows down some stages
+    Returns:
+        A dictionary with the stage's `result`, `seconds` and `peak_mb`.
+    """
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = stage()
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if memory:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    return {"result": result, "seconds": seconds, "peak_mb": peak_mb}
+
+
+def run_pipeline(nodes: int, hits: int, memory: bool = True, seed: int = 0) -> Dict:
+    """
+    Run every stage of the pipeline on synthetic data.
+
+    Args:
+        nodes: the number of pages in the synthetic graph
+        hits: the approximate number of page hits in the synthetic sessions
+        memory: if False, do not measure memory
+        seed: the random seed of the generators
+    Returns:
+        A dictionary of stage name: dictionary of `seconds` and `peak_mb`.
+    """
+    from src.make_data.make_topology_matrix import create_topology_matrix_pd
+    from src.utils.create_functional_network import (
+        create_networkx_graph,
+        extract_nodes_and_edges,
+    )
+    from src.utils.randomwalks import (
+        get_transition_matrix,
+        page_freq_path_freq_ranking,
+        reformat_graph,
+        repeat_random_walks,
+    )
+
+    stages = {}
+
+    def run(name, stage):
+        stages[name] = measure(stage, memory=memory)
+        print(
+            f"{name:30s} {stages[name]['seconds']:9.3f}s",
+            (
+                ""
+                if stages[name]["peak_mb"] is None
+                else f"{stages[name]['peak_mb']:9.1f}MB"
+            ),
+        )
+        return stages[name]["result"]
+
+    graph = run(
+        "power_law_graph",
+        lambda: make_synthetic_data.power_law_graph(nodes, seed=seed),
+    )
+    sessions = run(
+        "session_hits",
+        lambda: make_synthetic_data.session_hits(hits, graph, seed=seed),
+    )
+    nodes_df, edges_df = run(
+        "extract_nodes_and_edges", lambda: extract_nodes_and_edges(sessions.copy())
+    )
+    G = run("create_networkx_graph", lambda: create_networkx_graph(nodes_df, edges_df))
+    G = run("reformat_graph", lambda: reformat_graph(G))
+    T = run("get_transition_matrix", lambda: get_transition_matrix(G))
+
+    seeds = sessions["pagePath"].value_counts().index[: WALKS["seeds"]].tolist()
+    results = run(
+        "repeat_random_walks",
+        lambda: repeat_random_walks(
+            WALKS["steps"],
+            WALKS["repeats"],
+            T,
+            G,
+            seeds,
+            True,
+            "union",
+            1,
+            verbose=0,
+            random_state=seed,
+        ),
+    )
+    run("page_freq_path_freq_ranking", lambda: page_freq_path_freq_ranking(results))
+
+    links = make_synthetic_data.page_links(graph, pages=min(TOPOLOGY_PAGES, nodes))
+    run("create_topology_matrix_pd", lambda: create_topology_matrix_pd(links))
+
+    return {
+        name: {"seconds": stage["seconds"], "peak_mb": stage["peak_mb"]}
+        for name, stage in stages.items()
+    }
+
+
+def git_commit() -> Optional[str]:
+    """The current git commit, if the repository is a git repository."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _over(
+    name: str,
+    value: float,
+    baseline: float,
+    tolerance: float,
+    minimum: float,
+    unit: str,
+) -> bool:
+    """
+    Print the ratio of a stage's measurement to the baseline's. Measurements under
+    `minimum` in both runs are not compared.
+
+    Returns:
+        True if the ratio is over `tolerance`.
+    """
+    ratio = value / max(baseline, 1e-9)
+    if max(value, baseline) < minimum:
+        print(f"{name:30s} {ratio:6.2f}x (under {minimum}{unit}, not compared)")
+        return False
+
+    print(f"{name:30s} {ratio:6.2f}x")
+    return ratio > tolerance
+
+
+def compare(
+    run: Dict,
+    baseline: Dict,
+    tolerance: float,
+    min_seconds: float = 0.5,
+    memory_tolerance: float = 1.1,
+    min_mb: float = 1.0,
+    strict_timing: bool = False,
+) -> list:
+    """
+    Compare the stage timings and peak memory of a run with a baseline.
+
+    Args:
+        run: the benchmark record of this run
+        baseline: a stored benchmark record at the same scale
+        tolerance: the largest acceptable ratio of this run's time to the baseline's
+        min_seconds: stages faster than this in both the run and the baseline are
+                     shown, but never compared
+        memory_tolerance: the largest acceptable ratio of this run's peak memory to
+                          the baseline's
+        min_mb: stages allocating less than this in both runs are never compared
+        strict_timing: if True, stages slower than `tolerance` times the baseline
+                       fail; otherwise they are only reported
+    Returns:
+        A list of failure messages, for stages over `memory_tolerance` times the
+        baseline's peak memory and, with `strict_timing`, over `tolerance` times its
+        time.
+    """
+    if run["memory"] != baseline.get("memory", True):
+        return ["the baseline was saved with a different --no-memory setting"]
+
+    stages = [name for name in run["stages"] if name in baseline["stages"]]
+    failures = []
+
+    print(f"\nTime compared with the baseline from commit {baseline.get('commit')}:")
+    slower = [
+        name
+        for name in stages
+        if _over(
+            name,
+            run["stages"][name]["seconds"],
+            baseline["stages"][name]["seconds"],
+            tolerance,
+            min_seconds,
+            "s",
+        )
+    ]
+    for name in slower:
+        message = f"{name} is over {tolerance}x slower than the baseline"
+        if strict_timing:
+            failures.append(message)
+        else:
+            print(f"{message} (not enforced; see --strict-timing)")
+
+    if run["memory"]:
+        print("\nPeak memory compared with the baseline:")
+        failures += [
+            f"{name} uses over {memory_tolerance}x the baseline's peak memory"
+            for name in stages
+            if _over(
+                name,
+                run["stages"][name]["peak_mb"],
+                baseline["stages"][name]["peak_mb"],
+                memory_tolerance,
+                min_mb,
+                "MB",
+            )
+        ]
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--nodes", type=int, help="override the number of pages")
+    parser.add_argument("--hits", type=int, help="override the number of page hits")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="report stages this many times slower than the baseline",
+    )
+    parser.add_argument(
+        "--strict-timing",
+        action="store_true",
+        help="fail, rather than only report, if a stage is slower than --tolerance",
+    )
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.5,
+        help="do not compare stages faster than this in both runs",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=1.1,
+        help="fail if a stage's peak memory is this many times the baseline's",
+    )
+    parser.add_argument(
+        "--min-mb",
+        type=float,
+        default=1.0,
+        help="do not compare the memory of stages allocating less than this",
+    )
+    args = parser.parse_args()
+
+    nodes = args.nodes or SCALES[args.scale]["nodes"]
+    hits = args.hits or SCALES[args.scale]["hits"]
+    custom = args.nodes is not None or args.hits is not None
+    name = f"nodes{nodes}_hits{hits}" if custom else args.scale
+    print(f"Benchmarking {name}: {nodes} pages, {hits} page hits\n")
+
+    record = {
+        "scale": name,
+        "nodes": nodes,
+        "hits": hits,
+        "seed": args.seed,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "memory": not args.no_memory,
+        "stages": run_pipeline(nodes, hits, memory=not args.no_memory, seed=args.seed),
+    }
+
+    path = Path(BASELINES, f"{name}.json")
+    if args.save_baseline:
+        BASELINES.mkdir(exist_ok=True)
+        path.write_text(json.dumps(record, indent=2) + "\n")
+        print(f"\nSaved the baseline to {path}")
+        return
+
+    if not path.exists():
+        print(f"\nNo baseline at {path}; save one with --save-baseline")
+        return
+
+    failures = compare(
+        record,
+        json.loads(path.read_text()),
+        args.tolerance,
+        min_seconds=args.min_seconds,
+        memory_tolerance=args.memory_tolerance,
+        min_mb=args.min_mb,
+        strict_timing=args.strict_timing,
+    )
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Detect boilerplate hyperlinks, such as the GOV.UK header, footer and navigation links,
+so they do not become hubs in the structural or functional graphs.
+
+Two complementary methods are provided:
+
+- `extract_links` drops the links inside boilerplate page regions (`<header>`,
+  `<footer>` and `<nav>` elements, and elements with the ARIA roles `banner`,
+  `contentinfo` and `navigation`) while extracting hyperlinks from HTML. Regions
+  inside the page's `<main>` element are kept, as they hold content links, e.g. the
+  contents list of a guide.
+- `LinkFrequencyIndex` counts how many pages of an HTML corpus link to each page, and
+  flags links on more than a given fraction of pages as boilerplate. This catches
+  site-wide links outside the standard regions, and adapts as the site changes.
+
+The index counts links by the page they point to, without any `#fragment` or `?query`
+(see `normalise_link`), so an index built from `process_links()`, which strips them,
+matches links from `process_page_links()`, which keeps them.
+
+Build the index once over the whole ingested corpus, and pass it to
+`identify_seed_pages`:
+
+    page_links = process_links(ingested_links)  # from `ingest_html`
+    LinkFrequencyIndex.from_page_links(page_links).save("link_index.json")
+    seed1_pages = identify_seed_pages(seed0_pages, link_index="link_index.json")
+
+Without a `link_index`, `identify_seed_pages` indexes only the seed0 pages, which flags
+nothing unless there are at least `min_pages` of them, so stripping boilerplate regions
+is then the only protection against boilerplate links.
+"""
+
+import json
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+import pandas as pd
+
+# ARIA roles of boilerplate page regions
+BOILERPLATE_ROLES = ("banner", "contentinfo", "navigation")
+
+# HTML elements of boilerplate page regions
+BOILERPLATE_TAGS = ("header", "footer", "nav")
+
+
+def normalise_link(link: str) -> str:
+    """
+    The page a processed link points to: the link without its `#fragment` or `?query`,
+    as `process_links()` standardises it.
+    """
+    return re.split("[#?]", link)[0]
+
+
+def _is_boilerplate(tag) -> bool:
+    """Whether a BeautifulSoup tag is a boilerplate region outside `<main>`."""
+    return (
+        tag.name in BOILERPLATE_TAGS or tag.get("role") in BOILERPLATE_ROLES
+    ) and tag.find_parent("main") is None
+
+
+def extract_links(
+    html: str, strip_regions: bool = True, features: Optional[str] = None
+) -> List[Optional[str]]:
+    """
+    Extract the `href` of every `<a>` element in an HTML page.
+
+    Args:
+        html: the HTML of a page
+        strip_regions: if True, ignore links in boilerplate regions outside `<main>`;
+                       see `BOILERPLATE_TAGS` and `BOILERPLATE_ROLES`
+        features: the BeautifulSoup parser, e.g. "lxml". Defaults to the best
+                  installed parser.
+    Returns:
+        A list of `href` values, in page order; None for `<a>` elements without one.
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    if not strip_regions:
+        soup = BeautifulSoup(html, features=features, parse_only=SoupStrainer("a"))
+        return [link.get("href") for link in soup.find_all("a")]
+
+    soup = BeautifulSoup(html, features=features)
+    for region in soup.find_all(_is_boilerplate):
+        # a region may sit inside one already removed
+        if not region.decomposed:
+            region.decompose()
+
+    return [link.get("href") for link in soup.find_all("a")]
+
+
+class LinkFrequencyIndex:
+    """
+    The number of pages linking to each page, over a corpus of pages. Links are counted
+    by `normalise_link`, so links to sections of a page count as links to the page.
+
+    Attributes:
+        n_pages: the number of pages added
+        counts: a `collections.Counter` of linked page: number of pages linking to it
+    """
+
+    def __init__(self):
+        self.n_pages = 0
+        self.counts = Counter()
+
+    @classmethod
+    def from_page_links(cls, page_links: Dict[str, Iterable[str]]):
+        """
+        Build an index from the hyperlinks of a corpus of pages.
+
+        Args:
+            page_links: a dictionary of page: list of linked pages, e.g. from
+                        `process_links()` or `process_page_links()`
+        Returns:
+            A `LinkFrequencyIndex`.
+        """
+        index = cls()
+        index.add(page_links)
+
+        return index
+
+    def add(self, page_links: Dict[str, Iterable[str]]) -> None:
+        """
+        Add pages to the index. Each page counts once per link, however many times it
+        repeats the link; adding the same page twice counts it twice.
+
+        Args:
+            page_links: a dictionary of page: list of linked pages
+        """
+        for links in page_links.values():
+            self.counts.update({normalise_link(link) for link in links})
+        self.n_pages += len(page_links)
+
+    def fractions(self) -> pd.Series:
+        """The fraction of pages linking to each page, highest first."""
+        counts = pd.Series(self.counts, dtype="float64")
+        return (counts / max(self.n_pages, 1)).sort_values(ascending=False)
+
+    def boilerplate(self, max_fraction: float = 0.5, min_pages: int = 20) -> Set[str]:
+        """
+        The pages linked to from more than `max_fraction` of the pages in the index.
+
+        Args:
+            max_fraction: the largest fraction of pages a content link appears on
+            min_pages: flag nothing until the index has this many pages, since in a
+                       small corpus, such as a few seed pages of one journey, shared
+                       content links are common
+        Returns:
+            A set of boilerplate links, as normalised by `normalise_link`.
+        """
+        if self.n_pages < min_pages:
+            return set()
+
+        fractions = self.fractions()
+        return set(fractions.index[fractions > max_fraction])
+
+    def save(self, path: str) -> None:
+        """Write the index to a JSON file."""
+        with open(path, "w") as f:
+            json.dump({"n_pages": self.n_pages, "counts": dict(self.counts)}, f)
+
+    @classmethod
+    def load(cls, path: str):
+        """Read an index written by `save()`."""
+        with open(path) as f:
+            data = json.load(f)
+        index = cls()
+        index.n_pages = data["n_pages"]
+        index.counts = Counter(data["counts"])
+
+        return index
@@ -0,0 +1,212 @@
+"""
+An in-memory stand-in for `google.cloud.bigquery.Client`, for running the seed session
+extraction in `src.utils.create_functional_network` and `src.utils.session_shards`
+without BigQuery.
+
+The fake does not parse SQL. It answers the `extract_seed_sessions` query from its
+query parameters (`startDate`, `endDate`, `seed0Pages`, `seed1Pages` and
+`samplePercent`), and the page session hits query of `extract_seed_sessions_sharded`
+in `src.utils.session_shards` from its `pages` parameter instead of the seed pages.
+It answers them over a dataframe of page hits with a `date` column, the suffix of the
+daily table each hit is in. Hits are expected to be clean already: document types are
+not filtered and URLs are not truncated. Sessions are sampled with a SHA-256 hash of
+`sessionId` instead of `FARM_FINGERPRINT`. Use `daily_tables` to spread synthetic
+hits, e.g. from `src.make_data.make_synthetic_data.session_hits`, over dates:
+
+    hits = daily_tables(session_hits(100_000), "20220101", n_days=28)
+    client = FakeBigQueryClient(hits)
+    df = extract_seed_sessions("20220101", "20220128", seed0, seed1, client=client)
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = "%Y%m%d"
+
+
+def daily_tables(
+    hits: pd.DataFrame,
+    start_date: str,
+    n_days: int,
+    midnight_fraction: float = 0.02,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Spread sessions over daily tables, splitting some at midnight as Universal
+    Analytics does: the later part keeps the `sessionId`, is in the next day's table,
+    starts again at `hitNumber` 1 and is flagged as an entrance, and the last hit of
+    the earlier part is flagged as an exit.
+
+    Args:
+        hits: page hits in the schema of `extract_seed_sessions`, ordered by
+              `sessionId` and `hitNumber`, such as from `session_hits`
+        start_date: the first date, as YYYYMMDD
+        n_days: the number of days
+        midnight_fraction: the fraction of sessions with more than one hit that are
+                           split at midnight, except on the last day
+        seed: the random seed
+    Returns:
+        A copy of `hits` with a `date` column, as YYYYMMDD.
+    """
+    rng = np.random.default_rng(seed)
+    hits = hits.reset_index(drop=True)
+    session_codes, sessions = pd.factorize(hits["sessionId"])
+    day = rng.integers(0, n_days, len(sessions))
+    length = np.bincount(session_codes, minlength=len(sessions))
+
+    # split a session after a random hit, which is never its last
+    split = (rng.random(len(sessions)) < midnight_fraction) & (length > 1)
+    split &= day < n_days - 1
+    split_after = np.where(split, rng.integers(1, np.maximum(length, 2)), length)
+
+    hit_number = hits["hitNumber"].to_numpy()
+    after = hit_number > split_after[session_codes]
+    start = datetime.strptime(start_date, DATE_FORMAT)
+    dates = np.array(
+        [(start + timedelta(days=i)).strftime(DATE_FORMAT) for i in range(n_days)],
+        dtype=object,
+    )
+
+    hits = hits.assign(date=dates[day[session_codes] + after])
+    hits["hitNumber"] = np.where(
+        after, hit_number - split_after[session_codes], hit_number
+    )
+    hits["isEntrance"] = np.where(
+        after & (hits["hitNumber"] == 1), True, hits["isEntrance"]
+    )
+    last_before = split[session_codes] & (hit_number == split_after[session_codes])
+    hits["isExit"] = np.where(last_before, True, hits["isExit"])
+
+    return hits
+
+
+def sample_bucket(session_ids: pd.Series) -> np.ndarray:
+    """
+    The sampling bucket, from 0 to 99, of each session, standing in for
+    `FARM_FINGERPRINT(sessionId)` modulo 100.
+    """
+    return np.array(
+        [
+            int(hashlib.sha256(str(session_id).encode()).hexdigest(), 16) % 100
+            for session_id in session_ids
+        ]
+    )
+
+
+class FakeBigQueryClient:
+    """
+    A client-compatible fake answering the `extract_seed_sessions` query, and the page
+    session hits query of `extract_seed_sessions_sharded`.
+
+    Args:
+        hits: page hits in the schema of `extract_seed_sessions`, with a `date`
+              column; see `daily_tables`
+        seconds_per_day: how long a query takes per day of its date range, to
+                         simulate slow jobs
+
+    Attributes:
+        queries: the parameters of every query run, in order
+        max_running: the most queries that ran at once
+    """
+
+    def __init__(self, hits: pd.DataFrame, seconds_per_day: float = 0.0):
+        self.hits = hits
+        self.seconds_per_day = seconds_per_day
+        self.queries: List[Dict] = []
+        self.max_running = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def query(self, query: str, job_config=None, **kwargs) -> "FakeQueryJob":
+        """Start a query; `job_config.query_parameters` holds its parameters."""
+        parameters = {}
+        for parameter in job_config.query_parameters:
+            # array parameters have `values`, scalar parameters a `value`
+            parameters[parameter.name] = (
+                parameter.values if hasattr(parameter, "values") else parameter.value
+            )
+        with self._lock:
+            self.queries.append(parameters)
+
+        return FakeQueryJob(self, parameters)
+
+    def _run(self, parameters: Dict) -> pd.DataFrame:
+        """The result of the seed sessions, or page session hits, query."""
+        with self._lock:
+            self._running += 1
+            self.max_running = max(self.max_running, self._running)
+        try:
+            start = datetime.strptime(parameters["startDate"], DATE_FORMAT)
+            end = datetime.strptime(parameters["endDate"], DATE_FORMAT)
+            time.sleep(self.seconds_per_day * ((end - start).days + 1))
+
+            hits = self.hits[
+                (self.hits["date"] >= parameters["startDate"])
+                & (self.hits["date"] <= parameters["endDate"])
+            ]
+            hits = hits[
+                sample_bucket(hits["sessionId"]) < parameters.get("samplePercent", 100)
+            ]
+            session_hits = hits.groupby("pagePath")["sessionId"].nunique()
+            if "pages" in parameters:
+                pages = session_hits.index.isin(parameters["pages"])
+                return session_hits[pages].rename("sessionHits").reset_index()
+
+            seeds = set(parameters["seed0Pages"]) | set(parameters["seed1Pages"])
+            sessions = hits.loc[hits["pagePath"].isin(seeds), "sessionId"].unique()
+            result = hits[hits["sessionId"].isin(sessions)].drop(
+                columns=["date", "sessionHits"]
+            )
+            result = result.sort_values(["sessionId", "hitNumber"], kind="stable")
+            result["sessionHits"] = result["pagePath"].map(session_hits)
+
+            return result.reset_index(drop=True)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+
+class FakeQueryJob:
+    """A query job of `FakeBigQueryClient`; the query runs when its result is read."""
+
+    def __init__(self, client: FakeBigQueryClient, parameters: Dict):
+        self.client = client
+        self.parameters = parameters
+        self._result: Optional[pd.DataFrame] = None
+
+    def result(self, page_size: Optional[int] = None, **kwargs) -> "FakeRowIterator":
+        """Wait for the query to finish."""
+        if self._result is None:
+            self._result = self.client._run(self.parameters)
+
+        return FakeRowIterator(self._result, page_size)
+
+    def to_dataframe(self, **kwargs) -> pd.DataFrame:
+        return self.result().to_dataframe()
+
+
+class FakeRowIterator:
+    """The rows of a query result, downloaded in pages of `page_size` rows."""
+
+    def __init__(self, result: pd.DataFrame, page_size: Optional[int] = None):
+        self._result = result
+        self.page_size = page_size or max(len(result), 1)
+
+    @property
+    def total_rows(self) -> int:
+        return len(self._result)
+
+    def to_dataframe(self, **kwargs) -> pd.DataFrame:
+        return self._result.copy()
+
+    def to_dataframe_iterable(self, **kwargs) -> Iterator[pd.DataFrame]:
+        for first in range(0, len(self._result), self.page_size):
+            yield self._result.iloc[first : first + self.page_size].reset_index(
+                drop=True
+            )
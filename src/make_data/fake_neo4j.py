@@ -0,0 +1,111 @@
+"""
+An in-memory stand-in for the `neo4j` driver, for running the knowledge graph export
+in `src.make_data.neo4j_export` without a database.
+
+The fake does not parse Cypher. It answers the paged relationship query built by
+`stream_edges()` from its parameters (`edgeTypes`, `after`, `limit` and
+`weightProperty`). A custom `where` condition cannot be evaluated, so give the fake a
+Python `where` predicate that does the same filtering instead, e.g.
+
+    driver = InMemoryNeo4jDriver(
+        relationships,
+        where=lambda u, r, v, parameters: u["contentID"] in parameters["contentId"],
+    )
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+class InMemoryNeo4jDriver:
+    """
+    A driver-compatible fake holding nodes and relationships in memory.
+
+    Args:
+        relationships: an iterable of dictionaries with the keys `source` and
+                       `destination` (node names), `type`, and optionally `properties`
+                       (a dictionary, e.g. {"weight": 3})
+        nodes: an optional dictionary of node name: properties, for `where`
+        where: an optional predicate `where(u, r, v, parameters)` on the properties of
+               the source node, relationship and destination node
+    """
+
+    def __init__(
+        self,
+        relationships: Iterable[Dict],
+        nodes: Optional[Dict[str, Dict]] = None,
+        where: Optional[Callable] = None,
+    ):
+        self.relationships = [
+            {
+                "id": i,
+                "source": relationship["source"],
+                "destination": relationship["destination"],
+                "type": relationship["type"],
+                "properties": dict(relationship.get("properties", {})),
+            }
+            for i, relationship in enumerate(relationships)
+        ]
+        self.nodes = nodes or {}
+        self.where = where
+        self.queries: List[Dict] = []
+
+    def session(self, **kwargs) -> "InMemoryNeo4jSession":
+        return InMemoryNeo4jSession(self)
+
+    def close(self):
+        pass
+
+
+class InMemoryNeo4jSession:
+    """A session of `InMemoryNeo4jDriver`; usable as a context manager."""
+
+    def __init__(self, driver: InMemoryNeo4jDriver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def run(self, query: str, parameters: Optional[Dict] = None, **kwargs) -> List:
+        """
+        Answer one page of the relationship export query.
+
+        Returns:
+            A list of records, as dictionaries keyed by the query's return columns.
+        """
+        parameters = {**(parameters or {}), **kwargs}
+        self.driver.queries.append({"query": query, "parameters": parameters})
+
+        edge_types = set(parameters["edgeTypes"])
+        weight_property = parameters["weightProperty"]
+        records = []
+        for relationship in self.driver.relationships:
+            if relationship["id"] <= parameters["after"]:
+                continue
+            if relationship["type"] not in edge_types:
+                continue
+            if self.driver.where is not None and not self.driver.where(
+                self.driver.nodes.get(relationship["source"], {}),
+                relationship["properties"],
+                self.driver.nodes.get(relationship["destination"], {}),
+                parameters,
+            ):
+                continue
+            records.append(
+                {
+                    "edgeId": relationship["id"],
+                    "source": relationship["source"],
+                    "destination": relationship["destination"],
+                    "edgeType": relationship["type"],
+                    "weight": relationship["properties"].get(weight_property),
+                }
+            )
+            if len(records) == parameters["limit"]:
+                break
+
+        return records
@@ -0,0 +1,214 @@
+"""
+Deterministic synthetic GOV.UK-like data, for benchmarks and for running the pipeline
+without BigQuery.
+
+- `power_law_graph` builds a directed graph whose in- and out-degrees follow power
+  laws, like the hyperlink and user movement networks of GOV.UK
+- `session_hits` simulates user sessions as random walks over such a graph, and
+  returns page hits in the schema returned by
+  `src.utils.create_functional_network.extract_seed_sessions`
+- `page_links` turns a graph into the page: hyperlinks dictionary used by
+  `src.make_data.make_topology_matrix.create_topology_matrix_pd`
+
+The same arguments always give the same data.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from src.utils import walk_engine
+from src.utils.csr_graph import CSRGraph
+
+DOCUMENT_TYPES = [
+    "guide",
+    "answer",
+    "detailed_guide",
+    "transaction",
+    "mainstream_browse_page",
+    "step_by_step_nav",
+    "form",
+    "smart_answer",
+    "organisation",
+    "finder",
+]
+
+TAXONS = [
+    "Business and industry",
+    "Money",
+    "Work",
+    "Education, training and skills",
+    "Health and social care",
+    "Transport",
+    "Housing, local and community",
+    "Going and being abroad",
+]
+
+
+def page_slugs(n_pages: int) -> np.ndarray:
+    """The synthetic page paths `/page-0`, `/page-1`, and so on."""
+    return np.array([f"/page-{i}" for i in range(n_pages)], dtype=object)
+
+
+def power_law_graph(
+    n_nodes: int, mean_degree: float = 8, exponent: float = 2.1, seed: int = 0
+) -> CSRGraph:
+    """
+    A directed graph with power-law degree distributions (a directed Chung-Lu graph).
+
+    Each node gets a random popularity with a Pareto tail of index `exponent - 1`.
+    Edges are drawn with source and destination in proportion to popularity, so a
+    few hub pages have many links, as GOV.UK's navigation pages do. Repeated edges are
+    merged, and their count is the edge weight.
+
+    Args:
+        n_nodes: the number of pages
+        mean_degree: the mean number of edges drawn per page, before merging
+        exponent: the power-law exponent of the degree distributions, above 2
+        seed: the random seed
+    Returns:
+        A `CSRGraph` with page paths `/page-0`, `/page-1`, and so on.
+    """
+    rng = np.random.default_rng(seed)
+    n_edges = int(n_nodes * mean_degree)
+
+    popularity = rng.pareto(exponent - 1, size=n_nodes) + 1
+    cumulative = np.cumsum(popularity / popularity.sum())
+
+    # out-links and in-links of a page are independent, so shuffle sources
+    sources = rng.permutation(n_nodes)[
+        np.minimum(np.searchsorted(cumulative, rng.random(n_edges)), n_nodes - 1)
+    ]
+    destinations = np.minimum(
+        np.searchsorted(cumulative, rng.random(n_edges)), n_nodes - 1
+    )
+    keep = sources != destinations
+
+    matrix = csr_matrix(
+        (np.ones(keep.sum()), (sources[keep], destinations[keep])),
+        shape=(n_nodes, n_nodes),
+    )
+    matrix.sum_duplicates()
+
+    return CSRGraph(matrix, page_slugs(n_nodes))
+
+
+def session_hits(
+    n_hits: int,
+    graph: Optional[CSRGraph] = None,
+    mean_session_length: float = 4,
+    max_session_length: int = 30,
+    seed: int = 0,
+    chunk_size: int = 1_000_000,
+) -> pd.DataFrame:
+    """
+    Synthetic page hits, in the schema returned by `extract_seed_sessions`.
+
+    Sessions start at pages in proportion to their number of in-links, and follow the
+    links of `graph` at random, weighted by edge weight. Session lengths are geometric
+    with mean `mean_session_length`, up to `max_session_length`; a session also ends
+    at a page with no links.
+
+    Args:
+        n_hits: the approximate number of page hits
+        graph: the graph to walk. Defaults to `power_law_graph(n_hits // 100)`.
+        mean_session_length: the mean number of hits per session
+        max_session_length: the most hits in a session
+        seed: the random seed
+        chunk_size: the approximate number of hits generated at a time, to bound
+                    memory
+    Returns:
+        A pd.DataFrame with the columns `sessionId`, `hitNumber`, `pagePath`,
+        `documentType`, `topLevelTaxons`, `bottomLevelTaxons`, `isEntrance`, `isExit`
+        and `sessionHits`, ordered by `sessionId` and `hitNumber`.
+    """
+    if graph is None:
+        graph = power_law_graph(max(n_hits // 100, 10), seed=seed)
+
+    rng = np.random.default_rng(seed)
+    arrays = walk_engine.prepare(graph.matrix)
+    in_links = np.asarray(graph.matrix.sum(axis=0)).ravel() + 1
+    start_cumulative = np.cumsum(in_links / in_links.sum())
+
+    n_sessions = max(int(n_hits / mean_session_length), 1)
+    per_chunk = max(int(chunk_size / mean_session_length), 1)
+    chunks = []
+    for first in range(0, n_sessions, per_chunk):
+        size = min(per_chunk, n_sessions - first)
+        starts = np.minimum(
+            np.searchsorted(start_cumulative, rng.random(size)), graph.n_nodes - 1
+        )
+        lengths = np.minimum(
+            rng.geometric(1 / mean_session_length, size=size), max_session_length
+        )
+        paths = walk_engine.walk(arrays, starts, max_session_length - 1, rng=rng)
+        paths[np.arange(max_session_length) >= lengths[:, None]] = walk_engine.STOPPED
+
+        session, position = np.nonzero(paths != walk_engine.STOPPED)
+        chunks.append(
+            pd.DataFrame(
+                {
+                    "session": session + first,
+                    "hitNumber": position + 1,
+                    "node": paths[session, position],
+                }
+            )
+        )
+
+    hits = pd.concat(chunks, ignore_index=True)
+    return _hit_frame(hits, graph.slugs)
+
+
+def _hit_frame(hits: pd.DataFrame, slugs: np.ndarray) -> pd.DataFrame:
+    """Add page metadata and entrance/exit flags to simulated hits."""
+    node = hits["node"].to_numpy()
+    last = np.append(
+        hits["session"].to_numpy()[1:] != hits["session"].to_numpy()[:-1], True
+    )
+
+    # metadata is a fixed function of the page, as in the real data
+    document_types = np.array(DOCUMENT_TYPES, dtype=object)
+    taxons = np.array(TAXONS, dtype=object)
+    session_hits_per_page = hits.drop_duplicates(["session", "node"])[
+        "node"
+    ].value_counts()
+
+    return pd.DataFrame(
+        {
+            "sessionId": "session-" + hits["session"].astype(str).to_numpy(),
+            "hitNumber": hits["hitNumber"].to_numpy(),
+            "pagePath": slugs[node],
+            "documentType": document_types[node % len(document_types)],
+            "topLevelTaxons": taxons[node % len(taxons)],
+            "bottomLevelTaxons": taxons[(node // len(taxons)) % len(taxons)],
+            "isEntrance": np.where(hits["hitNumber"].to_numpy() == 1, True, None),
+            "isExit": np.where(last, True, None),
+            "sessionHits": session_hits_per_page.reindex(node).to_numpy(),
+        }
+    )
+
+
+def page_links(graph: CSRGraph, pages: Optional[int] = None) -> Dict[str, List[str]]:
+    """
+    The hyperlinks of each page, as a dictionary of page path: linked page paths, the
+    input of `create_topology_matrix_pd`.
+
+    Args:
+        graph: a `CSRGraph`
+        pages: only include the links of the first `pages` pages, and only links
+               between them. Defaults to every page.
+    Returns:
+        A dictionary of page path: list of page paths.
+    """
+    matrix = graph.matrix
+    if pages is not None:
+        matrix = matrix[:pages][:, :pages].tocsr()
+
+    return {
+        graph.slugs[i]: graph.slugs[
+            matrix.indices[matrix.indptr[i] : matrix.indptr[i + 1]]
+        ].tolist()
+        for i in range(matrix.shape[0])
+    }
@@ -8,8 +8,8 @@ import pandas as pd
 from urllib.parse import urlparse
 from typing import Union, List, Dict, Optional
 from pathlib import Path, PurePosixPath
-from bs4 import BeautifulSoup, SoupStrainer
-from bs4.element import Doctype
+
+from src.make_data.boilerplate import extract_links
 
 
 def clean_url(url: str) -> Union[str, None]:
@@ -108,26 +108,26 @@ def create_topology_matrix_pd(page_links: Dict[str, List[str]]) -> pd.DataFrame:
 
 
 # Define a function to be iterated over HTML_FILES in parallel
-def ingest_html(file_info: Dict[str, Path]) -> Dict[str, List[str]]:
+def ingest_html(
+    file_info: Dict[str, Path], strip_regions: bool = False
+) -> Dict[str, List[str]]:
     """
     Ingest the hyperlinks in a page and write them to a dictionary, with the
     name of the page as the key.
     Args:
         file_info: A single-item dictionary, key=URL, value=Path to file.
+        strip_regions: If True, ignore links in the header, footer and navigation
+                       regions of the page; see `src.make_data.boilerplate`.
     Returns:
         A single-item dictionary, key=URL, value = list of more URLs linked to
     """
-
     page_hyperlinks_dict = {}
 
     for page_url, filepath in file_info.items():
         with open(filepath, mode="r", encoding="utf-8") as f:
-            links = BeautifulSoup(
-                f.read(), parse_only=SoupStrainer("a"), features="lxml"
+            hrefs = extract_links(
+                f.read(), strip_regions=strip_regions, features="lxml"
             )
-            hrefs = [
-                link.get("href") for link in links if not isinstance(link, Doctype)
-            ]
             page_hyperlinks_dict[page_url] = [
                 url
                 for url in hrefs
@@ -0,0 +1,222 @@
+"""
+Stream edges out of the GOV.UK knowledge graph (Neo4j) into a `GraphStore`.
+
+`getSubgraph` in the notebooks runs `RETURN *`, and builds a networkx graph record by
+record, keeping every node and relationship property. This module instead pages
+through the relationships in fixed-size batches, ordered by relationship id, and only
+returns the page paths at each end, the relationship type and the weight. Each batch
+is written straight into integer CSR arrays.
+
+The `driver` only needs the `session().run(query, parameters)` API of the official
+`neo4j` driver, so `src.make_data.fake_neo4j.InMemoryNeo4jDriver` can be used in its
+place without a database.
+"""
+
+import os
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from src.utils.graph_store import GraphStore
+
+EDGE_QUERY = """
+MATCH (u:{node_label})-[r]->(v:{node_label})
+WHERE type(r) IN $edgeTypes
+    AND id(r) > $after
+    {where}
+RETURN
+    id(r) AS edgeId,
+    u.name AS source,
+    v.name AS destination,
+    type(r) AS edgeType,
+    r[$weightProperty] AS weight
+ORDER BY edgeId
+LIMIT $limit
+"""
+
+
+def get_knowledge_graph_driver():
+    """
+    Connect to the GOV.UK knowledge graph, as in the notebooks. The password is read
+    from the `KG_PWD` environment variable; add `export KG_PWD="<PASSWORD>"` to
+    `.secrets`.
+    """
+    from neo4j import GraphDatabase
+
+    return GraphDatabase.driver(
+        "bolt+s://knowledge-graph.integration.govuk.digital:7687",
+        auth=("neo4j", os.getenv("KG_PWD")),
+    )
+
+
+def stream_edges(
+    driver,
+    edge_types: List[str],
+    where: Optional[str] = None,
+    parameters: Optional[Dict] = None,
+    node_label: str = "Cid",
+    weight_property: str = "weight",
+    batch_size: int = 50000,
+    database: Optional[str] = None,
+):
+    """
+    Page through the relationships of the knowledge graph in batches.
+
+    Args:
+        driver: a `neo4j` driver, or a driver-compatible fake
+        edge_types: the relationship types to export, e.g. ["HYPERLINKS_TO"]
+        where: an optional extra Cypher condition on `u`, `r` and `v`, e.g.
+               "u.contentID IN $contentId AND v.contentID IN $contentId"
+        parameters: parameters used in `where`
+        node_label: the label of the nodes at both ends
+        weight_property: the relationship property holding the weight. Relationships
+                         without it have a weight of 1.
+        batch_size: the number of relationships per batch
+        database: the Neo4j database to use; defaults to the server default
+    Yields:
+        One pd.DataFrame per batch, with the columns `source`, `destination`,
+        `edgeType` and `weight`.
+    """
+    query = EDGE_QUERY.format(
+        node_label=node_label, where="" if where is None else f"AND ({where})"
+    )
+    query_parameters = dict(parameters or {})
+    query_parameters.update(
+        edgeTypes=list(edge_types), weightProperty=weight_property, limit=batch_size
+    )
+
+    after = -1
+    with driver.session(database=database) as session:
+        while True:
+            query_parameters["after"] = after
+            records = [
+                (
+                    record["edgeId"],
+                    record["source"],
+                    record["destination"],
+                    record["edgeType"],
+                    record["weight"],
+                )
+                for record in session.run(query, query_parameters)
+            ]
+            if not records:
+                return
+
+            batch = pd.DataFrame(
+                records,
+                columns=["edgeId", "source", "destination", "edgeType", "weight"],
+            )
+            after = int(batch["edgeId"].iloc[-1])
+            batch["weight"] = batch["weight"].fillna(1).astype(np.float64)
+            yield batch.drop(columns="edgeId")
+
+            if len(records) < batch_size:
+                return
+
+
+def export_to_graph_store(
+    driver,
+    edge_types: List[str],
+    where: Optional[str] = None,
+    parameters: Optional[Dict] = None,
+    node_label: str = "Cid",
+    weight_property: str = "weight",
+    batch_size: int = 50000,
+    database: Optional[str] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    path=None,
+) -> GraphStore:
+    """
+    Export relationships from the knowledge graph into a `GraphStore`, with one CSR
+    layer per relationship type, e.g.
+
+        store = export_to_graph_store(
+            get_knowledge_graph_driver(),
+            ["HYPERLINKS_TO", "USER_MOVEMENT"],
+            where="u.contentID IN $contentId AND v.contentID IN $contentId",
+            parameters={"contentId": content_ids},
+        )
+
+    Page paths are mapped to integer node ids as each batch arrives, so only the
+    integer edge arrays are kept in memory, never the Neo4j records.
+
+    Args:
+        driver: a `neo4j` driver, or a driver-compatible fake
+        edge_types: the relationship types to export
+        where: an optional extra Cypher condition on `u`, `r` and `v`
+        parameters: parameters used in `where`
+        node_label: the label of the nodes at both ends
+        weight_property: the relationship property holding the weight
+        batch_size: the number of relationships per batch
+        database: the Neo4j database to use
+        progress: an optional callback, called after every batch with the number of
+                  batches and relationships loaded so far. Defaults to printing them.
+        path: if given, save the store here with `GraphStore.save()`
+    Returns:
+        A `GraphStore`. Edge types with no relationships have an empty layer.
+    """
+    if progress is None:
+
+        def progress(n_batches, n_edges):
+            print(f"Loaded {n_edges} relationships in {n_batches} batches")
+
+    vocabulary = pd.Index([], dtype=object)
+    rows: Dict[str, List[np.ndarray]] = {edge_type: [] for edge_type in edge_types}
+    cols: Dict[str, List[np.ndarray]] = {edge_type: [] for edge_type in edge_types}
+    weights: Dict[str, List[np.ndarray]] = {edge_type: [] for edge_type in edge_types}
+
+    n_batches, n_edges = 0, 0
+    for batch in stream_edges(
+        driver,
+        edge_types,
+        where=where,
+        parameters=parameters,
+        node_label=node_label,
+        weight_property=weight_property,
+        batch_size=batch_size,
+        database=database,
+    ):
+        batch = batch.dropna(subset=["source", "destination"])
+
+        # extend the vocabulary with page paths not seen in earlier batches
+        names = pd.unique(pd.concat([batch["source"], batch["destination"]]))
+        new = names[vocabulary.get_indexer(names) < 0]
+        if len(new) > 0:
+            vocabulary = vocabulary.append(pd.Index(new, dtype=object))
+
+        source_ids = vocabulary.get_indexer(batch["source"])
+        destination_ids = vocabulary.get_indexer(batch["destination"])
+        for edge_type, positions in batch.groupby("edgeType").indices.items():
+            if edge_type not in rows:
+                continue
+            rows[edge_type].append(source_ids[positions])
+            cols[edge_type].append(destination_ids[positions])
+            weights[edge_type].append(batch["weight"].to_numpy()[positions])
+
+        n_batches += 1
+        n_edges += len(batch)
+        progress(n_batches, n_edges)
+
+    n = len(vocabulary)
+    layers = {}
+    for edge_type in edge_types:
+        layer = csr_matrix(
+            (
+                np.concatenate(weights[edge_type] + [np.zeros(0)]),
+                (
+                    np.concatenate(rows[edge_type] + [np.zeros(0, dtype=int)]),
+                    np.concatenate(cols[edge_type] + [np.zeros(0, dtype=int)]),
+                ),
+            ),
+            shape=(n, n),
+        )
+        layer.sum_duplicates()
+        layers[edge_type] = layer
+
+    store = GraphStore.from_layers(vocabulary.to_numpy(), layers)
+    if path is not None:
+        store.save(path)
+
+    return store
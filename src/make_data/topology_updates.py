@@ -0,0 +1,306 @@
+"""
+A persisted structural topology that is updated page by page, rather than rebuilt.
+
+`ingest_html` -> `process_links` -> `create_topology_matrix_pd` parses every HTML page
+and builds a dense matrix each time, although only a few pages change from one day to
+the next. A `TopologyStore` keeps the hyperlinks as a CSR matrix over a growing node
+vocabulary, with the content hash of each page it was parsed from. A refresh hashes
+every page, and only reparses the pages whose hash changed:
+
+    store = TopologyStore.load("topology.npz")  # or TopologyStore() the first time
+    changed = store.update_from_html(html_files, remove_missing=True)
+    store.save("topology.npz")
+    graph_store = store.to_graph_store()
+
+Updates replace whole rows. Replaced rows are held in a small overlay of pending rows,
+so an update costs nothing in the size of the matrix; `compact()` merges the overlay
+into the CSR matrix, and drops pages no longer linked to or from. It runs on `save()`,
+when the matrix is read, and whenever the overlay grows past `max_pending` rows.
+
+Pages must be hashed and parsed the same way on every refresh, e.g. with the same
+`strip_regions`; to change how they are parsed, build a new store.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+from src.make_data.make_topology_matrix import ingest_html, process_links
+from src.utils.csr_graph import CSRGraph
+from src.utils.graph_store import GraphStore
+from src.utils.pipeline import file_hash
+
+
+class TopologyStore:
+    """
+    The hyperlinks between pages, as a binary CSR adjacency matrix that can be updated
+    one page at a time.
+
+    Args:
+        max_pending: compact once more than this many rows are pending. If None, only
+                     compact on `save()` or when the matrix is read.
+
+    Attributes:
+        hashes: a dictionary of source page: content hash of the page its links were
+                parsed from, or None if they were set directly
+    """
+
+    def __init__(self, max_pending: Optional[int] = 10000):
+        self.max_pending = max_pending
+        self.hashes: Dict[str, Optional[str]] = {}
+        self._slugs: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._matrix = csr_matrix((0, 0), dtype=np.float64)
+        self._pending: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_page_links(
+        cls, page_links: Dict[str, Iterable[str]], max_pending: Optional[int] = 10000
+    ) -> "TopologyStore":
+        """
+        Create a store from the hyperlinks of a corpus of pages.
+
+        Args:
+            page_links: a dictionary of page: list of linked pages, e.g. from
+                        `process_links()`
+            max_pending: see `TopologyStore`
+        Returns:
+            A `TopologyStore`.
+        """
+        store = cls(max_pending=max_pending)
+        for page, links in page_links.items():
+            store.set_links(page, links)
+        store.compact()
+
+        return store
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self._slugs)
+
+    @property
+    def n_pending(self) -> int:
+        """The number of replaced rows not yet merged into the CSR matrix."""
+        return len(self._pending)
+
+    def _node_id(self, page: str) -> int:
+        """The node id of a page, adding it to the vocabulary if it is new."""
+        if page not in self._ids:
+            self._ids[page] = len(self._slugs)
+            self._slugs.append(page)
+
+        return self._ids[page]
+
+    def _maybe_compact(self) -> None:
+        if self.max_pending is not None and self.n_pending > self.max_pending:
+            self.compact()
+
+    def set_links(
+        self, page: str, links: Iterable[str], content_hash: Optional[str] = None
+    ) -> None:
+        """
+        Add a page, or replace all of its out-links.
+
+        Args:
+            page: the source page path
+            links: the page paths it links to; duplicates are ignored
+            content_hash: the hash of the content the links were parsed from
+        """
+        row = self._node_id(page)
+        self._pending[row] = np.unique(
+            np.array([self._node_id(link) for link in links], dtype=np.int64)
+        )
+        self.hashes[page] = content_hash
+        self._maybe_compact()
+
+    def add_links(self, page: str, links: Iterable[str]) -> None:
+        """
+        Add out-links to a page, keeping its existing ones.
+
+        Args:
+            page: the source page path
+            links: the page paths it links to
+        """
+        self.set_links(
+            page,
+            list(self.out_links(page)) + list(links),
+            content_hash=self.hashes.get(page),
+        )
+
+    def remove_page(self, page: str) -> None:
+        """
+        Remove a page's out-links. Links to the page are kept; the page leaves the
+        vocabulary at the next `compact()` if nothing links to it.
+
+        Args:
+            page: the source page path
+        """
+        if page in self._ids:
+            self._pending[self._ids[page]] = np.empty(0, dtype=np.int64)
+        self.hashes.pop(page, None)
+        self._maybe_compact()
+
+    def out_links(self, page: str) -> List[str]:
+        """The page paths a page links to, without compacting."""
+        row = self._ids.get(page)
+        if row is None:
+            return []
+        if row in self._pending:
+            ids = self._pending[row]
+        elif row < self._matrix.shape[0]:
+            ids = self._matrix.indices[
+                self._matrix.indptr[row] : self._matrix.indptr[row + 1]
+            ]
+        else:
+            ids = []
+
+        return [self._slugs[i] for i in ids]
+
+    def update_from_html(
+        self,
+        file_info: Dict[str, str],
+        remove_missing: bool = False,
+        strip_regions: bool = False,
+    ) -> List[str]:
+        """
+        Reparse only the HTML pages whose content hash changed since they were last
+        added, or that are new.
+
+        Args:
+            file_info: a dictionary of page url: path to the page's HTML file, as
+                       passed to `ingest_html()`
+            remove_missing: if True, treat `file_info` as the whole corpus, and remove
+                            the out-links of pages not in it
+            strip_regions: passed to `ingest_html()`
+        Returns:
+            The pages that were reparsed or removed.
+        """
+        changed = []
+        for page, path in file_info.items():
+            content_hash = file_hash(path)
+            if self.hashes.get(page) == content_hash:
+                continue
+            links = process_links(
+                ingest_html({page: path}, strip_regions=strip_regions)
+            )
+            self.set_links(page, links[page], content_hash=content_hash)
+            changed.append(page)
+
+        if remove_missing:
+            for page in [page for page in self.hashes if page not in file_info]:
+                self.remove_page(page)
+                changed.append(page)
+
+        return changed
+
+    def compact(self) -> None:
+        """
+        Merge the pending rows into the CSR matrix, and drop pages with no out-links
+        that are not source pages and are not linked to, renumbering the node ids.
+        """
+        n = self.n_nodes
+        matrix = self._matrix.copy()
+        matrix.resize((n, n))
+
+        if self._pending:
+            rows = np.fromiter(self._pending, dtype=np.int64, count=self.n_pending)
+            kept_rows = np.ones(n)
+            kept_rows[rows] = 0
+            lengths = [len(ids) for ids in self._pending.values()]
+            replaced = csr_matrix(
+                (
+                    np.ones(sum(lengths)),
+                    (
+                        np.repeat(rows, lengths),
+                        np.concatenate(list(self._pending.values())),
+                    ),
+                ),
+                shape=(n, n),
+            )
+            matrix = (diags(kept_rows) @ matrix + replaced).tocsr()
+            matrix.eliminate_zeros()
+            self._pending = {}
+
+        linked = (np.diff(matrix.indptr) > 0) | (
+            np.bincount(matrix.indices, minlength=n) > 0
+        )
+        linked[[self._ids[page] for page in self.hashes]] = True
+        if not linked.all():
+            keep = np.flatnonzero(linked)
+            matrix = matrix[keep][:, keep]
+            self._slugs = [self._slugs[i] for i in keep]
+            self._ids = {page: i for i, page in enumerate(self._slugs)}
+
+        matrix.sort_indices()
+        self._matrix = matrix
+
+    @property
+    def graph(self) -> CSRGraph:
+        """The compacted topology as a `CSRGraph`, with a weight of 1 per hyperlink."""
+        self.compact()
+
+        return CSRGraph(self._matrix, np.array(self._slugs, dtype=object))
+
+    def to_graph_store(self, edge_type: str = "HYPERLINKS_TO") -> GraphStore:
+        """The compacted topology as a one-layer `GraphStore`."""
+        graph = self.graph
+
+        return GraphStore.from_layers(graph.slugs, {edge_type: graph.matrix})
+
+    def page_links(self) -> Dict[str, List[str]]:
+        """
+        The out-links of every source page, in the form returned by `process_links()`,
+        e.g. to pass to `create_topology_matrix_pd()`.
+        """
+        return {page: self.out_links(page) for page in self.hashes}
+
+    def save(self, path) -> None:
+        """
+        Compact the store, and save it in a `.npz` file: the node vocabulary, the CSR
+        arrays and the content hash of every source page.
+
+        Args:
+            path: the file to write
+        """
+        self.compact()
+        np.savez_compressed(
+            path,
+            slugs=np.array(self._slugs, dtype=str),
+            indptr=self._matrix.indptr,
+            indices=self._matrix.indices,
+            pages=np.array(list(self.hashes), dtype=str),
+            hashes=np.array(
+                [content_hash or "" for content_hash in self.hashes.values()],
+                dtype=str,
+            ),
+        )
+
+    @classmethod
+    def load(cls, path, max_pending: Optional[int] = 10000) -> "TopologyStore":
+        """
+        Load a store written by `TopologyStore.save()`.
+
+        Args:
+            path: the `.npz` file to read
+            max_pending: see `TopologyStore`
+        Returns:
+            A `TopologyStore`.
+        """
+        store = cls(max_pending=max_pending)
+        with np.load(path, allow_pickle=False) as arrays:
+            store._slugs = arrays["slugs"].tolist()
+            indices = arrays["indices"]
+            n = len(store._slugs)
+            store._matrix = csr_matrix(
+                (np.ones(len(indices)), indices, arrays["indptr"]), shape=(n, n)
+            )
+            store.hashes = {
+                page: content_hash or None
+                for page, content_hash in zip(
+                    arrays["pages"].tolist(), arrays["hashes"].tolist()
+                )
+            }
+        store._ids = {page: i for i, page in enumerate(store._slugs)}
+
+        return store
@@ -0,0 +1,293 @@
+"""
+Centrality measures over a `CSRGraph`.
+
+These replace the exact networkx centrality calls in
+`notebooks/query_dependent_link_analysis.ipynb`, which do not finish on the full
+functional network. Every function returns a ranking of page paths, as a
+pd.DataFrame with a `pagePath` column and a score column, sorted by score in
+descending order.
+"""
+
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.sparse import csr_matrix
+
+from src.utils.csr_graph import CSRGraph, row_normalise, to_ranking
+
+
+def _pattern(matrix: csr_matrix, directed: bool = True) -> csr_matrix:
+    """Binary (unweighted) copy of an adjacency matrix, optionally symmetrised."""
+    pattern = csr_matrix(
+        (np.ones(matrix.nnz), matrix.indices, matrix.indptr), shape=matrix.shape
+    )
+    if not directed:
+        pattern = pattern + pattern.T
+        pattern.data[:] = 1.0
+    pattern.eliminate_zeros()
+
+    return pattern.tocsr()
+
+
+def degree_centrality(graph: CSRGraph, direction: str = "total") -> pd.DataFrame:
+    """
+    Degree centrality, computed straight from the CSR index arrays.
+
+    Args:
+        graph: a `CSRGraph`
+        direction: "out" for out-degree, "in" for in-degree, or "total" for both, as in
+                   `nx.degree_centrality` on a directed graph
+    Returns:
+        A ranking with the score column `degree_centrality`. Degrees are normalised by
+        the maximum possible degree, n - 1.
+    """
+    n = graph.n_nodes
+    out_degree = np.diff(graph.matrix.indptr)
+    in_degree = np.bincount(graph.matrix.indices, minlength=n)
+
+    if direction == "out":
+        degree = out_degree
+    elif direction == "in":
+        degree = in_degree
+    elif direction == "total":
+        degree = out_degree + in_degree
+    else:
+        raise ValueError(f"direction must be 'in', 'out' or 'total': {direction}")
+
+    scale = 1.0 / (n - 1) if n > 1 else 1.0
+
+    return to_ranking(graph, degree * scale, "degree_centrality")
+
+
+def pagerank_scores(
+    matrix: csr_matrix,
+    alpha: float = 0.85,
+    personalization: Optional[np.ndarray] = None,
+    weighted: bool = True,
+    tol: float = 1e-6,
+    max_iter: int = 100,
+) -> np.ndarray:
+    """
+    PageRank by sparse power iteration, with the same conventions as `nx.pagerank`:
+    dangling nodes jump according to the personalization vector, and iteration stops
+    once the L1 change is below `n * tol`.
+
+    Args:
+        matrix: a CSR adjacency matrix
+        alpha: the damping factor
+        personalization: a non-negative numpy array of length n to restart to. Defaults
+                         to the uniform distribution.
+        weighted: if False, ignore edge weights
+        tol: the convergence tolerance
+        max_iter: the maximum number of iterations
+    Returns:
+        A numpy array of PageRank scores, summing to 1.
+    """
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+
+    P = row_normalise(matrix if weighted else _pattern(matrix))
+    # iterate with the transpose, so each step is a CSR matrix-vector product
+    PT = P.T.tocsr()
+    dangling = np.diff(P.indptr) == 0
+
+    if personalization is None:
+        p = np.full(n, 1.0 / n)
+    else:
+        p = np.asarray(personalization, dtype=np.float64)
+        if p.sum() <= 0:
+            raise ValueError("personalization must have a positive sum")
+        p = p / p.sum()
+
+    x = p.copy()
+    for _ in range(max_iter):
+        x_last = x
+        x = alpha * (PT @ x_last + x_last[dangling].sum() * p) + (1 - alpha) * p
+        if np.abs(x - x_last).sum() < n * tol:
+            return x
+
+    raise RuntimeError(f"PageRank failed to converge in {max_iter} iterations")
+
+
+def pagerank(
+    graph: CSRGraph,
+    alpha: float = 0.85,
+    weighted: bool = True,
+    tol: float = 1e-6,
+    max_iter: int = 100,
+) -> pd.DataFrame:
+    """
+    PageRank of every page in the graph.
+
+    Args:
+        graph: a `CSRGraph`
+        alpha: the damping factor
+        weighted: if False, ignore edge weights
+        tol: the convergence tolerance
+        max_iter: the maximum number of power iterations
+    Returns:
+        A ranking with the score column `pagerank`.
+    """
+    scores = pagerank_scores(
+        graph.matrix, alpha=alpha, weighted=weighted, tol=tol, max_iter=max_iter
+    )
+
+    return to_ranking(graph, scores, "pagerank")
+
+
+def eigenvector_centrality(
+    graph: CSRGraph, weighted: bool = False, tol: float = 1e-6, max_iter: int = 100
+) -> pd.DataFrame:
+    """
+    Eigenvector centrality by sparse power iteration, following
+    `nx.eigenvector_centrality`: a page is central if it is linked to from central
+    pages, and the iteration uses (A + I) to guarantee convergence on bipartite-like
+    structure.
+
+    Args:
+        graph: a `CSRGraph`
+        weighted: if True, use edge weights; `nx.eigenvector_centrality` ignores them
+                  by default
+        tol: the convergence tolerance
+        max_iter: the maximum number of power iterations
+    Returns:
+        A ranking with the score column `eigenvector_centrality`, with unit L2 norm.
+    """
+    n = graph.n_nodes
+    if n == 0:
+        return to_ranking(graph, np.zeros(0), "eigenvector_centrality")
+
+    matrix = graph.matrix if weighted else _pattern(graph.matrix)
+    AT = matrix.T.tocsr()
+
+    x = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        x_last = x
+        x = x_last + AT @ x_last
+        norm = np.linalg.norm(x)
+        x = x / norm if norm > 0 else x
+        if np.abs(x - x_last).sum() < n * tol:
+            return to_ranking(graph, x, "eigenvector_centrality")
+
+    raise RuntimeError(
+        f"Eigenvector centrality failed to converge in {max_iter} iterations"
+    )
+
+
+def _single_source_dependencies(pattern: csr_matrix, source: int) -> np.ndarray:
+    """
+    Brandes' dependency accumulation from one source, over an unweighted graph.
+
+    The breadth-first search is run a level at a time with sparse matrix products, so
+    the cost is proportional to the edges leaving each level rather than a Python loop
+    over edges.
+    """
+    n = pattern.shape[0]
+    visited = np.zeros(n, dtype=bool)
+    visited[source] = True
+    sigma = np.zeros(n)
+    sigma[source] = 1.0
+
+    # forward pass: count shortest paths level by level
+    levels = [np.array([source])]
+    while True:
+        frontier = levels[-1]
+        paths = pattern[frontier].T @ sigma[frontier]
+        new = np.flatnonzero((paths > 0) & ~visited)
+        if new.size == 0:
+            break
+        visited[new] = True
+        sigma[new] = paths[new]
+        levels.append(new)
+
+    # backward pass: accumulate dependencies from the deepest level up
+    delta = np.zeros(n)
+    coefficient = np.zeros(n)
+    for depth in range(len(levels) - 2, -1, -1):
+        below = levels[depth + 1]
+        coefficient[below] = (1.0 + delta[below]) / sigma[below]
+        level = levels[depth]
+        delta[level] = sigma[level] * (pattern[level] @ coefficient)
+        coefficient[below] = 0.0
+    delta[source] = 0.0
+
+    return delta
+
+
+def _accumulate_dependencies(pattern: csr_matrix, sources: np.ndarray) -> np.ndarray:
+    """Sum the dependencies from a batch of sources; one task for the process pool."""
+    total = np.zeros(pattern.shape[0])
+    for source in sources:
+        total += _single_source_dependencies(pattern, source)
+
+    return total
+
+
+def n_betweenness_pivots(n_nodes: int, epsilon: float, delta: float) -> int:
+    """
+    The number of sampled pivots needed for every approximate betweenness score to be
+    within `epsilon` of the exact normalised score, with probability at least
+    `1 - delta`. This is Hoeffding's bound with a union bound over all nodes.
+    """
+    return math.ceil(math.log(2 * n_nodes / delta) / (2 * epsilon**2))
+
+
+def approximate_betweenness(
+    graph: CSRGraph,
+    epsilon: float = 0.05,
+    delta: float = 0.1,
+    n_pivots: Optional[int] = None,
+    directed: bool = True,
+    random_state: Optional[int] = None,
+    n_jobs: int = 1,
+) -> pd.DataFrame:
+    """
+    Approximate betweenness centrality by sampled pivots (Brandes and Pich, 2007).
+
+    Shortest-path dependencies are accumulated from a uniform sample of source pages,
+    and scaled up to estimate the normalised betweenness of `nx.betweenness_centrality`.
+    Edge weights are ignored, as in the notebook. If the number of pivots reaches the
+    number of nodes, every node is used and the result is exact.
+
+    Args:
+        graph: a `CSRGraph`
+        epsilon: the maximum absolute error of each normalised score
+        delta: the probability of any score exceeding the `epsilon` error bound
+        n_pivots: the number of pivots to sample. Overrides `epsilon` and `delta`.
+        directed: if False, treat every edge as undirected
+        random_state: a seed for sampling the pivots
+        n_jobs: the number of worker processes to use. Use -1 for all CPUs.
+    Returns:
+        A ranking with the score column `betweenness`.
+    """
+    n = graph.n_nodes
+    if n < 3:
+        return to_ranking(graph, np.zeros(n), "betweenness")
+
+    if n_pivots is None:
+        n_pivots = n_betweenness_pivots(n, epsilon, delta)
+
+    if n_pivots >= n:
+        pivots = np.arange(n)
+    else:
+        pivots = np.random.default_rng(random_state).choice(
+            n, size=n_pivots, replace=False
+        )
+
+    pattern = _pattern(graph.matrix, directed=directed)
+
+    n_batches = min(len(pivots), 4 * max(1, abs(n_jobs)) if n_jobs != 1 else 1)
+    partial_sums = Parallel(n_jobs=n_jobs)(
+        delayed(_accumulate_dependencies)(pattern, batch)
+        for batch in np.array_split(pivots, n_batches)
+    )
+    dependencies = np.sum(partial_sums, axis=0)
+
+    # scale the sample up to all n sources, then normalise as networkx does
+    scores = dependencies * (n / len(pivots)) / ((n - 1) * (n - 2))
+
+    return to_ranking(graph, scores, "betweenness")
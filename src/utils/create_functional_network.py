@@ -4,28 +4,36 @@ from datetime import datetime
 from pathlib import Path
 from urllib import request
 
-import networkx as nx
 import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup, SoupStrainer
-from bs4.element import Doctype
-from google.cloud import bigquery
 
+from src.make_data.boilerplate import (
+    LinkFrequencyIndex,
+    extract_links,
+    normalise_link,
+)
 from src.make_data.make_topology_matrix import (
     create_topology_matrix_pd,
     process_page_links,
 )
+from src.utils.profiling import profiled
 
 
-def identify_seed_pages(seed0_pages):
+@profiled()
+def identify_seed_pages(
+    seed0_pages, strip_regions=True, link_index=None, max_fraction=0.5, min_pages=20
+):
     """
     Identifies seed pages used to create a functional network
         - Removes links to cross-domain services / external domain
         - Attaches anchor to the main url (/business#content)
         - Keeps the step-by-step ID, and search parameters
         - Only keeps self-loops where a page contains an explicit link to itself
-        - Footer pages are manually defined and removed from the final list of seed
-          pages. This is because they occur on every page, regardless of the seed0_pages
+        - Boilerplate links, which occur on every page regardless of the seed0_pages,
+          are removed: links in the header, footer and navigation regions are ignored,
+          and links to pages (ignoring any #fragment or ?query) linked from more than
+          `max_fraction` of the pages of a link frequency index are removed. See
+          `src.make_data.boilerplate`
         - Code is adapted from: https://github.com/alphagov/govuk-intent-
           detector/blob/main/notebooks/generate_topology_matrix.ipynb
 
@@ -35,10 +43,21 @@ def identify_seed_pages(seed0_pages):
                     ['/government/collections/ip-enforcement-reports',
                      '/government/publications/annual-ip-crime-and-enforcement-report-2020-to-2021',
                      '/search-registered-design']
+        - strip_regions: if True, ignore links in the header, footer and navigation
+          regions of the seed0_pages
+        - link_index: a `LinkFrequencyIndex`, or the path of one saved with
+          `LinkFrequencyIndex.save()`, built over a large HTML corpus such as the
+          structural graph's. Defaults to an index of the seed0_pages themselves,
+          which only flags links once there are at least `min_pages` seed0_pages;
+          with fewer, stripping regions is the only protection against boilerplate
+        - max_fraction: links on more than this fraction of the indexed pages are
+          boilerplate
+        - min_pages: the fewest indexed pages needed to flag any link as boilerplate
 
     Returns:
         - A list of pages that are hyperlinked from seed0_pages.
     """
+    from bs4 import BeautifulSoup
 
     # set up folders
     DIR_DATA_RAW = os.getenv("DIR_DATA_RAW")
@@ -84,11 +103,11 @@ def identify_seed_pages(seed0_pages):
     # iterate over the HTML files
     for html_page, html_contents in html_pages.items():
 
-        # extract all embedded hyperlinks and save them in a list
-        links = BeautifulSoup(html_contents, parse_only=SoupStrainer("a"))
-        page_links[html_page] = [
-            link.get("href") for link in links if not isinstance(link, Doctype)
-        ]
+        # extract all embedded hyperlinks, outside boilerplate regions, and save them
+        # in a list
+        page_links[html_page] = extract_links(
+            html_contents, strip_regions=strip_regions
+        )
 
     # process hyperlinks embedded in each page
     page_links_proc = process_page_links(page_links)
@@ -101,51 +120,31 @@ def identify_seed_pages(seed0_pages):
         topology_matrix_df.columns.values.tolist(), columns=["seed1_page"]
     )
 
-    # remove footer pages
-    footer_pages = [
-        "/browse/disabilities",
-        "/browse/housing-local-services",
-        "/help",
-        "/browse/tax",
-        "/browse/childcare-parenting",
-        "/",
-        "/browse/employing-people",
-        "/browse/environment-countryside",
-        "/government/organisations/government-digital-service",
-        "/help/terms-conditions",
-        "/browse/benefits",
-        "/help/cookies",
-        "/browse/births-deaths-marriages",
-        "/browse/abroad",
-        "/coronavirus",
-        "/contact",
-        "/transition",
-        "/government/how-government-works",
-        "/browse/education",
-        "/browse/justice",
-        "/browse/citizenship",
-        "/cymraeg",
-        "/browse/working",
-        "/browse/business",
-        "/help/accessibility-statement",
-        "/world",
-        "/browse/visas-immigration",
-        "/browse/driving",
-        "/help/privacy-notice",
-        "/government/organisations",
-    ]
+    # remove boilerplate links, which are on most pages of the link index
+    if link_index is None:
+        link_index = LinkFrequencyIndex.from_page_links(page_links_proc)
+    elif not isinstance(link_index, LinkFrequencyIndex):
+        link_index = LinkFrequencyIndex.load(link_index)
+    boilerplate = link_index.boilerplate(max_fraction=max_fraction, min_pages=min_pages)
+
+    # seed1 pages keep their #fragment and ?query, which the index ignores
+    is_boilerplate = df.seed1_page.map(normalise_link).isin(boilerplate)
 
-    return df[~df.seed1_page.isin(footer_pages)]["seed1_page"].values.tolist()
+    return df[~is_boilerplate]["seed1_page"].values.tolist()
 
 
-def extract_seed_sessions(start_date, end_date, seed0_pages, seed1_pages):
+@profiled()
+def extract_seed_sessions(
+    start_date, end_date, seed0_pages, seed1_pages, sample_percent=None, client=None
+):
     """
     Retrieves all page hits from sessions that visit at least one seed0 or seed1
     page from google BigQuery.
 
         - URL parameteres/anchors are removed from the page paths, as we are only
           interested in the the gov.uk page path.
-        - Seed1 pages found in the footer of the page are removed
+        - Seed1 pages should have boilerplate links removed, as
+          `identify_seed_pages` does
         - Certain document types are ignored, see `documentTypesToIgnore`
         - Only page hits are included
         - Print pages are not included
@@ -153,6 +152,10 @@ def extract_seed_sessions(start_date, end_date, seed0_pages, seed1_pages):
           'licence', 'transaction', and 'Extension' document types, e.g.
           "/claim-tax-refund/y" TO "/claim-tax-refund". This is because we are not
           interested in the user's response, only the page.
+        - If `sample_percent` is set, only a deterministic sample of sessions is
+          used, those where `FARM_FINGERPRINT(sessionId)` modulo 100 is below
+          `sample_percent`. The same session is always in or out of the sample, so
+          samples of different date ranges and seed pages are consistent.
 
     Args:
        - start_date: the start date for the session hit data
@@ -162,15 +165,45 @@ def extract_seed_sessions(start_date, end_date, seed0_pages, seed1_pages):
                                          '/browse/tax']
        - seed1_pages: a list of GOVUK URL slugs that are hyperlinked from seed0_pages.
                       Get this list by calling `identify_seed_pages(seed0_pages)`.
+       - sample_percent: the percentage of sessions to sample, from 1 to 100, for
+                         exploratory runs. Defaults to every session.
+       - client: a `google.cloud.bigquery.Client`, or a client with the same
+                 `query()` API such as `src.make_data.fake_bigquery.FakeBigQueryClient`.
+                 Defaults to a client of the `govuk-bigquery-analytics` project.
 
     Returns:
        - A pd.DataFrame containing all page hit session data that has visited at least
          one seed0_page or seed1_page. `sessionId`, `hitNumber`, `pagePath`,
          `documentType`, `topLevelTaxons`, `bottomLevelTaxons`, `isEntrance`,
-         `isExit` and total session hits for the pagePath are returned.
+         `isExit` and total session hits for the pagePath are returned. Its
+         `attrs["sample_fraction"]` holds the fraction of sessions sampled, which
+         `extract_nodes_and_edges` uses to rescale counts.
     """
+    job = _seed_sessions_job(
+        start_date, end_date, seed0_pages, seed1_pages, sample_percent, client
+    )
+    df = job.to_dataframe()
+    df.attrs["sample_fraction"] = (sample_percent or 100) / 100
+
+    return df
 
-    client = bigquery.Client(project="govuk-bigquery-analytics", location="EU")
+
+def _seed_sessions_job(
+    start_date, end_date, seed0_pages, seed1_pages, sample_percent=None, client=None
+):
+    """
+    Start the `extract_seed_sessions` query, returning the BigQuery job. See
+    `extract_seed_sessions` for the arguments.
+    """
+    if sample_percent is None:
+        sample_percent = 100
+    if not 1 <= sample_percent <= 100:
+        raise ValueError("sample_percent must be between 1 and 100")
+
+    from google.cloud import bigquery
+
+    if client is None:
+        client = bigquery.Client(project="govuk-bigquery-analytics", location="EU")
 
     query = """
             DECLARE documentTypesToIgnore ARRAY <STRING>;
@@ -220,6 +253,16 @@ def extract_seed_sessions(start_date, end_date, seed0_pages, seed1_pages):
                     _TABLE_SUFFIX BETWEEN @startDate AND @endDate
                     AND hits.page.pagePath NOT LIKE "/print%"
                     AND hits.type = 'PAGE'
+                    -- deterministic sample of sessions, from 0 to 99
+                    AND MOD(
+                        MOD(
+                            FARM_FINGERPRINT(
+                                CONCAT(fullVisitorId, "-", CAST(visitId AS STRING))
+                            ),
+                            100
+                        ) + 100,
+                        100
+                    ) < @samplePercent
             ),
 
             -- remove irrelevant document types `documentTypesToIgnore`
@@ -295,20 +338,104 @@ def extract_seed_sessions(start_date, end_date, seed0_pages, seed1_pages):
         bigquery.ScalarQueryParameter("endDate", "STRING", end_date),
         bigquery.ArrayQueryParameter("seed0Pages", "STRING", seed0_pages),
         bigquery.ArrayQueryParameter("seed1Pages", "STRING", seed1_pages),
+        bigquery.ScalarQueryParameter("samplePercent", "INT64", sample_percent),
     ]
 
     return client.query(
         query, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters)
-    ).to_dataframe()
+    )
 
 
-def extract_nodes_and_edges(page_view_network):
+def _page_session_hits_job(
+    start_date, end_date, pages, sample_percent=None, client=None
+):
+    """
+    Start a query of the number of sessions visiting each of `pages`, over the whole
+    date range, as the `sessionHits` of `extract_seed_sessions`. A session split at
+    midnight counts once. See `extract_seed_sessions` for the other arguments.
+
+    The query result has the columns `pagePath` and `sessionHits`.
+    """
+    if sample_percent is None:
+        sample_percent = 100
+    if not 1 <= sample_percent <= 100:
+        raise ValueError("sample_percent must be between 1 and 100")
+
+    from google.cloud import bigquery
+
+    if client is None:
+        client = bigquery.Client(project="govuk-bigquery-analytics", location="EU")
+
+    query = """
+            WITH primary_data AS (
+                SELECT
+                    REGEXP_REPLACE(hits.page.pagePath, r'[?#].*', '') AS pagePath,
+                    CONCAT(fullVisitorId, "-", CAST(visitId AS STRING)) AS sessionId
+                FROM `govuk-bigquery-analytics.87773428.ga_sessions_*`
+                CROSS JOIN UNNEST(hits) AS hits
+                WHERE
+                    _TABLE_SUFFIX BETWEEN @startDate AND @endDate
+                    AND hits.page.pagePath NOT LIKE "/print%"
+                    AND hits.type = 'PAGE'
+                    -- the same deterministic sample as `extract_seed_sessions`
+                    AND MOD(
+                        MOD(
+                            FARM_FINGERPRINT(
+                                CONCAT(fullVisitorId, "-", CAST(visitId AS STRING))
+                            ),
+                            100
+                        ) + 100,
+                        100
+                    ) < @samplePercent
+            )
+
+            SELECT
+                pagePath,
+                COUNT(DISTINCT sessionId) AS sessionHits
+            FROM primary_data
+            WHERE pagePath IN UNNEST(@pages)
+            GROUP BY pagePath
+    """
+
+    query_parameters = [
+        bigquery.ScalarQueryParameter("startDate", "STRING", start_date),
+        bigquery.ScalarQueryParameter("endDate", "STRING", end_date),
+        bigquery.ArrayQueryParameter("pages", "STRING", list(pages)),
+        bigquery.ScalarQueryParameter("samplePercent", "INT64", sample_percent),
+    ]
+
+    return client.query(
+        query, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters)
+    )
+
+
+@profiled(outputs=("nodes", "edges"))
+def extract_nodes_and_edges(
+    page_view_network,
+    sample_fraction=None,
+    n_bootstrap=0,
+    confidence=0.95,
+    random_state=None,
+):
     """
     Extracts nodes and edges from a functional network.
 
+    If the sessions are a sample, the session counts of nodes and edges are divided by
+    the sample fraction, to estimate the counts over every session. Bootstrap
+    confidence intervals of `edgeWeight` show how much a sampled edge weight can be
+    trusted: each bootstrap replicate resamples the sessions (a Poisson bootstrap),
+    and the interval is narrowed by the finite population correction, so it has no
+    width without sampling.
+
     Args:
         - page_view_network: all page hit data from sessions that visit at least one
           seed0_page or seed1_page. Created via the function `extract_seed_sessions()`
+        - sample_fraction: the fraction of sessions in `page_view_network`. Defaults
+          to its `attrs["sample_fraction"]`, set by `extract_seed_sessions()`, or 1.
+        - n_bootstrap: the number of bootstrap replicates for the confidence intervals
+          of `edgeWeight`; 0 for none
+        - confidence: the confidence level of the intervals
+        - random_state: seeds the bootstrap
 
     Returns:
         - nodes: pd.DataFrame with the node `sourcePagePath`, and the node properties
@@ -317,8 +444,12 @@ def extract_nodes_and_edges(page_view_network):
           `sourcePageSessionExitOnly`, `sourcePageSessionEntranceAndExit`, `sessionHits`
         - edges: pd.DataFrame with the edges `sourcePagePath` to `destinationPagePath`
           and the weight = `edgeWeight`. The edge weight `edgeWeight` is the number of
-          distinct sessions that move between Page A and Page B.
+          distinct sessions that move between Page A and Page B. If `n_bootstrap` is
+          positive, `edgeWeightLower` and `edgeWeightUpper` hold its confidence
+          interval.
     """
+    if sample_fraction is None:
+        sample_fraction = page_view_network.attrs.get("sample_fraction", 1)
 
     df = page_view_network
 
@@ -337,12 +468,29 @@ def extract_nodes_and_edges(page_view_network):
 
     # count the number of times a user session visits sourcePagePath to
     # destinationPagePath
+    edge_groups = df.groupby(["sourcePagePath", "destinationPagePath"], dropna=False)
     df1 = (
-        df.groupby(["sourcePagePath", "destinationPagePath"], dropna=False)
-        .sessionId.nunique()
+        edge_groups.sessionId.nunique()
         .reset_index(name="edgeWeight")
         .sort_values(by=["edgeWeight"], ascending=False)
     )
+    if n_bootstrap > 0:
+        lower, upper = _bootstrap_edge_weights(
+            df.sessionId,
+            edge_groups.ngroup(),
+            len(df1),
+            n_bootstrap,
+            confidence,
+            sample_fraction,
+            random_state,
+        )
+        # `df1` keeps the group numbers as its index
+        df1["edgeWeightLower"] = lower[df1.index]
+        df1["edgeWeightUpper"] = upper[df1.index]
+    # the groups hold a code for every page hit; free them before counting nodes
+    del edge_groups
+    if sample_fraction != 1:
+        df1["edgeWeight"] = df1["edgeWeight"] / sample_fraction
 
     # remove rows where pagePath = destinationPagePath
     df1[df1["sourcePagePath"] != df1["destinationPagePath"]]
@@ -456,9 +604,62 @@ def extract_nodes_and_edges(page_view_network):
 
     nodes = df4[df4["RN"] == 1]
 
+    # estimate the counts over every session
+    if sample_fraction != 1:
+        nodes = nodes.assign(
+            **{
+                col: pd.to_numeric(nodes[col], errors="coerce") / sample_fraction
+                for col in cols
+            }
+        )
+
     return (nodes, edges)
 
 
+def _bootstrap_edge_weights(
+    session_ids, edge_ids, n_edges, n_bootstrap, confidence, sample_fraction, seed
+):
+    """
+    Poisson bootstrap confidence intervals of the number of distinct sessions taking
+    each edge, rescaled by the sample fraction.
+
+    Args:
+        - session_ids: the session of each page hit
+        - edge_ids: the edge number, from 0 to `n_edges - 1`, of each page hit
+        - n_edges: the number of edges
+        - n_bootstrap: the number of bootstrap replicates
+        - confidence: the confidence level of the intervals
+        - sample_fraction: the fraction of sessions sampled
+        - seed: seeds the bootstrap
+
+    Returns:
+        - the lower and upper bounds of each edge's interval, as numpy arrays
+    """
+    pairs = pd.DataFrame(
+        {"session": pd.factorize(session_ids)[0], "edge": edge_ids.to_numpy()}
+    ).drop_duplicates()
+    n_sessions = pairs.session.max() + 1 if len(pairs) else 0
+    estimate = np.bincount(pairs.edge, minlength=n_edges) / sample_fraction
+
+    rng = np.random.default_rng(seed)
+    replicates = np.empty((n_bootstrap, n_edges), dtype=np.float64)
+    for i in range(n_bootstrap):
+        weights = rng.poisson(1.0, n_sessions)[pairs.session]
+        replicates[i] = np.bincount(pairs.edge, weights=weights, minlength=n_edges)
+    replicates /= sample_fraction
+
+    tail = (1 - confidence) / 2
+    lower, upper = np.quantile(replicates, [tail, 1 - tail], axis=0)
+    # the finite population correction: a full sample has no sampling error
+    correction = np.sqrt(1 - sample_fraction)
+
+    return (
+        np.maximum(estimate - (estimate - lower) * correction, 0),
+        estimate + (upper - estimate) * correction,
+    )
+
+
+@profiled()
 def create_networkx_graph(nodes, edges):
     """
     Combines the nodes and edges to create a NetworkX functional graph related to a
@@ -473,18 +674,25 @@ def create_networkx_graph(nodes, edges):
         - edges: pd.DataFrame with the edges `sourcePagePath` to `destinationPagePath`
           and the weight = `edgeWeight`. The edge weight `edgeWeight` is the number of
           distinct sessions that move between Page A and Page B.  Created with the
-          function `extract_nodes_and_edges()`
+          function `extract_nodes_and_edges()`. Its confidence interval
+          `edgeWeightLower` to `edgeWeightUpper`, if any, is added to the edges.
 
     Returns:
          - A NetworkX graph `G`
 
     """
+    import networkx as nx
+
     # add nodes, edges, and edge weight
     G = nx.from_pandas_edgelist(
         edges,
         "sourcePagePath",
         "destinationPagePath",
-        ["edgeWeight"],
+        [
+            col
+            for col in ["edgeWeight", "edgeWeightLower", "edgeWeightUpper"]
+            if col in edges
+        ],
         create_using=nx.DiGraph(),
     )
 
@@ -0,0 +1,195 @@
+"""
+A compact graph representation for the functional and structural networks.
+
+A `CSRGraph` holds a weighted adjacency matrix in compressed sparse row (CSR) format,
+where row `i` holds the out-edges of node `i`, alongside an array mapping each node id
+to its page path (slug). Algorithms work on the integer node ids, and slugs are only
+looked up when a ranking is returned.
+"""
+
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+
+class CSRGraph(NamedTuple):
+    """
+    A directed, weighted graph stored as a CSR adjacency matrix.
+
+    Attributes:
+        matrix: a `scipy.sparse.csr_matrix` of shape (n, n), where `matrix[i, j]` is
+                the weight of the edge from node `i` to node `j`
+        slugs: a numpy array of length n, where `slugs[i]` is the page path of node `i`
+    """
+
+    matrix: csr_matrix
+    slugs: np.ndarray
+
+    @property
+    def n_nodes(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def n_edges(self) -> int:
+        return self.matrix.nnz
+
+
+def from_networkx(G, weight: Optional[str] = "edgeWeight") -> CSRGraph:
+    """
+    Convert a networkx graph into a `CSRGraph`.
+
+    Node ids follow the node order of `G`, so they match the row/column order of
+    `get_transition_matrix(G)`. If `G` has been reformatted with `reformat_graph()`, the
+    slugs are taken from the `properties.name` node attribute, otherwise the node
+    labels are used.
+
+    Args:
+        G: a networkx graph or digraph
+        weight: the edge attribute holding the edge weight. Edges without it, or all
+                edges if `weight` is None, have a weight of 1.
+    Returns:
+        A `CSRGraph` of `G`.
+    """
+    import networkx as nx
+
+    slugs = np.array(
+        [
+            data["properties"]["name"] if "properties" in data else node
+            for node, data in G.nodes(data=True)
+        ],
+        dtype=object,
+    )
+    matrix = csr_matrix(nx.adjacency_matrix(G, weight=weight), dtype=np.float64)
+    matrix.sort_indices()
+
+    return CSRGraph(matrix, slugs)
+
+
+def from_edgelist(
+    sources: Iterable,
+    destinations: Iterable,
+    weights: Optional[Iterable[float]] = None,
+    slugs: Optional[Iterable[str]] = None,
+) -> CSRGraph:
+    """
+    Build a `CSRGraph` from parallel arrays of source slugs, destination slugs and
+    weights, such as the `edges` dataframe returned by `extract_nodes_and_edges()`.
+    Duplicate edges have their weights summed, and edges with a null endpoint are
+    dropped.
+
+    Args:
+        sources: the source page path of each edge
+        destinations: the destination page path of each edge
+        weights: the weight of each edge. Defaults to 1 for every edge.
+        slugs: an optional node vocabulary. If given, node ids follow this order and
+               edges with an endpoint outside it are dropped; otherwise node ids follow
+               the order in which slugs first appear in `sources` and `destinations`.
+    Returns:
+        A `CSRGraph` of the edges.
+    """
+    sources = pd.Series(list(sources), dtype=object)
+    destinations = pd.Series(list(destinations), dtype=object)
+    weights = (
+        np.ones(len(sources))
+        if weights is None
+        else np.asarray(list(weights), dtype=np.float64)
+    )
+
+    if slugs is None:
+        vocabulary = pd.unique(pd.concat([sources, destinations]).dropna())
+    else:
+        vocabulary = pd.unique(pd.Series(list(slugs), dtype=object))
+    index = pd.Index(vocabulary)
+
+    rows = index.get_indexer(sources)
+    cols = index.get_indexer(destinations)
+    keep = (rows >= 0) & (cols >= 0)
+
+    n = len(vocabulary)
+    matrix = csr_matrix(
+        (weights[keep], (rows[keep], cols[keep])), shape=(n, n), dtype=np.float64
+    )
+    matrix.sum_duplicates()
+
+    return CSRGraph(matrix, np.asarray(vocabulary, dtype=object))
+
+
+def row_normalise(matrix: csr_matrix, copy: bool = True) -> csr_matrix:
+    """
+    Divide every row of a sparse matrix by its sum, turning edge weights into
+    transition probabilities. Rows that sum to zero (dangling nodes) are left empty.
+
+    Args:
+        matrix: a CSR matrix with non-negative entries
+        copy: if False, normalise `matrix` in place
+    Returns:
+        The row-normalised CSR matrix.
+    """
+    if copy or not isinstance(matrix, csr_matrix) or matrix.dtype != np.float64:
+        matrix = csr_matrix(matrix, dtype=np.float64, copy=copy)
+    row_sums = np.asarray(matrix.sum(axis=1)).ravel()
+    row_sums[row_sums == 0] = 1.0
+    matrix.data /= np.repeat(row_sums, np.diff(matrix.indptr))
+
+    return matrix
+
+
+def subgraph(graph: CSRGraph, ids: Iterable[int]) -> CSRGraph:
+    """
+    The subgraph induced on a set of node ids: the nodes themselves and every edge
+    between them. Node `i` of the subgraph is node `ids[i]` of `graph`.
+
+    Args:
+        graph: a `CSRGraph`
+        ids: node ids to keep, in the order they should have in the subgraph
+    Returns:
+        The induced `CSRGraph`.
+    """
+    ids = np.asarray(ids, dtype=int)
+    matrix = graph.matrix[ids][:, ids].tocsr()
+    matrix.sort_indices()
+
+    return CSRGraph(matrix, graph.slugs[ids])
+
+
+def node_ids(graph: CSRGraph, pages: Iterable[str], strict: bool = False) -> np.ndarray:
+    """
+    Look up the node ids of a collection of page paths.
+
+    Args:
+        graph: a `CSRGraph`
+        pages: page paths to look up
+        strict: if True, raise a `KeyError` for page paths not in the graph; otherwise
+                they are silently dropped
+    Returns:
+        A numpy array of node ids, in the order of `pages`.
+    """
+    pages = list(pages)
+    ids = pd.Index(graph.slugs).get_indexer(pages)
+
+    if strict and (ids < 0).any():
+        missing = [page for page, i in zip(pages, ids) if i < 0]
+        raise KeyError(f"Pages not found in the graph: {missing}")
+
+    return ids[ids >= 0]
+
+
+def to_ranking(graph: CSRGraph, scores: np.ndarray, name: str) -> pd.DataFrame:
+    """
+    Turn a score per node id into a ranking of page paths.
+
+    Args:
+        graph: the `CSRGraph` the scores were computed on
+        scores: a numpy array of length `graph.n_nodes`
+        name: the name of the score column
+    Returns:
+        A pd.DataFrame with the columns `pagePath` and `name`, sorted by `name` in
+        descending order.
+    """
+    ranking = pd.DataFrame({"pagePath": graph.slugs, name: np.asarray(scores)})
+
+    return ranking.sort_values(
+        by=name, ascending=False, kind="mergesort", ignore_index=True
+    )
@@ -0,0 +1,147 @@
+"""
+Vectorised precision, recall and F-beta scores for predicted sets of pages.
+
+`evaluate` in `src.utils.randomwalks` scores one predicted list of pages at a time with
+Python set intersections. These functions work on boolean arrays over node ids (see
+`src.utils.randomwalks.pages_mask`):
+
+- `cutoff_scores` scores every cut-off of a ranking in one cumulative-sum pass
+- `threshold_scores` scores every tf-df score threshold of a ranking from
+  `page_freq_path_freq_ranking`
+- `evaluate_masks` scores a whole matrix of predicted sets at once
+
+Scores are 0 rather than undefined when nothing is predicted, or nothing is correct.
+"""
+
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Element-wise division, with 0 wherever the denominator is 0."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.broadcast_to(
+        np.asarray(denominator, dtype=np.float64), numerator.shape
+    )
+    result = np.zeros(numerator.shape)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+
+    return result
+
+
+def _scores(
+    n_correct: np.ndarray, n_predicted: np.ndarray, n_true: int, beta: float
+) -> pd.DataFrame:
+    """Precision, recall and F-beta from counts of correct and predicted pages."""
+    precision = _divide(n_correct, n_predicted)
+    recall = _divide(n_correct, n_true)
+    fscore = _divide((1 + beta**2) * precision * recall, precision * beta**2 + recall)
+
+    return pd.DataFrame(
+        {
+            "n_predicted": np.asarray(n_predicted, dtype=np.int64),
+            "precision": precision,
+            "recall": recall,
+            "fscore": fscore,
+        }
+    )
+
+
+def cutoff_scores(
+    ranking: np.ndarray,
+    true_mask: np.ndarray,
+    beta: float = 2,
+    n_true: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Precision, recall and F-beta of the top `k` pages of a ranking, for every `k`.
+
+    Args:
+        ranking: node ids, best first
+        true_mask: a boolean array over node ids, True for the pages known to belong
+                   to the whole user journey
+        beta: how much more important recall is than precision
+        n_true: the number of true pages, if some are not in the graph and so cannot
+                be in `true_mask`. Defaults to the number of True values in
+                `true_mask`.
+    Returns:
+        A pd.DataFrame with one row per cut-off `k = 1, ..., len(ranking)`, and the
+        columns `n_predicted` (that is, `k`), `precision`, `recall` and `fscore`.
+    """
+    true_mask = np.asarray(true_mask, dtype=bool)
+    n_true = int(np.count_nonzero(true_mask)) if n_true is None else n_true
+    n_correct = np.cumsum(true_mask[np.asarray(ranking, dtype=np.int64)])
+
+    return _scores(n_correct, np.arange(1, len(n_correct) + 1), n_true, beta)
+
+
+def threshold_scores(
+    page_scores: pd.DataFrame,
+    true_pages: Iterable[str],
+    score: str = "tfdf_max",
+    beta: float = 2,
+) -> pd.DataFrame:
+    """
+    Precision, recall and F-beta of the pages with at least a given score, for every
+    distinct score in a ranking, e.g. from `page_freq_path_freq_ranking`.
+
+    Args:
+        page_scores: a pd.DataFrame with a `pagePath` column and a `score` column
+        true_pages: the pages known to belong to the whole user journey
+        score: the column to threshold
+        beta: how much more important recall is than precision
+    Returns:
+        A pd.DataFrame with one row per distinct score, highest first, and the columns
+        `threshold`, `n_predicted`, `precision`, `recall` and `fscore`. Pages tied at
+        a threshold are all predicted together. An empty ranking gives an empty
+        pd.DataFrame.
+    """
+    true_pages = set(true_pages)
+    ordered = page_scores.sort_values(by=score, ascending=False, kind="mergesort")
+    values = ordered[score].to_numpy()
+    n_correct = np.cumsum(ordered["pagePath"].isin(true_pages).to_numpy())
+
+    # the last page of each run of tied scores; none if there are no pages
+    last = np.flatnonzero(np.append(values[1:] != values[:-1], len(values) > 0))
+    scores = _scores(n_correct[last], last + 1, len(true_pages), beta)
+    scores.insert(0, "threshold", values[last])
+
+    return scores
+
+
+def evaluate_masks(
+    true_mask: np.ndarray,
+    predicted_masks: np.ndarray,
+    beta: float = 2,
+    n_true: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Precision, recall and F-beta of many predicted sets of pages at once.
+
+    Args:
+        true_mask: a boolean array over node ids, True for the pages known to belong
+                   to the whole user journey
+        predicted_masks: a 2-D boolean array (or scipy sparse matrix) with one row per
+                         predicted set, over the same node ids
+        beta: how much more important recall is than precision
+        n_true: the number of true pages, if some are not in the graph. Defaults to
+                the number of True values in `true_mask`.
+    Returns:
+        A pd.DataFrame with one row per predicted set, and the columns `n_predicted`,
+        `precision`, `recall` and `fscore`.
+    """
+    true_mask = np.asarray(true_mask, dtype=bool)
+    n_true = int(np.count_nonzero(true_mask)) if n_true is None else n_true
+
+    if hasattr(predicted_masks, "tocsr"):
+        predicted_masks = predicted_masks.tocsr().astype(bool)
+        n_correct = np.asarray(predicted_masks @ true_mask.astype(np.int64)).ravel()
+        n_predicted = predicted_masks.getnnz(axis=1)
+    else:
+        predicted_masks = np.atleast_2d(np.asarray(predicted_masks, dtype=bool))
+        n_correct = np.count_nonzero(predicted_masks & true_mask, axis=1)
+        n_predicted = np.count_nonzero(predicted_masks, axis=1)
+
+    return _scores(n_correct, n_predicted, n_true, beta)
@@ -0,0 +1,266 @@
+"""
+Graph diagnostics over a `CSRGraph`, using `scipy.sparse.csgraph`.
+
+These replace the networkx calls in `notebooks/query_dependent_link_analysis.ipynb`
+that run all-pairs shortest paths in Python to find a diameter. Breadth-first
+searches run in compiled code, so eccentricities and hop distances from seed pages
+take seconds on the full functional network, and can be used to choose the number of
+steps for `repeat_random_walks`.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csgraph, csr_matrix
+
+from src.utils.csr_graph import CSRGraph, node_ids
+
+
+def _pattern(graph: CSRGraph) -> csr_matrix:
+    """Unweighted copy of the adjacency matrix, so distances are counted in hops."""
+    return csr_matrix(
+        (np.ones(graph.n_edges), graph.matrix.indices, graph.matrix.indptr),
+        shape=graph.matrix.shape,
+    )
+
+
+def _hops(
+    pattern: csr_matrix,
+    sources: Iterable[int],
+    directed: bool = True,
+    min_only: bool = True,
+    limit: float = np.inf,
+) -> np.ndarray:
+    """Breadth-first hop distances from `sources`; unreachable nodes are `np.inf`."""
+    return csgraph.dijkstra(
+        pattern,
+        directed=directed,
+        indices=np.asarray(sources, dtype=int),
+        unweighted=True,
+        min_only=min_only,
+        limit=limit,
+    )
+
+
+def connected_components(graph: CSRGraph, connection: str = "weak") -> List[np.ndarray]:
+    """
+    Find the connected components of a graph, as `nx.weakly_connected_components` or
+    `nx.strongly_connected_components` do.
+
+    Args:
+        graph: a `CSRGraph`
+        connection: "weak" or "strong"
+    Returns:
+        A list of numpy arrays of page paths, one per component, largest first.
+    """
+    n_components, labels = csgraph.connected_components(
+        graph.matrix, directed=True, connection=connection
+    )
+    order = np.argsort(labels, kind="stable")
+    sizes = np.bincount(labels, minlength=n_components)
+    components = np.split(graph.slugs[order], np.cumsum(sizes)[:-1])
+
+    return sorted(components, key=len, reverse=True)
+
+
+def component_sizes(graph: CSRGraph, connection: str = "weak") -> List[int]:
+    """
+    The size of every connected component, largest first.
+
+    Args:
+        graph: a `CSRGraph`
+        connection: "weak" or "strong"
+    Returns:
+        A list of component sizes.
+    """
+    n_components, labels = csgraph.connected_components(
+        graph.matrix, directed=True, connection=connection
+    )
+
+    return sorted(np.bincount(labels, minlength=n_components).tolist(), reverse=True)
+
+
+def hop_distances(
+    graph: CSRGraph,
+    seed_pages: List[str],
+    directed: bool = True,
+    max_hops: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Multi-source breadth-first search: the fewest hops from any seed page to every
+    page reachable from the seeds.
+
+    Args:
+        graph: a `CSRGraph`
+        seed_pages: a list of page slugs
+        directed: if False, edges can be followed in either direction
+        max_hops: stop searching beyond this many hops
+    Returns:
+        A pd.DataFrame with the columns `pagePath` and `hops`, sorted by `hops`. Pages
+        that cannot be reached are not included.
+    """
+    seeds = node_ids(graph, seed_pages)
+    if len(seeds) == 0:
+        return pd.DataFrame({"pagePath": [], "hops": []})
+
+    limit = np.inf if max_hops is None else max_hops
+    distances = _hops(_pattern(graph), seeds, directed=directed, limit=limit)
+    reached = np.flatnonzero(np.isfinite(distances))
+
+    return pd.DataFrame(
+        {"pagePath": graph.slugs[reached], "hops": distances[reached].astype(int)}
+    ).sort_values(by="hops", kind="mergesort", ignore_index=True)
+
+
+def suggest_walk_length(
+    graph: CSRGraph, seed_pages: List[str], coverage: float = 0.95
+) -> int:
+    """
+    Suggest a number of random walk steps from the hop distances of the seed pages:
+    the smallest number of hops within which `coverage` of the pages reachable from
+    the seeds lie.
+
+    Args:
+        graph: a `CSRGraph`
+        seed_pages: a list of page slugs
+        coverage: the fraction of reachable pages to cover, between 0 and 1
+    Returns:
+        The suggested number of steps, or 0 if no seed page is in the graph.
+    """
+    hops = hop_distances(graph, seed_pages)["hops"].to_numpy()
+    if hops.size == 0:
+        return 0
+
+    # hops are sorted, so this is the `coverage` quantile, rounded up to a page
+    return int(hops[max(int(np.ceil(coverage * hops.size)) - 1, 0)])
+
+
+def eccentricity(graph: CSRGraph, pages: List[str], directed: bool = True) -> pd.Series:
+    """
+    The eccentricity of each page: the most hops to any page reachable from it.
+
+    Args:
+        graph: a `CSRGraph`
+        pages: a list of page slugs
+        directed: if False, edges can be followed in either direction
+    Returns:
+        A pd.Series of eccentricities, indexed by page path.
+    """
+    ids = node_ids(graph, pages)
+
+    return pd.Series(
+        _eccentricities(_pattern(graph), ids, directed=directed),
+        index=pd.Index(graph.slugs[ids], name="pagePath"),
+        name="eccentricity",
+    )
+
+
+def _eccentricities(
+    pattern: csr_matrix, sources: np.ndarray, directed: bool = True
+) -> np.ndarray:
+    """Eccentricity of each source, running the searches in memory-bounded chunks."""
+    n = pattern.shape[0]
+    chunk = max(1, 2**22 // max(n, 1))
+    result = np.zeros(len(sources), dtype=int)
+
+    for start in range(0, len(sources), chunk):
+        distances = _hops(
+            pattern, sources[start : start + chunk], directed=directed, min_only=False
+        )
+        distances = np.atleast_2d(distances)
+        distances[~np.isfinite(distances)] = -1
+        result[start : start + chunk] = distances.max(axis=1)
+
+    return result
+
+
+def estimate_diameter(
+    graph: CSRGraph, method: str = "ifub", start_page: Optional[str] = None
+) -> Dict[str, Optional[int]]:
+    """
+    Estimate the diameter of a graph without computing all-pairs shortest paths.
+
+    - `method="double_sweep"` gives a lower bound on the directed diameter (the
+      longest finite shortest path), from a backward search to the page furthest
+      from the start page, then a forward search from that page
+    - `method="ifub"` computes the exact diameter of the largest weakly connected
+      component, with edges treated as undirected, using the iFUB algorithm (Crescenzi
+      et al., 2013). This usually needs only a handful of searches.
+
+    Args:
+        graph: a `CSRGraph`
+        method: "ifub" or "double_sweep"
+        start_page: the page to start from. Defaults to the page with the most edges.
+    Returns:
+        A dictionary with the diameter `lower_bound` and `upper_bound`, and the number
+        of breadth-first searches run, `bfs_runs`. For "ifub" the two bounds are equal;
+        "double_sweep" has no `upper_bound`, so it is None.
+    """
+    pattern = _pattern(graph)
+    degree = np.diff(pattern.indptr) + np.bincount(
+        pattern.indices, minlength=graph.n_nodes
+    )
+
+    if method == "double_sweep":
+        if start_page is None:
+            start = int(np.argmax(degree))
+        else:
+            start = int(node_ids(graph, [start_page], strict=True)[0])
+        return _double_sweep(pattern, start)
+
+    if method == "ifub":
+        n_components, labels = csgraph.connected_components(
+            pattern, directed=True, connection="weak"
+        )
+        largest = np.argmax(np.bincount(labels, minlength=n_components))
+        if start_page is None:
+            in_component = np.flatnonzero(labels == largest)
+            start = int(in_component[np.argmax(degree[in_component])])
+        else:
+            start = int(node_ids(graph, [start_page], strict=True)[0])
+        return _ifub(pattern, start)
+
+    raise ValueError(f"method must be 'ifub' or 'double_sweep': {method}")
+
+
+def _double_sweep(pattern: csr_matrix, start: int) -> Dict[str, Optional[int]]:
+    """Directed double sweep lower bound on the diameter."""
+    # the page that is furthest from reaching `start`
+    backward = _hops(pattern.T.tocsr(), [start])
+    backward[~np.isfinite(backward)] = -1
+    furthest = int(np.argmax(backward))
+
+    forward = _hops(pattern, [start, furthest], min_only=False)
+    forward[~np.isfinite(forward)] = -1
+    lower_bound = int(max(backward.max(), forward.max()))
+
+    return {"lower_bound": lower_bound, "upper_bound": None, "bfs_runs": 3}
+
+
+def _ifub(pattern: csr_matrix, start: int) -> Dict[str, int]:
+    """iFUB exact diameter of the undirected component containing `start`."""
+    distances = _hops(pattern, [start], directed=False)
+    distances[~np.isfinite(distances)] = -1
+    level = int(distances.max())
+    lower_bound, upper_bound = level, 2 * level
+    bfs_runs = 1
+
+    while upper_bound > lower_bound and level > 0:
+        fringe = np.flatnonzero(distances == level)
+        fringe_eccentricity = int(
+            _eccentricities(pattern, fringe, directed=False).max()
+        )
+        bfs_runs += len(fringe)
+        lower_bound = max(lower_bound, fringe_eccentricity)
+        if lower_bound > 2 * (level - 1):
+            upper_bound = lower_bound
+            break
+        upper_bound = 2 * (level - 1)
+        level -= 1
+
+    return {
+        "lower_bound": lower_bound,
+        "upper_bound": max(upper_bound, lower_bound),
+        "bfs_runs": bfs_runs,
+    }
@@ -0,0 +1,366 @@
+"""
+A multi-layer graph store for analysing structural and functional edges together.
+
+The notebooks combine hyperlink edges (`create_topology_matrix_pd`) and user movement
+edges (`extract_nodes_and_edges`) through `HYPERLINKS_TO|USER_MOVEMENT` queries in
+Neo4j. A `GraphStore` holds one CSR matrix per edge type over one shared node
+vocabulary, so the layers can be walked, queried and mixed together in memory, e.g.
+
+    store = GraphStore()
+    store.add_topology_matrix("HYPERLINKS_TO", topology_matrix_df)
+    store.add_edges("USER_MOVEMENT", edges)
+    T = store.transition_matrix({"HYPERLINKS_TO": 0.2, "USER_MOVEMENT": 0.8})
+"""
+
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, diags
+
+from src.utils import walk_engine
+from src.utils.csr_graph import CSRGraph
+from src.utils.neighbourhood import k_hop_subgraph, reverse_layers
+
+
+class GraphStore:
+    """
+    A shared node vocabulary of page paths, with one weighted CSR adjacency matrix per
+    edge type.
+
+    Attributes:
+        slugs: a numpy array of the page path of each node id
+        layers: a dictionary of edge type: CSR adjacency matrix of shape (n, n)
+    """
+
+    def __init__(self, slugs: Iterable[str] = ()):
+        self.slugs = np.empty(0, dtype=object)
+        self.layers: Dict[str, csr_matrix] = {}
+        self._index = pd.Index(self.slugs)
+        self._reversed: Optional[Dict[str, csr_matrix]] = None
+        self._walk_arrays: Dict[Tuple[str, bool], walk_engine.WalkArrays] = {}
+        self._add_slugs(slugs)
+
+    @classmethod
+    def from_layers(
+        cls, slugs: Iterable[str], layers: Mapping[str, csr_matrix]
+    ) -> "GraphStore":
+        """
+        Create a store from a node vocabulary and CSR layers that already use its node
+        ids, without copying the layers.
+
+        Args:
+            slugs: the page path of each node id
+            layers: a dictionary of edge type: CSR adjacency matrix of shape (n, n)
+        Returns:
+            A `GraphStore`.
+        """
+        slugs = list(slugs)
+        store = cls(slugs)
+        n = store.n_nodes
+        if n != len(slugs):
+            raise ValueError("slugs must be unique")
+        for edge_type, layer in layers.items():
+            if layer.shape != (n, n):
+                raise ValueError(f"Layer {edge_type} must have shape {(n, n)}")
+            store.layers[edge_type] = csr_matrix(layer)
+
+        return store
+
+    def save(self, path):
+        """
+        Save the store in a compact `.npz` file: the node vocabulary and the CSR arrays
+        of every layer.
+
+        Args:
+            path: the file to write
+        """
+        arrays = {"slugs": self.slugs.astype(str)}
+        for i, (edge_type, layer) in enumerate(self.layers.items()):
+            arrays[f"edge_type_{i}"] = np.array(edge_type)
+            arrays[f"indptr_{i}"] = layer.indptr
+            arrays[f"indices_{i}"] = layer.indices
+            arrays[f"data_{i}"] = layer.data
+        np.savez_compressed(path, n_layers=len(self.layers), **arrays)
+
+    @classmethod
+    def load(cls, path) -> "GraphStore":
+        """
+        Load a store written by `GraphStore.save()`.
+
+        Args:
+            path: the `.npz` file to read
+        Returns:
+            A `GraphStore`.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            slugs = arrays["slugs"].astype(object)
+            n = len(slugs)
+            layers = {
+                str(arrays[f"edge_type_{i}"]): csr_matrix(
+                    (
+                        arrays[f"data_{i}"],
+                        arrays[f"indices_{i}"],
+                        arrays[f"indptr_{i}"],
+                    ),
+                    shape=(n, n),
+                )
+                for i in range(int(arrays["n_layers"]))
+            }
+
+        return cls.from_layers(slugs, layers)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.slugs)
+
+    def _add_slugs(self, slugs: Iterable[str]) -> np.ndarray:
+        """Add new page paths to the vocabulary, and return the ids of `slugs`."""
+        slugs = pd.Series(list(slugs), dtype=object)
+        ids = self._index.get_indexer(slugs)
+
+        new = pd.unique(slugs[ids < 0])
+        if len(new) > 0:
+            self.slugs = np.concatenate([self.slugs, np.asarray(new, dtype=object)])
+            self._index = pd.Index(self.slugs)
+            n = self.n_nodes
+            for layer in self.layers.values():
+                layer.resize((n, n))
+            self._invalidate()
+            ids = self._index.get_indexer(slugs)
+
+        return ids.astype(np.int64)
+
+    def _invalidate(self):
+        """Drop cached structures derived from the layers."""
+        self._reversed = None
+        self._walk_arrays = {}
+
+    def add_edges(
+        self,
+        edge_type: str,
+        edges: pd.DataFrame,
+        source: str = "sourcePagePath",
+        destination: str = "destinationPagePath",
+        weight: Optional[str] = "edgeWeight",
+    ):
+        """
+        Add (or replace) a layer from an edge list, such as the `edges` dataframe from
+        `extract_nodes_and_edges()`. Edges with a missing endpoint are dropped, and
+        duplicate edges have their weights summed.
+
+        Args:
+            edge_type: the name of the layer, e.g. "USER_MOVEMENT"
+            edges: a pd.DataFrame with one row per edge
+            source: the column holding the source page path
+            destination: the column holding the destination page path
+            weight: the column holding the edge weight, or None for a weight of 1
+        """
+        edges = edges.dropna(subset=[source, destination])
+        rows = self._add_slugs(edges[source])
+        cols = self._add_slugs(edges[destination])
+        weights = np.ones(len(edges)) if weight is None else edges[weight].to_numpy()
+
+        n = self.n_nodes
+        layer = csr_matrix(
+            (weights.astype(np.float64), (rows, cols)), shape=(n, n), dtype=np.float64
+        )
+        layer.sum_duplicates()
+        self.layers[edge_type] = layer
+        self._invalidate()
+
+    def add_topology_matrix(self, edge_type: str, topology_matrix: pd.DataFrame):
+        """
+        Add (or replace) a layer from the adjacency dataframe returned by
+        `create_topology_matrix_pd()`, where rows are source pages and columns are
+        destination pages.
+
+        Args:
+            edge_type: the name of the layer, e.g. "HYPERLINKS_TO"
+            topology_matrix: the topology matrix as a pd.DataFrame
+        """
+        rows, cols = np.nonzero(topology_matrix.to_numpy())
+        edges = pd.DataFrame(
+            {
+                "sourcePagePath": topology_matrix.index.to_numpy()[rows],
+                "destinationPagePath": topology_matrix.columns.to_numpy()[cols],
+                "edgeWeight": topology_matrix.to_numpy()[rows, cols],
+            }
+        )
+        self.add_edges(edge_type, edges)
+
+    def add_graph(self, edge_type: str, graph: CSRGraph):
+        """
+        Add (or replace) a layer from a `CSRGraph`, mapping its nodes onto the shared
+        vocabulary.
+
+        Args:
+            edge_type: the name of the layer
+            graph: a `CSRGraph`
+        """
+        coo = graph.matrix.tocoo()
+        self.add_edges(
+            edge_type,
+            pd.DataFrame(
+                {
+                    "sourcePagePath": graph.slugs[coo.row],
+                    "destinationPagePath": graph.slugs[coo.col],
+                    "edgeWeight": coo.data,
+                }
+            ),
+        )
+
+    def layer(self, edge_type: str) -> CSRGraph:
+        """The `CSRGraph` of one edge type, sharing the store's node ids."""
+        return CSRGraph(self.layers[edge_type], self.slugs)
+
+    def node_ids(self, pages: Iterable[str]) -> np.ndarray:
+        """Node ids of the page paths in the store, silently dropping the others."""
+        ids = self._index.get_indexer(list(pages))
+
+        return ids[ids >= 0].astype(np.int64)
+
+    def _mixing(self, mixing: Optional[Mapping[str, float]]) -> Dict[str, float]:
+        """Validate mixing weights, defaulting to equal weights for every layer."""
+        if mixing is None:
+            return {edge_type: 1.0 for edge_type in self.layers}
+
+        unknown = set(mixing) - set(self.layers)
+        if unknown:
+            raise KeyError(f"Unknown edge types: {sorted(unknown)}")
+        if any(w < 0 for w in mixing.values()) or sum(mixing.values()) <= 0:
+            raise ValueError("Mixing weights must be non-negative, with a positive sum")
+
+        return {edge_type: w for edge_type, w in mixing.items() if w > 0}
+
+    def transition_matrix(
+        self, mixing: Optional[Mapping[str, float]] = None
+    ) -> csr_matrix:
+        """
+        Build the transition probability matrix of a random walk that, at each page,
+        picks a layer with probability proportional to its mixing weight (among the
+        layers where the page has out-edges), then follows an edge of that layer in
+        proportion to the edge weights.
+
+        The layers are scaled row by row into the result, so no normalised copy of any
+        layer is kept. Pages with no out-edges in any mixed layer have an empty row.
+
+        Args:
+            mixing: a dictionary of edge type: mixing weight. Defaults to equal weights
+                    for every layer.
+        Returns:
+            The transition probability matrix, as a CSR matrix.
+        """
+        mixing = self._mixing(mixing)
+        n = self.n_nodes
+
+        row_sums = {
+            edge_type: np.asarray(self.layers[edge_type].sum(axis=1)).ravel()
+            for edge_type in mixing
+        }
+        available = sum(
+            mixing[edge_type] * (row_sums[edge_type] > 0) for edge_type in mixing
+        )
+
+        T = csr_matrix((n, n), dtype=np.float64)
+        for edge_type, w in mixing.items():
+            denominator = available * row_sums[edge_type]
+            scale = np.divide(w, denominator, out=np.zeros(n), where=denominator > 0)
+            T = T + diags(scale) @ self.layers[edge_type]
+
+        return T.tocsr()
+
+    def k_hop(
+        self,
+        seed_pages: List[str],
+        k: int = 1,
+        edge_types: Optional[List[str]] = None,
+        direction: str = "both",
+        node_mask: Optional[np.ndarray] = None,
+    ) -> Tuple[Dict[str, CSRGraph], np.ndarray]:
+        """
+        Extract the subgraph within `k` hops of some seed pages; see
+        `src.utils.neighbourhood.k_hop_subgraph()`. Transposed layers are cached
+        between queries.
+        """
+        if self._reversed is None and direction != "out":
+            self._reversed = reverse_layers(self.layers)
+
+        return k_hop_subgraph(
+            self.layers,
+            self.slugs,
+            seed_pages,
+            k=k,
+            edge_types=edge_types,
+            direction=direction,
+            node_mask=node_mask,
+            reversed_layers=self._reversed,
+        )
+
+    def walk_arrays(self, edge_type: str, weighted: bool = True):
+        """The cached `WalkArrays` of one layer."""
+        key = (edge_type, weighted)
+        if key not in self._walk_arrays:
+            self._walk_arrays[key] = walk_engine.prepare(
+                self.layers[edge_type], weighted=weighted
+            )
+
+        return self._walk_arrays[key]
+
+    def random_walks(
+        self,
+        seed_pages: List[str],
+        steps: int,
+        repeats: int,
+        mixing: Optional[Mapping[str, float]] = None,
+        weighted: bool = True,
+        random_state: Optional[int] = None,
+    ) -> dict:
+        """
+        Perform `repeats` random walks of `steps` steps from every seed page, mixing
+        the layers with per-layer weights; see `walk_engine.walk_layers()`.
+
+        Args:
+            seed_pages: a list of page slugs
+            steps: the number of steps in each walk
+            repeats: the number of walks per seed page
+            mixing: a dictionary of edge type: mixing weight. Defaults to equal weights
+                    for every layer.
+            weighted: if True, follow edges in proportion to their weights within a
+                      layer; if False, uniformly
+            random_state: a seed for the random number generator
+        Returns:
+            A dictionary in the shape returned by
+            `repeat_random_walks(combine="union", level=1)`, so it can be passed to
+            `page_freq_path_freq_ranking()`:
+            - `seeds`: the seed pages found in the store
+            - `pages_visited`: the set of every page visited
+            - `paths_taken`: for each seed page, a list of the pages visited by each
+              walk
+        """
+        mixing = self._mixing(mixing)
+        found = self._index.get_indexer(list(seed_pages)) >= 0
+        seeds = [page for page, f in zip(seed_pages, found) if f]
+        not_found = [page for page, f in zip(seed_pages, found) if not f]
+        if not_found:
+            print(not_found, "could not be found in the graph")
+
+        starts = np.repeat(self.node_ids(seeds), repeats)
+        paths = walk_engine.walk_layers(
+            [self.walk_arrays(edge_type, weighted) for edge_type in mixing],
+            list(mixing.values()),
+            starts,
+            steps,
+            rng=np.random.default_rng(random_state),
+        )
+
+        visits = [self.slugs[ids].tolist() for ids in walk_engine.unique_visits(paths)]
+        paths_taken = [
+            visits[i * repeats : (i + 1) * repeats] for i in range(len(seeds))
+        ]
+
+        return {
+            "seeds": seeds,
+            "pages_visited": {page for path in visits for page in path},
+            "paths_taken": paths_taken,
+        }
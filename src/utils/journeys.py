@@ -0,0 +1,145 @@
+"""
+Random walk rankings for many whole user journeys over one functional graph.
+
+Running `repeat_random_walks` once per journey rebuilds the walk arrays of the graph
+every time, and runs one worker pool per journey, so a journey with few seed pages
+leaves most workers idle. `run_journeys` prepares the graph once, and schedules the
+walks from every seed page of every journey as tasks in a single joblib worker pool,
+then ranks every journey in the same pool, so throughput scales with the number of
+cores rather than the number of journeys.
+
+Each journey gets its own random number streams, spawned from `random_state` exactly
+as `repeat_random_walks` spawns them, so a journey's results are the same as running
+`repeat_random_walks` on it alone with the same `random_state`.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.utils import walk_engine
+from src.utils.evaluation import threshold_scores
+from src.utils.randomwalks import (
+    _seed_ids,
+    _walk_from,
+    add_additional_information,
+    get_node_information,
+    get_transition_matrix,
+    getSlugs,
+    page_freq_path_freq_ranking,
+    walk_results,
+)
+
+
+def run_journeys(
+    journeys: Dict[str, Sequence[str]],
+    G,
+    T=None,
+    steps: int = 100,
+    repeats: int = 100,
+    proba: bool = True,
+    true_pages: Optional[Dict[str, Iterable[str]]] = None,
+    n_jobs: int = -1,
+    random_state: Optional[int] = None,
+    alpha: float = 0.0,
+    dangling: str = "stop",
+    backend: str = "numpy",
+    verbose: int = 1,
+) -> Dict[str, Dict]:
+    """
+    Random walk rankings, and optionally evaluations, for many whole user journeys.
+
+    The pages visited by all the walks of a journey are combined as
+    `repeat_random_walks(..., combine="union", level=1)` does, ranked with
+    `page_freq_path_freq_ranking`, and enriched with `add_additional_information`.
+
+    Args:
+        journeys: a dictionary of journey name: seed pages of the journey
+        G: a networkx graph, reformatted with `reformat_graph()`
+        T: the adjacency or transition matrix of `G`. Defaults to
+           `get_transition_matrix(G)`, built once for every journey.
+        steps: the number of steps of each random walk
+        repeats: the number of random walks from each seed page
+        proba: True if `T` holds transition probabilities, False for an adjacency
+               matrix; see `repeat_random_walks`
+        true_pages: a dictionary of journey name: pages known to belong to the
+                    journey, for the journeys to evaluate
+        n_jobs: the number of worker processes, shared by every journey; -1 uses
+                every CPU
+        random_state: seeds the random number streams of every journey
+        alpha: the restart probability; see `repeat_random_walks`
+        dangling: the dangling page policy; see `repeat_random_walks`
+        backend: the `walk_engine` backend; see `repeat_random_walks`
+        verbose: if 1, show a progress bar over every walk task
+    Returns:
+        A dictionary of journey name: dictionary with `results` (as returned by
+        `repeat_random_walks`, or None if no seed page is in `G`), `ranking` (the
+        enriched ranking, or None) and, for journeys in `true_pages`, `evaluation`
+        (the precision, recall and F2 score of the pages ranked at or above every
+        `tfdf_max` threshold; see `src.utils.evaluation.threshold_scores`).
+    """
+    from joblib import Parallel, delayed
+    from tqdm.notebook import tqdm
+
+    if T is None:
+        T = get_transition_matrix(G)
+    slugs = np.array(getSlugs(G), dtype=object)
+    arrays = walk_engine.prepare(T, weighted=proba)
+    walk_options = {"alpha": alpha, "dangling": dangling, "backend": backend}
+
+    # one task per seed page of every journey, each with its own random stream
+    seeds, tasks = {}, []
+    for name, seed_pages in journeys.items():
+        seeds[name], seed_ids = _seed_ids(list(seed_pages), slugs)
+        streams = np.random.SeedSequence(random_state).spawn(len(seed_ids))
+        tasks.extend(
+            (name, seed_id, stream) for seed_id, stream in zip(seed_ids, streams)
+        )
+
+    paths = Parallel(n_jobs=n_jobs)(
+        delayed(_walk_from)(arrays, [seed_id], steps, repeats, stream, walk_options)
+        for _, seed_id, stream in (tqdm(tasks) if verbose >= 1 else tasks)
+    )
+
+    journey_paths = {name: [] for name in journeys}
+    for (name, _, _), walks in zip(tasks, paths):
+        journey_paths[name].append(walks)
+
+    # rank every journey in the same worker pool
+    ranked = Parallel(n_jobs=n_jobs)(
+        delayed(_rank)(slugs, seeds[name], journey_paths[name], repeats)
+        for name in journeys
+    )
+
+    df_info = get_node_information(G)
+    output = {}
+    for name, (results, page_scores) in zip(journeys, ranked):
+        output[name] = {
+            "results": results,
+            "ranking": (
+                None
+                if page_scores is None
+                else add_additional_information(page_scores, G, df_info=df_info)
+            ),
+        }
+
+        if true_pages is not None and name in true_pages:
+            output[name]["evaluation"] = (
+                None
+                if page_scores is None
+                else threshold_scores(page_scores, true_pages[name])
+            )
+
+    return output
+
+
+def _rank(
+    slugs: np.ndarray, seed_pages: List[str], paths: List[np.ndarray], repeats: int
+) -> Tuple[Optional[Dict], Optional[pd.DataFrame]]:
+    """The `repeat_random_walks` results and tf-df ranking of one journey's walks."""
+    results = walk_results(slugs, seed_pages, paths, repeats, "union", level=1)
+    if results is None:
+        return None, None
+
+    return results, page_freq_path_freq_ranking(results)
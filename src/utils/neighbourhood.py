@@ -0,0 +1,190 @@
+"""
+In-process k-hop neighbourhood extraction over a multi-relation graph.
+
+`getSubgraph` in `notebooks/query_dependent_link_analysis.ipynb` sends Cypher queries
+such as "pages within 2 hops of $pages over HYPERLINKS_TO|USER_MOVEMENT" to Neo4j, and
+rebuilds a networkx graph from the records. Here the same queries run locally over
+one CSR matrix per relationship (edge) type, all sharing one node vocabulary, e.g.
+
+    layers = {"HYPERLINKS_TO": structural.matrix, "USER_MOVEMENT": functional.matrix}
+    neighbourhood, node_map = k_hop_subgraph(
+        layers, slugs, seed_pages, k=2, node_mask=whitelist_mask(content_ids, allowed)
+    )
+"""
+
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from src.utils.csr_graph import CSRGraph, subgraph
+
+
+def whitelist_mask(values: Iterable, allowed: Iterable) -> np.ndarray:
+    """
+    A node filter keeping nodes whose attribute value is in an allowed set, e.g.
+    the `contentId` whitelist in the notebook.
+
+    Args:
+        values: the attribute value of every node, in node id order
+        allowed: the values to keep
+    Returns:
+        A boolean numpy array, True for nodes to keep.
+    """
+    return pd.Series(list(values), dtype=object).isin(set(allowed)).to_numpy()
+
+
+def taxon_prefix_mask(
+    taxons: Iterable, prefixes: Iterable[str], separator: str = "|"
+) -> np.ndarray:
+    """
+    A node filter keeping nodes tagged to at least one taxon starting with one of
+    `prefixes`, as `WHERE t.taxonBasePath STARTS WITH '/business'` does in Cypher.
+
+    Args:
+        taxons: the taxons of every node, in node id order, either as lists of taxons
+                or as strings of taxons joined by `separator`. Missing values match
+                nothing.
+        prefixes: taxon prefixes to keep, e.g. ["/business", "/money"]
+        separator: the separator between taxons in string values
+    Returns:
+        A boolean numpy array, True for nodes to keep.
+    """
+    prefixes = tuple(prefixes)
+    exploded = pd.Series(
+        [
+            value.split(separator) if isinstance(value, str) else value
+            for value in taxons
+        ],
+        dtype=object,
+    ).explode()
+    matches = exploded.str.strip().str.startswith(prefixes).fillna(False)
+
+    return matches.groupby(level=0).any().to_numpy(dtype=bool)
+
+
+def reverse_layers(layers: Mapping[str, csr_matrix]) -> Dict[str, csr_matrix]:
+    """
+    Transpose every layer, so in-edges can be followed with CSR row slices. Compute
+    this once and pass it to `k_hop_nodes()` when running many queries.
+    """
+    return {edge_type: layer.T.tocsr() for edge_type, layer in layers.items()}
+
+
+def k_hop_nodes(
+    layers: Mapping[str, csr_matrix],
+    seeds: Iterable[int],
+    k: int = 1,
+    edge_types: Optional[List[str]] = None,
+    direction: str = "both",
+    node_mask: Optional[np.ndarray] = None,
+    reversed_layers: Optional[Mapping[str, csr_matrix]] = None,
+) -> np.ndarray:
+    """
+    Node ids within `k` hops of the seeds, by breadth-first search over the chosen
+    edge types. Only the rows of the frontier are read at each hop, so the cost is
+    proportional to the size of the neighbourhood, not the graph.
+
+    Args:
+        layers: a dictionary of edge type: CSR adjacency matrix, sharing node ids
+        seeds: node ids to start from
+        k: the maximum number of hops
+        edge_types: the edge types to follow. Defaults to all of them.
+        direction: "out" to follow edges forwards, "in" to follow them backwards, or
+                   "both" to ignore direction, like `-[r]-` in Cypher
+        node_mask: an optional boolean array; nodes that are False are never entered,
+                   including seeds
+        reversed_layers: transposed layers from `reverse_layers()`, for "in" and
+                         "both". Computed when needed if not given.
+    Returns:
+        A sorted numpy array of node ids, including the seeds.
+    """
+    if direction not in {"out", "in", "both"}:
+        raise ValueError(f"direction must be 'out', 'in' or 'both': {direction}")
+    if not layers:
+        raise ValueError("layers must have at least one edge type")
+
+    edge_types = list(layers) if edge_types is None else edge_types
+    unknown = set(edge_types) - set(layers)
+    if unknown:
+        raise KeyError(f"Unknown edge types: {sorted(unknown)}")
+
+    adjacency = []
+    if direction in {"out", "both"}:
+        adjacency += [layers[edge_type] for edge_type in edge_types]
+    if direction in {"in", "both"}:
+        if reversed_layers is None:
+            reversed_layers = reverse_layers(
+                {edge_type: layers[edge_type] for edge_type in edge_types}
+            )
+        adjacency += [reversed_layers[edge_type] for edge_type in edge_types]
+
+    n = next(iter(layers.values())).shape[0]
+    visited = np.zeros(n, dtype=bool)
+    allowed = np.ones(n, dtype=bool) if node_mask is None else node_mask
+
+    frontier = np.unique(np.asarray(list(seeds), dtype=int))
+    frontier = frontier[allowed[frontier]]
+    visited[frontier] = True
+
+    for _ in range(k):
+        if frontier.size == 0:
+            break
+        neighbours = np.unique(
+            np.concatenate([matrix[frontier].indices for matrix in adjacency])
+        )
+        frontier = neighbours[~visited[neighbours] & allowed[neighbours]]
+        visited[frontier] = True
+
+    return np.flatnonzero(visited)
+
+
+def k_hop_subgraph(
+    layers: Mapping[str, csr_matrix],
+    slugs: np.ndarray,
+    seed_pages: List[str],
+    k: int = 1,
+    edge_types: Optional[List[str]] = None,
+    direction: str = "both",
+    node_mask: Optional[np.ndarray] = None,
+    reversed_layers: Optional[Mapping[str, csr_matrix]] = None,
+) -> Tuple[Dict[str, CSRGraph], np.ndarray]:
+    """
+    Extract the subgraph induced on the pages within `k` hops of some seed pages.
+
+    Args:
+        layers: a dictionary of edge type: CSR adjacency matrix, sharing node ids
+        slugs: a numpy array of the page path of each node id
+        seed_pages: a list of page slugs to start from; slugs not in the graph are
+                    ignored
+        k: the maximum number of hops
+        edge_types: the edge types to follow, and to keep in the subgraph. Defaults to
+                    all of them.
+        direction: "out", "in" or "both"; see `k_hop_nodes()`
+        node_mask: an optional boolean array of nodes that may be included, e.g. from
+                   `whitelist_mask()` or `taxon_prefix_mask()`
+        reversed_layers: transposed layers from `reverse_layers()`
+    Returns:
+        - a dictionary of edge type: induced `CSRGraph`, all sharing the same nodes
+        - the node mapping, a numpy array where element `i` is the node id in the full
+          graph of node `i` in the subgraph
+    """
+    seeds = pd.Index(slugs).get_indexer(list(seed_pages))
+    node_map = k_hop_nodes(
+        layers,
+        seeds[seeds >= 0],
+        k=k,
+        edge_types=edge_types,
+        direction=direction,
+        node_mask=node_mask,
+        reversed_layers=reversed_layers,
+    )
+
+    edge_types = list(layers) if edge_types is None else edge_types
+    subgraphs = {
+        edge_type: subgraph(CSRGraph(layers[edge_type], slugs), node_map)
+        for edge_type in edge_types
+    }
+
+    return subgraphs, node_map
@@ -0,0 +1,230 @@
+"""
+Personalised PageRank (random walk with restart) rankings from seed pages.
+
+`repeat_random_walks` estimates where random walks from the seed pages end up by
+Monte Carlo. Personalised PageRank computes the same quantity directly: the
+stationary distribution of a walk over the transition matrix that, at every step,
+restarts at a seed page with probability `restart`.
+
+Two solvers are provided:
+- `method="power"` runs sparse power iteration for many seed sets at once, with the
+  restart vectors stored as the columns of one sparse matrix
+- `method="push"` runs the forward push algorithm (Andersen, Chung and Lang, 2006),
+  which only touches pages near the seeds, for one seed set at a time
+"""
+
+from collections import deque
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csc_matrix, csr_matrix
+
+from src.utils.csr_graph import row_normalise
+from src.utils.randomwalks import getSlugs
+
+
+def restart_matrix(seed_sets: Sequence[Sequence[int]], n_nodes: int) -> csc_matrix:
+    """
+    Build a sparse matrix of restart vectors, one column per seed set, where each
+    column spreads a probability of 1 uniformly over its seed node ids.
+
+    Args:
+        seed_sets: a list of lists of node ids
+        n_nodes: the number of nodes in the graph
+    Returns:
+        A `scipy.sparse.csc_matrix` of shape (n_nodes, len(seed_sets)).
+    """
+    # start from empty arrays, so no seed sets give an (n_nodes, 0) matrix
+    rows, cols, values = [np.empty(0, dtype=np.int64)], [np.empty(0)], [np.empty(0)]
+    for j, seeds in enumerate(seed_sets):
+        seeds = np.unique(seeds)
+        rows.append(seeds)
+        cols.append(np.full(len(seeds), j))
+        values.append(np.full(len(seeds), 1.0 / max(len(seeds), 1)))
+
+    return csc_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_nodes, len(seed_sets)),
+    )
+
+
+def ppr_power_iteration(
+    T: csr_matrix,
+    restart_vectors: csc_matrix,
+    restart: float = 0.15,
+    tol: float = 1e-8,
+    max_iter: int = 200,
+) -> np.ndarray:
+    """
+    Personalised PageRank for a batch of restart vectors by sparse power iteration.
+
+    Probability mass on dangling pages (rows of `T` with no out-edges) returns to the
+    seed pages.
+
+    Args:
+        T: a transition probability matrix, or an adjacency matrix, as a CSR matrix.
+           Rows are normalised to sum to 1.
+        restart_vectors: a sparse matrix of shape (n, k), one restart distribution per
+                         column, e.g. from `restart_matrix()`
+        restart: the probability of restarting at the seed pages at each step
+        tol: stop once the L1 change of every column is below `tol`
+        max_iter: the maximum number of iterations
+    Returns:
+        A dense numpy array of shape (n, k), where column j is the personalised
+        PageRank of restart vector j.
+    """
+    P = row_normalise(T)
+    PT = P.T.tocsr()
+    dangling = np.diff(P.indptr) == 0
+
+    R = restart_vectors.toarray()
+    X = R.copy()
+    for _ in range(max_iter):
+        X_last = X
+        X = (1 - restart) * (PT @ X_last + R * X_last[dangling].sum(axis=0))
+        X += restart * R
+        if np.abs(X - X_last).sum(axis=0).max() < tol:
+            break
+
+    return X
+
+
+def ppr_push(
+    T: csr_matrix, seeds: Sequence[int], restart: float = 0.15, epsilon: float = 1e-7
+) -> Dict[int, float]:
+    """
+    Personalised PageRank for one seed set by forward push.
+
+    Residual probability is pushed out from the seed pages until no page holds more
+    than `epsilon` residual per out-edge, so only the neighbourhood of the seeds is
+    visited. Each score underestimates the exact personalised PageRank by at most
+    `epsilon` times the page's out-degree.
+
+    Args:
+        T: a transition probability matrix, or an adjacency matrix, as a CSR matrix.
+           Each row is normalised to sum to 1 as it is visited.
+        seeds: node ids of the seed pages
+        restart: the probability of restarting at the seed pages at each step
+        epsilon: the residual threshold per out-edge
+    Returns:
+        A dictionary of node id: personalised PageRank, for every page reached.
+    """
+    seeds = np.unique(seeds)
+    seed_mass = 1.0 / len(seeds)
+    indptr, indices, data = T.indptr, T.indices, T.data
+
+    scores = {}
+    residual = {seed: seed_mass for seed in seeds}
+    queue = deque(seeds.tolist())
+    queued = set(queue)
+
+    while queue:
+        node = queue.popleft()
+        queued.discard(node)
+        mass = residual.pop(node, 0.0)
+        scores[node] = scores.get(node, 0.0) + restart * mass
+
+        start, end = indptr[node], indptr[node + 1]
+        weights = data[start:end]
+        total = weights.sum()
+        if total > 0:
+            neighbours = indices[start:end]
+            shares = (1 - restart) * mass * weights / total
+        else:
+            # dangling page: the walk restarts at the seeds
+            neighbours = seeds
+            shares = np.full(len(seeds), (1 - restart) * mass * seed_mass)
+
+        for neighbour, share in zip(neighbours.tolist(), shares.tolist()):
+            r = residual.get(neighbour, 0.0) + share
+            residual[neighbour] = r
+            degree = max(indptr[neighbour + 1] - indptr[neighbour], 1)
+            if neighbour not in queued and r > epsilon * degree:
+                queue.append(neighbour)
+                queued.add(neighbour)
+
+    return scores
+
+
+def personalised_pagerank(
+    T: csr_matrix,
+    G,
+    seed_pages: Union[List[str], Dict[str, List[str]]],
+    restart: float = 0.15,
+    method: str = "power",
+    tol: float = 1e-8,
+    max_iter: int = 200,
+    epsilon: float = 1e-7,
+) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """
+    Rank pages by their personalised PageRank from one or many sets of seed pages.
+
+    Args:
+        T: a transition probability matrix from `get_transition_matrix(G)`, or an
+           adjacency matrix, as a CSR matrix
+        G: the networkx graph `T` was built from, reformatted with `reformat_graph()`
+        seed_pages: a list of page slugs, or a dictionary of name: list of page slugs
+                    to rank many seed sets in one batch
+        restart: the probability of restarting at the seed pages at each step; this
+                 is 1 - the PageRank damping factor
+        method: "power" for batched sparse power iteration, or "push" for the local
+                forward push algorithm
+        tol: convergence tolerance for `method="power"`
+        max_iter: maximum number of iterations for `method="power"`
+        epsilon: residual threshold for `method="push"`
+    Returns:
+        For a list of seed pages, a pd.DataFrame with the columns `pagePath` and
+        `ppr_score`, ranked by `ppr_score`, covering every page with a positive score.
+        This can be passed to `add_additional_information(page_scores, G,
+        score="ppr_score")`. For a dictionary of seed sets, a dictionary of name:
+        pd.DataFrame.
+    """
+    single = not isinstance(seed_pages, dict)
+    named_seeds = {None: seed_pages} if single else seed_pages
+
+    slugs = np.array(getSlugs(G), dtype=object)
+    slug_index = pd.Index(slugs)
+
+    seed_ids = {}
+    for name, pages in named_seeds.items():
+        ids = slug_index.get_indexer(list(pages))
+        not_found = [page for page, i in zip(pages, ids) if i < 0]
+        if not_found:
+            print(not_found, "could not be found in the graph")
+        seed_ids[name] = ids[ids >= 0]
+
+    empty = pd.DataFrame({"pagePath": [], "ppr_score": []})
+    rankings = {name: empty for name, ids in seed_ids.items() if len(ids) == 0}
+    names = [name for name, ids in seed_ids.items() if len(ids) > 0]
+
+    if method == "power" and names:
+        R = restart_matrix([seed_ids[name] for name in names], len(slugs))
+        X = ppr_power_iteration(T, R, restart=restart, tol=tol, max_iter=max_iter)
+        columns = {name: X[:, j] for j, name in enumerate(names)}
+        for name, scores in columns.items():
+            nodes = np.flatnonzero(scores > 0)
+            rankings[name] = _ranking(slugs[nodes], scores[nodes])
+
+    elif method == "push":
+        T = csr_matrix(T)
+        for name in names:
+            scores = ppr_push(T, seed_ids[name], restart=restart, epsilon=epsilon)
+            nodes = np.fromiter(scores.keys(), dtype=int, count=len(scores))
+            values = np.fromiter(scores.values(), dtype=float, count=len(scores))
+            rankings[name] = _ranking(slugs[nodes], values)
+
+    elif method != "power":
+        raise ValueError(f"method must be 'power' or 'push': {method}")
+
+    if single:
+        return rankings[None]
+
+    return {name: rankings[name] for name in named_seeds}
+
+
+def _ranking(pages: np.ndarray, scores: np.ndarray) -> pd.DataFrame:
+    """Rank pages by score, in the shape of `page_freq_path_freq_ranking()`."""
+    return pd.DataFrame({"pagePath": pages, "ppr_score": scores}).sort_values(
+        by="ppr_score", ascending=False, kind="mergesort", ignore_index=True
+    )
@@ -0,0 +1,522 @@
+"""
+A memoised runner for the whole user journey pipeline, from seed pages to an enriched
+page ranking.
+
+Each step of the usual notebook chain is a `Stage`:
+
+    seed1_pages -> sessions -> nodes_and_edges -> graph -> reformatted_graph
+        -> pruned_graph -> transition_matrix -> walks -> ranking -> enriched_ranking
+    pruned_graph -> node_information -> enriched_ranking
+
+Every stage output is cached on disk under a hash of the stage's parameters and the
+hashes of its inputs, so a stage only runs again when something upstream of it
+changed. Changing only the walk parameters reuses the cached graph and transition
+matrix, and reruns only `walks`, `ranking` and `enriched_ranking`. Stages whose inputs
+are ready run concurrently in a thread pool, e.g. `node_information` alongside
+`transition_matrix` and `walks`.
+
+Sessions come from BigQuery by default. Pass a `sessions_path` to a CSV or Parquet
+file of page hits, in the schema returned by `extract_seed_sessions`, to start from
+that file instead; it is then hashed by content. `sample_percent` samples that
+percentage of sessions from BigQuery, and node and edge counts are rescaled by the
+fraction the sessions record; see `extract_nodes_and_edges`. It cannot be combined
+with a `sessions_path`, whose file does not record whether it is a sample.
+`n_bootstrap` adds bootstrap confidence intervals to the edge weights, resampled with
+`bootstrap_random_state`, so the walks' `random_state` does not change the graph. Set
+`shard_days` to query BigQuery in date shards of that many days, `shard_workers` at a
+time; see `src.utils.session_shards`.
+
+The `prune_*` parameters prune the graph before the transition matrix is built; see
+`src.utils.pruning.prune_graph`. The walk seed pages are never pruned. The
+`pruned_graph` output is the pruned graph and a report of what each step removed, or
+the reformatted graph and None if no `prune_*` parameter is set.
+
+Run it from the command line with a JSON file of parameters (see `DEFAULT_PARAMS`):
+
+    python -m src.utils.pipeline params.json --output outputs/ranking.csv
+    python -m src.utils.pipeline params.json --set steps=50 --set repeats=200
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# parameters of the pipeline; `seed0_pages`, and `start_date` and `end_date` or
+# `sessions_path`, have no defaults
+DEFAULT_PARAMS = {
+    "sessions_path": None,
+    "link_index_path": None,
+    "sample_percent": None,
+    "shard_days": None,
+    "n_bootstrap": 0,
+    "bootstrap_random_state": 0,
+    "prune_min_edge_weight": None,
+    "prune_top_k": None,
+    "prune_k_core": None,
+    "prune_exclude_document_types": None,
+    "prune_min_session_hits": None,
+    "walk_seed_pages": None,
+    "symmetric": False,
+    "steps": 100,
+    "repeats": 100,
+    "proba": False,
+    "combine": "union",
+    "level": 1,
+    "alpha": 0.0,
+    "dangling": "stop",
+    "random_state": 0,
+}
+
+# `prune_graph` options, set by the `prune_` parameters of the same name
+PRUNE_OPTIONS = (
+    "min_edge_weight",
+    "top_k",
+    "k_core",
+    "exclude_document_types",
+    "min_session_hits",
+)
+
+# parameters that change how a stage runs, but not its output, so are not hashed
+EXECUTION_PARAMS = {"n_jobs", "backend", "shard_workers"}
+
+
+class Stage(NamedTuple):
+    """
+    A pipeline step.
+
+    Attributes:
+        name: the stage name, also the name of its output
+        inputs: the names of the stages whose outputs this stage takes
+        params: the names of the pipeline parameters this stage uses
+        run: a function of a dictionary of input name: output, and a dictionary of
+             parameter name: value, returning the stage output
+        version: change this to invalidate cached outputs when `run` changes
+    """
+
+    name: str
+    inputs: Tuple[str, ...]
+    params: Tuple[str, ...]
+    run: Callable[[Dict, Dict], Any]
+    version: str = "1"
+
+
+def _seed1_pages(inputs: Dict, params: Dict) -> List[str]:
+    from src.utils.create_functional_network import identify_seed_pages
+
+    # seed1 pages only select sessions from BigQuery
+    if params["sessions_path"] is not None:
+        return []
+
+    return identify_seed_pages(
+        params["seed0_pages"], link_index=params["link_index_path"]
+    )
+
+
+def _sessions(inputs: Dict, params: Dict):
+    import pandas as pd
+
+    from src.utils.create_functional_network import extract_seed_sessions
+
+    path = params["sessions_path"]
+    if path is not None and params["sample_percent"] is not None:
+        raise ValueError("sample_percent only samples sessions from BigQuery")
+    if path is None and params["shard_days"] is not None:
+        from src.utils.session_shards import extract_seed_sessions_sharded
+
+        return extract_seed_sessions_sharded(
+            params["start_date"],
+            params["end_date"],
+            params["seed0_pages"],
+            inputs["seed1_pages"],
+            sample_percent=params["sample_percent"],
+            shard_days=params["shard_days"],
+            max_workers=params.get("shard_workers", 4),
+        )
+    if path is None:
+        return extract_seed_sessions(
+            params["start_date"],
+            params["end_date"],
+            params["seed0_pages"],
+            inputs["seed1_pages"],
+            sample_percent=params["sample_percent"],
+        )
+    if str(path).endswith(".parquet"):
+        return pd.read_parquet(path)
+
+    return pd.read_csv(path)
+
+
+def _nodes_and_edges(inputs: Dict, params: Dict):
+    from src.utils.create_functional_network import extract_nodes_and_edges
+
+    # `extract_nodes_and_edges` adds columns to its argument, and rescales counts by
+    # the `sample_fraction` in its `attrs`, which `copy()` keeps
+    return extract_nodes_and_edges(
+        inputs["sessions"].copy(),
+        n_bootstrap=params["n_bootstrap"],
+        random_state=params["bootstrap_random_state"],
+    )
+
+
+def _graph(inputs: Dict, params: Dict):
+    from src.utils.create_functional_network import create_networkx_graph
+
+    return create_networkx_graph(*inputs["nodes_and_edges"])
+
+
+def _reformatted_graph(inputs: Dict, params: Dict):
+    from src.utils.randomwalks import reformat_graph
+
+    return reformat_graph(inputs["graph"])
+
+
+def _pruned_graph(inputs: Dict, params: Dict):
+    from src.utils.pruning import prune_graph
+
+    options = {
+        name: params["prune_" + name]
+        for name in PRUNE_OPTIONS
+        if params["prune_" + name] is not None
+    }
+    if not options:
+        return inputs["reformatted_graph"], None
+
+    return prune_graph(
+        inputs["reformatted_graph"],
+        protected_pages=params["walk_seed_pages"] or params["seed0_pages"],
+        **options,
+    )
+
+
+def _transition_matrix(inputs: Dict, params: Dict):
+    from src.utils.randomwalks import get_transition_matrix
+
+    return get_transition_matrix(
+        inputs["pruned_graph"][0], symmetric=params["symmetric"]
+    )
+
+
+def _walks(inputs: Dict, params: Dict):
+    from src.utils.randomwalks import repeat_random_walks
+
+    return repeat_random_walks(
+        params["steps"],
+        params["repeats"],
+        inputs["transition_matrix"],
+        inputs["pruned_graph"][0],
+        params["walk_seed_pages"] or params["seed0_pages"],
+        params["proba"],
+        params["combine"],
+        params["level"],
+        verbose=0,
+        n_jobs=params.get("n_jobs", 1),
+        random_state=params["random_state"],
+        alpha=params["alpha"],
+        dangling=params["dangling"],
+        backend=params.get("backend", "numpy"),
+    )
+
+
+def _ranking(inputs: Dict, params: Dict):
+    from src.utils.randomwalks import page_freq_path_freq_ranking
+
+    return page_freq_path_freq_ranking(inputs["walks"])
+
+
+def _node_information(inputs: Dict, params: Dict):
+    from src.utils.randomwalks import get_node_information
+
+    return get_node_information(inputs["pruned_graph"][0])
+
+
+def _enriched_ranking(inputs: Dict, params: Dict):
+    from src.utils.randomwalks import add_additional_information
+
+    return add_additional_information(
+        inputs["ranking"],
+        inputs["pruned_graph"][0],
+        df_info=inputs["node_information"],
+    )
+
+
+STAGES = [
+    Stage(
+        "seed1_pages",
+        (),
+        ("seed0_pages", "sessions_path", "link_index_path"),
+        _seed1_pages,
+        version="2",
+    ),
+    Stage(
+        "sessions",
+        ("seed1_pages",),
+        (
+            "start_date",
+            "end_date",
+            "seed0_pages",
+            "sessions_path",
+            "sample_percent",
+            "shard_days",
+        ),
+        _sessions,
+    ),
+    Stage(
+        "nodes_and_edges",
+        ("sessions",),
+        ("n_bootstrap", "bootstrap_random_state"),
+        _nodes_and_edges,
+    ),
+    Stage("graph", ("nodes_and_edges",), (), _graph),
+    Stage("reformatted_graph", ("graph",), (), _reformatted_graph),
+    Stage(
+        "pruned_graph",
+        ("reformatted_graph",),
+        ("seed0_pages", "walk_seed_pages")
+        + tuple("prune_" + name for name in PRUNE_OPTIONS),
+        _pruned_graph,
+    ),
+    Stage("transition_matrix", ("pruned_graph",), ("symmetric",), _transition_matrix),
+    Stage(
+        "walks",
+        ("transition_matrix", "pruned_graph"),
+        (
+            "seed0_pages",
+            "walk_seed_pages",
+            "steps",
+            "repeats",
+            "proba",
+            "combine",
+            "level",
+            "alpha",
+            "dangling",
+            "random_state",
+        ),
+        _walks,
+    ),
+    Stage("ranking", ("walks",), (), _ranking),
+    Stage("node_information", ("pruned_graph",), (), _node_information),
+    Stage(
+        "enriched_ranking",
+        ("ranking", "pruned_graph", "node_information"),
+        (),
+        _enriched_ranking,
+    ),
+]
+
+
+def file_hash(path: str) -> str:
+    """The SHA-256 hash of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def _param_value(name: str, value: Any) -> Any:
+    """A parameter value as it is hashed; files are hashed by content, not path."""
+    if name.endswith("_path") and value is not None:
+        return file_hash(value)
+
+    return value
+
+
+class Pipeline:
+    """
+    Runs pipeline stages in dependency order, caching each output on disk.
+
+    Args:
+        stages: the stages, in an order where every stage comes after its inputs
+        cache_dir: the cache folder. Defaults to `pipeline_cache` in the
+                   `DIR_DATA_INTERIM` folder.
+        max_workers: the number of stages to run at once
+    """
+
+    def __init__(
+        self,
+        stages: Iterable[Stage] = tuple(STAGES),
+        cache_dir: Optional[str] = None,
+        max_workers: int = 4,
+    ):
+        self.stages = {stage.name: stage for stage in stages}
+        if cache_dir is None:
+            cache_dir = Path(os.getenv("DIR_DATA_INTERIM", "data/interim"))
+            cache_dir = cache_dir / "pipeline_cache"
+        self.cache_dir = Path(cache_dir)
+        self.max_workers = max_workers
+
+    def keys(self, params: Dict) -> Dict[str, str]:
+        """
+        The cache key of every stage output, for the given parameters.
+
+        Args:
+            params: pipeline parameters; missing ones take `DEFAULT_PARAMS`
+        Returns:
+            A dictionary of stage name: hexadecimal hash of the stage name, version,
+            parameters and input keys.
+        """
+        params = {**DEFAULT_PARAMS, **params}
+        values = {
+            name: _param_value(name, value)
+            for name, value in params.items()
+            if name not in EXECUTION_PARAMS
+        }
+        keys = {}
+        for stage in self.stages.values():
+            description = {
+                "stage": stage.name,
+                "version": stage.version,
+                "params": {name: values.get(name) for name in stage.params},
+                "inputs": [keys[name] for name in stage.inputs],
+            }
+            keys[stage.name] = hashlib.sha256(
+                json.dumps(description, sort_keys=True, default=str).encode()
+            ).hexdigest()
+
+        return keys
+
+    def _path(self, stage: str, key: str) -> Path:
+        return Path(self.cache_dir, stage, f"{key}.pkl")
+
+    def _load(self, stage: str, key: str) -> Any:
+        with open(self._path(stage, key), "rb") as f:
+            return pickle.load(f)
+
+    def _save(self, stage: str, key: str, output: Any) -> None:
+        path = self._path(stage, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first, so an interrupted run leaves no partial
+        # cache entry
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary, "wb") as f:
+            pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+
+    def plan(self, params: Dict, targets: Optional[Iterable[str]] = None) -> Dict:
+        """
+        Work out which stages to run, and which cached outputs to load.
+
+        Args:
+            params: pipeline parameters
+            targets: the stages whose outputs are wanted. Defaults to the last stage.
+        Returns:
+            A dictionary of stage name: "run" or "load", for the stages needed to get
+            the targets; cached stages only needed by other cached stages are left
+            out.
+        """
+        return self._plan(self.keys(params), targets)
+
+    def _plan(self, keys: Dict[str, str], targets: Optional[Iterable[str]]) -> Dict:
+        needed = set(targets or [list(self.stages)[-1]])
+        plan = {}
+        for name in reversed(list(self.stages)):
+            if name not in needed:
+                continue
+            if self._path(name, keys[name]).exists():
+                plan[name] = "load"
+            else:
+                plan[name] = "run"
+                needed.update(self.stages[name].inputs)
+
+        return {name: plan[name] for name in self.stages if name in plan}
+
+    def run(
+        self, params: Dict, targets: Optional[Iterable[str]] = None, verbose: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Run the pipeline, reusing cached stage outputs.
+
+        Args:
+            params: pipeline parameters; missing ones take `DEFAULT_PARAMS`
+            targets: the stages whose outputs are wanted. Defaults to the last stage.
+            verbose: if 1, print each stage as it finishes
+        Returns:
+            A dictionary of stage name: output, for the targets and every stage
+            loaded or run on the way.
+        """
+        params = {**DEFAULT_PARAMS, **params}
+        keys = self.keys(params)
+        plan = self._plan(keys, targets)
+        outputs, running = {}, {}
+
+        def execute(name):
+            start = time.perf_counter()
+            if plan[name] == "load":
+                return self._load(name, keys[name]), time.perf_counter() - start
+            stage = self.stages[name]
+            output = stage.run({i: outputs[i] for i in stage.inputs}, params)
+            self._save(name, keys[name], output)
+            return output, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while len(outputs) < len(plan):
+                for name in plan:
+                    ready = plan[name] == "load" or all(
+                        i in outputs for i in self.stages[name].inputs
+                    )
+                    if name not in outputs and name not in running and ready:
+                        running[name] = pool.submit(execute, name)
+
+                done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                for name in [name for name in running if running[name] in done]:
+                    outputs[name], seconds = running.pop(name).result()
+                    if verbose:
+                        print(f"{name:20s} {plan[name]:4s} {seconds:8.2f}s")
+
+        return outputs
+
+
+def _parse_value(value: str) -> Any:
+    """A `--set` value: JSON if it parses, otherwise a string."""
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("params", help="a JSON file of pipeline parameters")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="override a parameter; VALUE is parsed as JSON where possible",
+    )
+    parser.add_argument("--target", action="append", choices=[s.name for s in STAGES])
+    parser.add_argument("--cache-dir")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="write the last target to this CSV file")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only print which stages would run"
+    )
+    args = parser.parse_args()
+
+    with open(args.params) as f:
+        params = json.load(f)
+    for setting in args.set:
+        name, _, value = setting.partition("=")
+        params[name] = _parse_value(value)
+
+    pipeline = Pipeline(cache_dir=args.cache_dir, max_workers=args.workers)
+    if args.dry_run:
+        for name, action in pipeline.plan(params, args.target).items():
+            print(f"{name:20s} {action}")
+        return
+
+    outputs = pipeline.run(params, args.target)
+    if args.output:
+        target = (args.target or [STAGES[-1].name])[-1]
+        outputs[target].to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Per-stage profiling of the functional network pipeline.
+
+Decorating a pipeline function with `@profiled()` records, each time it runs:
+
+- `wall_seconds` and `cpu_seconds` (CPU time of this process only, so not of joblib
+  worker processes)
+- `max_rss_mb`, the process's peak resident memory after the stage, and
+  `max_rss_growth_mb`, how much the stage raised it
+- `tracemalloc_peak_mb`, the stage's peak Python allocation, if
+  `WUJ_PROFILE_TRACEMALLOC` is set; tracing slows pandas-heavy stages down
+- `inputs` and `outputs`, the row, node, edge or item counts of the arguments and
+  return value
+
+Profiling is off unless the `WUJ_PROFILE` environment variable is set, and then costs
+one dictionary lookup per call. Set it to `1` or `stderr` to print one JSON record per
+line to standard error, or to a file path to append the records to that file:
+
+    WUJ_PROFILE=outputs/profile.jsonl python my_analysis.py
+
+Functions registered with `add_hook` also receive every record, as a dictionary, for
+example to collect them in a notebook.
+"""
+
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+ENV_VARIABLE = "WUJ_PROFILE"
+TRACEMALLOC_ENV_VARIABLE = "WUJ_PROFILE_TRACEMALLOC"
+
+_HOOKS: List[Callable[[Dict], None]] = []
+
+# the highest traced peak of each running stage, from before any stage started inside
+# it reset the peak; tracing starts with the first stage and stops with the last
+_TRACED_PEAKS: Dict[int, int] = {}
+_TRACING_LOCK = threading.Lock()
+_started_tracing = False
+
+
+def add_hook(hook: Callable[[Dict], None]) -> None:
+    """Call `hook` with every profiling record, and switch profiling on."""
+    _HOOKS.append(hook)
+
+
+def remove_hook(hook: Callable[[Dict], None]) -> None:
+    """Stop calling `hook` with profiling records."""
+    _HOOKS.remove(hook)
+
+
+def enabled() -> bool:
+    """Whether profiling records are being collected."""
+    return bool(_HOOKS) or os.environ.get(ENV_VARIABLE, "0") not in ("", "0")
+
+
+def size(value: Any) -> Optional[Dict[str, int]]:
+    """
+    The size of a pipeline input or output.
+
+    Args:
+        value: any object
+    Returns:
+        `{"nodes": ..., "edges": ...}` for a graph, `{"rows": ..., "nnz": ...}` for a
+        sparse matrix, `{"rows": ...}` for an array or pandas object, the length of
+        each sized item for a dictionary, `{"items": ...}` for any other sized
+        object, and None otherwise.
+    """
+    if hasattr(value, "number_of_nodes") and hasattr(value, "number_of_edges"):
+        return {"nodes": value.number_of_nodes(), "edges": value.number_of_edges()}
+    if hasattr(value, "nnz"):
+        return {"rows": value.shape[0], "nnz": value.nnz}
+    if hasattr(value, "shape"):
+        return {"rows": value.shape[0]} if value.shape else None
+    if isinstance(value, dict):
+        return {
+            str(key): len(item)
+            for key, item in value.items()
+            if hasattr(item, "__len__")
+        }
+    if hasattr(value, "__len__") and not isinstance(value, (str, bytes)):
+        return {"items": len(value)}
+
+    return None
+
+
+def _output_sizes(result: Any, outputs: Optional[Sequence[str]]) -> Dict:
+    """The sizes of a return value, naming the items of a returned tuple `outputs`."""
+    if outputs is not None and isinstance(result, tuple):
+        return {name: size(item) for name, item in zip(outputs, result)}
+
+    return {"result": size(result)}
+
+
+def _max_rss_mb() -> Optional[float]:
+    """The peak resident memory of this process, in MB, where the OS reports it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def emit(record: Dict) -> None:
+    """Send a profiling record to the `WUJ_PROFILE` destination and every hook."""
+    for hook in list(_HOOKS):
+        hook(record)
+
+    destination = os.environ.get(ENV_VARIABLE, "0")
+    if destination in ("", "0"):
+        return
+    line = json.dumps(record, default=str)
+    if destination in ("1", "stderr"):
+        print(line, file=sys.stderr)
+    else:
+        with open(destination, "a") as f:
+            f.write(line + "\n")
+
+
+def _start_tracing(token: int) -> None:
+    """
+    Start measuring the peak traced allocation of a stage. Resetting the peak would
+    lose the peaks of the stages already running, so they are saved first.
+    """
+    global _started_tracing
+    with _TRACING_LOCK:
+        if not _TRACED_PEAKS:
+            _started_tracing = not tracemalloc.is_tracing()
+            if _started_tracing:
+                tracemalloc.start()
+        peak = tracemalloc.get_traced_memory()[1]
+        for running in _TRACED_PEAKS:
+            _TRACED_PEAKS[running] = max(_TRACED_PEAKS[running], peak)
+        tracemalloc.reset_peak()
+        _TRACED_PEAKS[token] = 0
+
+
+def _stop_tracing(token: int) -> float:
+    """
+    The peak traced allocation of a stage since `_start_tracing`, in MB. Tracing stops
+    when no stage is running.
+    """
+    with _TRACING_LOCK:
+        peak = max(_TRACED_PEAKS.pop(token), tracemalloc.get_traced_memory()[1])
+        if not _TRACED_PEAKS and _started_tracing:
+            tracemalloc.stop()
+
+    return peak / 2**20
+
+
+def _run(func: Callable, stage: str, outputs, args, kwargs) -> Any:
+    """Run `func`, and emit its profiling record, even if it raises an exception."""
+    trace = bool(os.environ.get(TRACEMALLOC_ENV_VARIABLE))
+    token = object()
+    if trace:
+        _start_tracing(id(token))
+
+    bound = inspect.signature(func).bind_partial(*args, **kwargs)
+    record = {
+        "stage": stage,
+        "function": f"{func.__module__}.{func.__qualname__}",
+        "started": datetime.now(timezone.utc).isoformat(),
+    }
+    sizes = {name: size(value) for name, value in bound.arguments.items()}
+    record["inputs"] = {name: sizes[name] for name in sizes if sizes[name] is not None}
+    rss_before = _max_rss_mb()
+    wall, cpu = time.perf_counter(), time.process_time()
+    result, error = None, None
+    try:
+        result = func(*args, **kwargs)
+        return result
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record["wall_seconds"] = time.perf_counter() - wall
+        record["cpu_seconds"] = time.process_time() - cpu
+        record["max_rss_mb"] = _max_rss_mb()
+        record["max_rss_growth_mb"] = (
+            None if rss_before is None else record["max_rss_mb"] - rss_before
+        )
+        record["tracemalloc_peak_mb"] = _stop_tracing(id(token)) if trace else None
+        record["outputs"] = None if error else _output_sizes(result, outputs)
+        record["error"] = error
+        emit(record)
+
+
+def profiled(
+    stage: Optional[str] = None, outputs: Optional[Sequence[str]] = None
+) -> Callable:
+    """
+    Decorate a pipeline stage, to emit a profiling record each time it runs while
+    profiling is on.
+
+    Args:
+        stage: the stage name in the records. Defaults to the function name.
+        outputs: names for the items of a returned tuple, e.g. `("nodes", "edges")`
+    Returns:
+        A decorator.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        name = stage or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            return _run(func, name, outputs, args, kwargs)
+
+        return wrapper
+
+    return decorator
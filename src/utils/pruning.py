@@ -0,0 +1,188 @@
+"""
+Prune a functional graph before building its transition matrix.
+
+Graphs from `create_networkx_graph` have long tails of edges taken by one or two
+sessions, and pages with very few session hits. They add rows and entries to the
+transition matrix, and scatter random walks over pages unrelated to the journey.
+`prune_graph` removes them in a fixed order of steps, each optional:
+
+1. `exclude_document_types`: drop pages of the given document types
+2. `min_session_hits`: drop pages with fewer session hits (`sessionHitsAll`)
+3. `min_edge_weight`: drop edges with a lower `edgeWeight`
+4. `top_k`: keep only the `top_k` heaviest out-edges of each page
+5. `k_core`: keep only the k-core, the largest subgraph in which every page has at
+   least `k_core` neighbours, ignoring edge direction and self-loops
+
+Every step works on the CSR matrix of the graph, and the pruned networkx graph is
+built once at the end, keeping node and edge attributes. Seed pages can be protected
+from every node-removing step.
+"""
+
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, diags
+
+from src.utils.csr_graph import from_networkx
+
+
+def _keep_nodes(matrix: csr_matrix, keep: np.ndarray) -> csr_matrix:
+    """Remove the edges of nodes that are not kept, keeping the matrix shape."""
+    mask = diags(keep.astype(np.float64))
+    matrix = (mask @ matrix @ mask).tocsr()
+    matrix.eliminate_zeros()
+
+    return matrix
+
+
+def top_k_edges(matrix: csr_matrix, k: int) -> csr_matrix:
+    """
+    Keep the `k` heaviest entries of each row of a CSR matrix; ties are broken by
+    column order.
+
+    Args:
+        matrix: a CSR matrix with sorted indices
+        k: the number of entries to keep per row
+    Returns:
+        A CSR matrix of the same shape.
+    """
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    # order each row's entries by descending weight, keeping column order for ties
+    order = np.lexsort((np.arange(matrix.nnz), -matrix.data, rows))
+    rank = np.empty(matrix.nnz, dtype=np.int64)
+    rank[order] = np.arange(matrix.nnz) - matrix.indptr[rows[order]]
+
+    keep = rank < k
+    return csr_matrix(
+        (matrix.data[keep], (rows[keep], matrix.indices[keep])), shape=matrix.shape
+    )
+
+
+def k_core_mask(matrix: csr_matrix, k: int, keep: np.ndarray) -> np.ndarray:
+    """
+    The nodes of the k-core of a graph, ignoring edge direction and self-loops.
+
+    Args:
+        matrix: a CSR adjacency matrix
+        k: the smallest number of neighbours of a node in the k-core
+        keep: a boolean array of the nodes to consider
+    Returns:
+        A boolean array, True for the nodes in the k-core.
+    """
+    neighbours = ((matrix + matrix.T) != 0).astype(np.int64).tocsr()
+    neighbours.setdiag(0)
+    neighbours.eliminate_zeros()
+
+    keep = keep.copy()
+    degree = np.asarray(neighbours @ keep.astype(np.int64)).ravel()
+    while True:
+        removed = keep & (degree < k)
+        if not removed.any():
+            return keep
+        keep &= ~removed
+        degree -= np.asarray(neighbours @ removed.astype(np.int64)).ravel()
+
+
+def _node_values(G, attribute: str) -> np.ndarray:
+    return np.array([data.get(attribute) for _, data in G.nodes(data=True)])
+
+
+def prune_graph(
+    G,
+    min_edge_weight: Optional[float] = None,
+    top_k: Optional[int] = None,
+    k_core: Optional[int] = None,
+    exclude_document_types: Optional[Iterable[str]] = None,
+    min_session_hits: Optional[float] = None,
+    protected_pages: Optional[Iterable[str]] = None,
+    drop_isolates: bool = True,
+) -> Tuple[object, pd.DataFrame]:
+    """
+    Prune a functional graph, reporting what each step removed.
+
+    Args:
+        G: a networkx graph from `create_networkx_graph()`, before or after
+           `reformat_graph()`
+        min_edge_weight: drop edges with an `edgeWeight` below this
+        top_k: keep only the `top_k` heaviest out-edges of each page
+        k_core: keep only the pages with at least `k_core` neighbours in the pruned
+                graph
+        exclude_document_types: drop pages with these document types
+        min_session_hits: drop pages with fewer `sessionHitsAll`
+        protected_pages: page paths that are never dropped, e.g. the seed pages
+        drop_isolates: if True, drop pages left with no edges at the end
+    Returns:
+        - the pruned graph, of the same type as `G`. If `G` was reformatted, its nodes
+          are relabelled 0, 1, ... in their original order, so `getSlugs()` and
+          `get_transition_matrix()` of the pruned graph agree
+        - a pd.DataFrame with one row per step that ran, and the columns `step`,
+          `nodes_removed`, `edges_removed`, `nodes` and `edges`
+    """
+    graph = from_networkx(G)
+    matrix = graph.matrix
+    nodes = list(G.nodes)
+    keep = np.ones(len(nodes), dtype=bool)
+    protected = pd.Index(graph.slugs).isin(list(protected_pages or []))
+    report = [("input", 0, 0, len(nodes), matrix.nnz)]
+
+    def record(step, new_keep, new_matrix):
+        report.append(
+            (
+                step,
+                int(keep.sum() - new_keep.sum()),
+                matrix.nnz - new_matrix.nnz,
+                int(new_keep.sum()),
+                new_matrix.nnz,
+            )
+        )
+        return new_keep, new_matrix
+
+    def drop(step, remove):
+        new_keep = keep & ~(remove & ~protected)
+        return record(step, new_keep, _keep_nodes(matrix, new_keep))
+
+    if exclude_document_types is not None:
+        document_types = _node_values(G, "documentType")
+        remove = np.isin(document_types, list(exclude_document_types))
+        keep, matrix = drop("exclude_document_types", remove)
+    if min_session_hits is not None:
+        hits = pd.to_numeric(pd.Series(_node_values(G, "sessionHitsAll")))
+        keep, matrix = drop("min_session_hits", (hits < min_session_hits).to_numpy())
+    if min_edge_weight is not None:
+        heavy = matrix.copy()
+        heavy.data[heavy.data < min_edge_weight] = 0
+        heavy.eliminate_zeros()
+        keep, matrix = record("min_edge_weight", keep, heavy)
+    if top_k is not None:
+        keep, matrix = record("top_k", keep, top_k_edges(matrix, top_k))
+    if k_core is not None:
+        keep, matrix = drop("k_core", ~k_core_mask(matrix, k_core, keep))
+    if drop_isolates:
+        degree = np.diff(matrix.indptr) + np.diff(matrix.tocsc().indptr)
+        keep, matrix = drop("drop_isolates", degree == 0)
+
+    return _build_graph(G, nodes, keep, matrix), pd.DataFrame(
+        report, columns=["step", "nodes_removed", "edges_removed", "nodes", "edges"]
+    )
+
+
+def _build_graph(G, nodes: list, keep: np.ndarray, matrix: csr_matrix):
+    """The subgraph of `G` on the kept nodes and the nonzero entries of `matrix`."""
+    import networkx as nx
+
+    pruned = G.__class__()
+    pruned.graph.update(G.graph)
+    pruned.add_nodes_from((nodes[i], G.nodes[nodes[i]]) for i in np.flatnonzero(keep))
+
+    coo = matrix.tocoo()
+    pruned.add_edges_from(
+        (nodes[u], nodes[v], G.edges[nodes[u], nodes[v]])
+        for u, v in zip(coo.row, coo.col)
+    )
+
+    reformatted = len(nodes) > 0 and "properties" in G.nodes[nodes[0]]
+    if reformatted:
+        pruned = nx.convert_node_labels_to_integers(pruned, ordering="default")
+
+    return pruned
@@ -1,12 +1,13 @@
 import numpy as np
 import pandas as pd
-import networkx as nx
-from tqdm.notebook import tqdm
-import matplotlib.pyplot as plt
 from itertools import product
-from joblib import Parallel, delayed
 from scipy.sparse import csr_matrix
 
+from src.utils import walk_engine
+from src.utils.csr_graph import row_normalise
+from src.utils.evaluation import evaluate_masks
+from src.utils.profiling import profiled
+
 def group(original_list, n):
     '''Groups original_list into a list of lists, where each list contains n consecutive
     elements from the original_list'''
@@ -19,17 +20,25 @@ def evaluate(true_pages, predicted_pages, beta=2):
     predicted_pages ia a list of pages predicted to belong to a WUJ
     beta determines how much more important recall is than precision when computing fscore
     
-    returns precision, recall and fscore
+    returns precision, recall and fscore. Each is 0 rather than undefined when there are
+    no predicted pages, no true pages, or no correct predictions.
+
+    To score many predicted sets, or every cut-off of a ranking, see
+    src/utils/evaluation.py
     '''
     
     true_pages = set(true_pages)
     predicted_pages = set(predicted_pages)
+    n_correct = len(true_pages.intersection(predicted_pages))
     
     # what proportion of true pages were correctly predicted?
-    recall = len(true_pages.intersection(predicted_pages))/len(true_pages)
+    recall = n_correct / len(true_pages) if true_pages else 0.0
     
     # what proportion of predicted pages are true pages?
-    precision = len(true_pages.intersection(predicted_pages))/len(predicted_pages)
+    precision = n_correct / len(predicted_pages) if predicted_pages else 0.0
+
+    if precision == 0 and recall == 0:
+        return (precision, recall, 0.0)
 
     # compute f score, a harmonic mean of precision and recall
     fscore = ((1 + beta**2) * (precision * recall))/((precision * beta**2) + recall)
@@ -47,6 +56,9 @@ def showGraph(G, k=None, iterations=50, node_size=100, figsize=None):
     Prints graph information and plots the graph, G.
     Takes figsize as input, a tuple, e.g. (10,10)
     '''
+    import networkx as nx
+    import matplotlib.pyplot as plt
+
     print(nx.info(G))
     nx.spring_layout(G, k=k, iterations=iterations)
     plt.figure(figsize=(figsize))
@@ -118,7 +130,12 @@ def check_seed_pages(seeds, G):
     else:
         return []
     
-def repeat_random_walks(steps, repeats, T, G, seed_pages, proba, combine, level=0, verbose=1, n_jobs=1):
+
+@profiled()
+def repeat_random_walks(steps, repeats, T, G, seed_pages, proba, combine, level=0,
+                        verbose=1, n_jobs=1, random_state=None, tolerance=None,
+                        batch_size=20, top_k=50, alpha=0.0, dangling='stop',
+                        backend='numpy'):
     '''
     Performs 'repeats' many random walks per seed page in seed_pages, each with 'steps' many steps. seed_pages is a list
     of page slugs. e.g. 
@@ -172,46 +189,324 @@ def repeat_random_walks(steps, repeats, T, G, seed_pages, proba, combine, level=
     1 CPU available for other tasks.
     For small experiments, I recommend n_jobs = 1. The overhead of n_jobs > 1 is only
     worth it for large experiments, e.g. when repeats > 100.
+
+    random_state seeds the random number generator, for reproducible walks.
+
+    The 'repeats' many random walks from each seed page run together, as vectorised
+    operations over the CSR arrays of T (see walk_engine.walk). Visited pages are
+    combined as boolean arrays over node ids, and only turned into slugs for the
+    returned dictionary.
+
+    Adaptive mode: if tolerance is set (e.g. tolerance=0.01), 'repeats' is the most
+    random walks to perform per seed page, rather than the number to perform. Walks are
+    performed in batches of batch_size per seed page, stopping early once the results
+    stop changing between batches:
+    - the Jaccard similarity of the sets of all pages visited before and after the
+      batch, and
+    - the Spearman rank correlation of the top_k pages by tf-df score (see
+      page_freq_path_freq_ranking)
+    are both at least 1 - tolerance.
+    The returned dictionary then also has 'repeats', the number of random walks
+    performed per seed page, and 'stability', a dictionary of the final 'jaccard' and
+    'rank_correlation'.
+    n_jobs is not used in adaptive mode: each batch walks from every seed page together.
+
+    alpha is a restart probability: at each step, a random walk jumps back to its seed
+    page with probability alpha. This focuses the walks on pages close to the seed
+    pages, so fewer steps are wasted far from the WUJ.
+    dangling is what a random walk does at a page with no out-links: 'stop' (the walk
+    ends, as it always did with an adjacency matrix), 'restart' (jump back to the seed
+    page) or 'teleport' (jump to any page uniformly at random, as the dangling rows of
+    get_transition_matrix do).
+
+    backend is 'numpy', 'numba' (a compiled, multi-threaded kernel, if numba is
+    installed) or 'auto' (numba if it is installed). Both give the same walks for the
+    same random_state; see walk_engine.walk.
+    '''
+    from joblib import Parallel, delayed
+    from tqdm.notebook import tqdm
+
+    slugs = np.array(getSlugs(G), dtype=object)
+    seed_pages, seed_ids = _seed_ids(seed_pages, slugs)
+    arrays = walk_engine.prepare(T, weighted=proba)
+    walk_options = {'alpha': alpha, 'dangling': dangling, 'backend': backend}
+
+    if tolerance is not None:
+        paths, stability = _adaptive_walks(arrays, seed_ids, steps, repeats, tolerance,
+                                           batch_size, top_k, random_state,
+                                           walk_options)
+        repeats = len(paths[0]) if paths else 0
+        if verbose >= 1:
+            print('Stopped after', repeats, 'random walks per seed page:', stability)
+
+        results = walk_results(slugs, seed_pages, paths, repeats, combine, level)
+        if results is not None:
+            results.update(repeats=repeats, stability=stability)
+        return results
+
+    # an independent random number stream per seed page
+    streams = np.random.SeedSequence(random_state).spawn(len(seed_ids))
+    jobs = list(zip(seed_ids, streams))
+    if verbose >= 1:
+        jobs = tqdm(jobs)
+
+    # for each seed node, compute paths taken, as node ids
+    paths = Parallel(n_jobs=n_jobs)(
+        delayed(_walk_from)(arrays, [seed_id], steps, repeats, stream, walk_options)
+        for seed_id, stream in jobs
+    )
+
+    return walk_results(slugs, seed_pages, paths, repeats, combine, level)
+
+
+def _adaptive_walks(arrays, seed_ids, steps, max_repeats, tolerance, batch_size, top_k,
+                    random_state, walk_options=None):
     '''
+    Performs random walks from every node id in seed_ids in batches of batch_size walks
+    per seed, until the set of pages visited and the top_k pages by tf-df score change
+    by less than tolerance between batches (see walk_stability), or max_repeats walks
+    per seed have been performed.
 
-    # find seed pages not found in the graph
-    not_found = set(check_seed_pages(seed_pages, G))
+    walk_options is a dictionary of keyword arguments for walk_engine.walk.
 
-    # remove seed pages not found in the graph
-    seed_pages = [page for page in seed_pages if page not in not_found]
+    returns a list of 2-D arrays of paths, one per seed, and a dictionary of the final
+    stability metrics.
+    '''
+    n_nodes = len(arrays.indptr) - 1
+    batches = []
+    counts = np.zeros(n_nodes, dtype=np.int64)
+    stability = {'jaccard': np.nan, 'rank_correlation': np.nan}
+
+    n_batches = int(np.ceil(max_repeats / batch_size))
+    for stream in np.random.SeedSequence(random_state).spawn(n_batches):
+        repeats = min(batch_size, max_repeats - batch_size * len(batches))
+        walks = _walk_from(arrays, seed_ids, steps, repeats, stream, walk_options)
+        batches.append(np.split(walks, len(seed_ids)) if len(seed_ids) > 0 else [])
+
+        previous, counts = counts, counts + visit_counts(walks, n_nodes)
+        if len(batches) > 1:
+            stability = walk_stability(previous, counts, top_k)
+            if min(stability.values()) >= 1 - tolerance:
+                break
+
+    paths = [
+        np.concatenate([batch[i] for batch in batches]) for i in range(len(seed_ids))
+    ]
 
-    # for each seed node, compute paths taken
-    if verbose >= 1:
-        paths_taken = Parallel(n_jobs=n_jobs)(delayed(M_walks_get_slugs)(T,G,steps,repeats,seed_page,proba) for seed_page in tqdm(seed_pages))
+    return paths, stability
+
+
+def walk_stability(previous_counts, counts, top_k=50):
+    '''
+    Measures how much the results of random walks changed after more walks were
+    performed. previous_counts and counts are the number of walks that visited each
+    node, before and after, from visit_counts.
+
+    A page's tf-df score in page_freq_path_freq_ranking grows with the number of walks
+    that visit it, so the top_k pages by count are the top_k pages by tf-df score.
+
+    returns a dictionary of
+    'jaccard': the Jaccard similarity of the sets of pages visited before and after
+    'rank_correlation': the Spearman rank correlation of the counts of the top_k pages,
+    before and after (taking the pages in the top_k either before or after)
+    '''
+    from scipy.stats import spearmanr
+
+    before, after = previous_counts > 0, counts > 0
+    n_union = np.count_nonzero(before | after)
+    jaccard = np.count_nonzero(before & after) / n_union if n_union > 0 else 1.0
+
+    top = np.union1d(np.argsort(-previous_counts, kind='stable')[:top_k],
+                     np.argsort(-counts, kind='stable')[:top_k])
+    x, y = previous_counts[top], counts[top]
+    if np.ptp(x) == 0 or np.ptp(y) == 0:
+        # a rank correlation is undefined for constant scores
+        rank_correlation = 1.0 if np.ptp(x) == np.ptp(y) else 0.0
     else:
-        paths_taken = Parallel(n_jobs=n_jobs)(delayed(M_walks_get_slugs)(T,G,steps,repeats,seed_page,proba) for seed_page in seed_pages)
-    
-    if combine == 'union':
-        if level == 0:
-            pages_visited = [set([page for path in paths for page in path]) for paths in paths_taken]
-        elif level == 1:
-            pages_visited = {page for paths in paths_taken for path in paths for page in path}
+        rank_correlation = spearmanr(x, y)[0]
 
-    elif combine == 'intersection':
-        if level == 0:
-            pages_visited = [set.intersection(*map(set,paths)) for paths in paths_taken]
-        elif level == 1:
-            pages_visited = set.intersection(*[set([page for path in paths for page in path]) for paths in paths_taken])
+    return {'jaccard': float(jaccard), 'rank_correlation': float(rank_correlation)}
 
-    elif combine == 'no':
-        pages_visited = paths_taken
 
+def _seed_ids(seed_pages, slugs):
+    '''
+    Finds the node ids of seed_pages in slugs, an array of the slugs of every node.
+    Prints the seed pages that could not be found, and returns the seed pages that were
+    found and their node ids.
+    '''
+    found = pd.Index(slugs).get_indexer(seed_pages)
+    not_found = [page for page, i in zip(seed_pages, found) if i < 0]
+    if len(not_found) > 0:
+        print(not_found, 'could not be found in the graph')
+
+    return [page for page, i in zip(seed_pages, found) if i >= 0], found[found >= 0]
+
+
+def _walk_from(arrays, seed_ids, steps, repeats, seed_sequence, walk_options=None):
+    '''
+    Performs 'repeats' many random walks from each node id in seed_ids, returning a 2-D
+    array of paths. walk_options is a dictionary of keyword arguments for
+    walk_engine.walk, e.g. alpha and dangling.
+    '''
+    starts = np.repeat(np.asarray(seed_ids, dtype=np.int64), repeats)
+    return walk_engine.walk(arrays, starts, steps, np.random.default_rng(seed_sequence),
+                            **(walk_options or {}))
+
+
+def visit_counts(paths, n_nodes):
+    '''
+    Counts how many of the random walks in paths visit each node.
+    paths is a 2-D array of node ids from walk_engine, one row per walk. A walk that
+    visits a page several times counts once.
+
+    returns an array of n_nodes counts, indexed by node id.
+    '''
+    # the first occurrence of each node on each walk, after sorting the walk
+    ordered = np.sort(paths, axis=1)
+    first = np.ones(ordered.shape, dtype=bool)
+    first[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+
+    visited = ordered[first & (ordered != walk_engine.STOPPED)]
+    return np.bincount(visited, minlength=n_nodes)
+
+
+def combine_visits(counts, repeats, combine, level=0):
+    '''
+    Unions or intersects the pages visited by random walks, as boolean masks over node
+    ids rather than sets of slugs. counts is an array of shape (number of seed pages,
+    number of nodes), where counts[i, j] is the number of the 'repeats' many random
+    walks from seed page i that visit node j. See visit_counts.
+
+    Union and intersection are then reductions over the masks:
+    combine='union', level=0 gives counts > 0 (a walk visited the page)
+    combine='intersection', level=0 gives counts == repeats (every walk visited the
+    page)
+    level=1 reduces the per-seed unions over seed pages, with any for 'union' and all
+    for 'intersection', as repeat_random_walks does.
+
+    returns a 2-D boolean array with one row per seed page if level=0, or one boolean
+    array if level=1. returns None if combine or level is invalid.
+    '''
+    visited = counts > 0
+    if combine == 'union':
+        per_seed, reduce = visited, np.any
+    elif combine == 'intersection':
+        per_seed, reduce = counts == repeats, np.all
     else:
         print(combine, 'is an invalid path combination method')
         return
 
+    if level == 0:
+        return per_seed
+    elif level == 1:
+        return reduce(visited, axis=0)
+
+    print(level, 'is an invalid level')
+
+
+def walk_results(slugs, seed_pages, paths, repeats, combine, level=0):
+    '''
+    Builds the dictionary returned by repeat_random_walks from random walks over node
+    ids. slugs is an array of the slugs of every node, and paths is a list of 2-D arrays
+    of walks from walk_engine, one per seed page in seed_pages, each holding the
+    'repeats' many walks from that seed page.
+
+    Pages are combined as boolean masks over node ids (see combine_visits), and only
+    turned into slugs here, at the end.
+    '''
+    if len(seed_pages) == 0:
+        print("No pages found")
+        return
+
+    # pages visited by each walk, in the node order of G, as random_walk returns them
+    paths_taken = [
+        [slugs[ids].tolist() for ids in walk_engine.unique_visits(walks)]
+        for walks in paths
+    ]
+
+    if combine == 'no':
+        pages_visited = paths_taken
+    else:
+        counts = np.array([visit_counts(walks, len(slugs)) for walks in paths])
+        masks = combine_visits(counts, repeats, combine, level)
+        if masks is None:
+            return
+        if masks.ndim == 1:
+            pages_visited = set(slugs[masks])
+        else:
+            pages_visited = [set(slugs[mask]) for mask in masks]
+
     if not pages_visited:
         print("No pages found")
         return
 
-    return {'seeds': seed_pages, 'pages_visited': pages_visited, 'paths_taken': paths_taken}
+    return {'seeds': seed_pages, 'pages_visited': pages_visited,
+            'paths_taken': paths_taken}
+
+
+def pages_mask(pages, slugs):
+    '''
+    Returns a boolean array over node ids, True for the nodes whose slug is in pages.
+    slugs is an array of the slugs of every node. Pages not in slugs are ignored.
+    '''
+    return pd.Index(slugs).isin(list(pages))
+
+
+def evaluate_mask(true_mask, predicted_mask, beta=2, n_true=None):
+    '''
+    As evaluate, for boolean arrays over node ids rather than lists of pages, counting
+    pages with count_nonzero. n_true is the number of true pages, if some true pages are
+    not in the graph and so cannot be in true_mask.
+
+    returns precision, recall and fscore. Each is 0 rather than undefined when nothing
+    is predicted or found.
+    '''
+    scores = evaluate_masks(true_mask, predicted_mask, beta=beta, n_true=n_true).iloc[0]
+
+    return (float(scores['precision']), float(scores['recall']),
+            float(scores['fscore']))
+
+
+def repeat_second_order_walks(steps, repeats, T, G, seed_pages, proba, combine, level=0,
+                              p=1, q=1, random_state=None):
+    '''
+    Performs 'repeats' many second-order (node2vec) random walks per seed page in
+    seed_pages, each with 'steps' many steps, and combines the pages visited as
+    repeat_random_walks does. The output can be passed to page_freq_path_freq_ranking.
+
+    A second-order walk remembers the page it has just come from. Having moved from
+    page t to page v, the next page x is chosen in proportion to the edge weight (or
+    uniformly, if proba=False) times 1/p if x is t, 1 if t links to x, and 1/q
+    otherwise. So p > 1 discourages going straight back, q < 1 explores outwards
+    (depth-first), and q > 1 stays close to the seed pages (breadth-first). p = q = 1 is
+    an ordinary random walk.
+
+    All walks run together, as vectorised operations over the CSR arrays of T; see
+    walk_engine.walk_second_order.
+
+    T is an adjaceny matrix or a transition probability matrix. They are CSR sparse
+    matrices.
+    If using a probability transition matrix, set proba=True.
+    See repeat_random_walks for combine and level.
+    random_state seeds the random number generator, for reproducible walks.
+    '''
+    slugs = np.array(getSlugs(G), dtype=object)
+    seed_pages, seed_ids = _seed_ids(seed_pages, slugs)
+    if len(seed_ids) == 0:
+        # walk_results prints "No pages found" and returns None
+        return walk_results(slugs, seed_pages, [], repeats, combine, level)
+
+    starts = np.repeat(seed_ids, repeats)
+    arrays = walk_engine.prepare(T, weighted=proba)
+    paths = walk_engine.walk_second_order(arrays, starts, steps, p=p, q=q,
+                                          rng=np.random.default_rng(random_state))
+
+    return walk_results(slugs, seed_pages, np.split(paths, len(seed_pages)), repeats,
+                        combine, level)
+
 
-def M_N_Experiment(steps, repeats, T, G, target_pages, seed_pages, proba, n_jobs):
+def M_N_Experiment(steps, repeats, T, G, target_pages, seed_pages, proba, n_jobs,
+                   random_state=None, alpha=0.0, dangling='stop', backend='numpy'):
     '''
     For a given transition matrix T, graph G, set of WUJ target_pages and seed_pages within a WUJ,
     this function tries every combination of steps and repeats. E.g.
@@ -225,22 +520,49 @@ def M_N_Experiment(steps, repeats, T, G, target_pages, seed_pages, proba, n_jobs
     Set proba=True if T contains probabilities, and proba=False if T is an adjacency matrix.
 
     n_jobs = number of workers to use during execution, for parallelisation.
+
+    random_state seeds the random number generator, for reproducible experiments.
+    alpha, dangling and backend set the restart probability, dangling page policy and
+    walk_engine backend; see repeat_random_walks.
+
+    Each combination unions the pages visited by all its random walks (combine='union',
+    level=1 in repeat_random_walks) as a boolean array over node ids, and scores it
+    against a boolean array of the target pages, so no sets of slugs are built.
     '''
+    from joblib import Parallel, delayed
+    from tqdm.notebook import tqdm
+
+    slugs = np.array(getSlugs(G), dtype=object)
+    seed_pages, seed_ids = _seed_ids(seed_pages, slugs)
+    arrays = walk_engine.prepare(T, weighted=proba)
+    walk_options = {'alpha': alpha, 'dangling': dangling, 'backend': backend}
+    target_mask = pages_mask(target_pages, slugs)
+    n_true = len(set(target_pages))
+
     # all combinations of N and M
     NMs = list(product(steps,repeats))
+    streams = np.random.SeedSequence(random_state).spawn(len(NMs))
 
-    results = Parallel(n_jobs=n_jobs)(delayed(repeat_random_walks)(step, repeat, T, G, seed_pages, proba, 'union', 1, 0, 1) for step, repeat in tqdm(NMs))
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_walk_from)(arrays, seed_ids, step, repeat, stream, walk_options)
+        for (step, repeat), stream in zip(tqdm(NMs), streams)
+    )
+
+    # score every combination at once
+    visited = np.array([visit_counts(paths, len(slugs)) > 0 for paths in results])
+    visited = visited.reshape(len(NMs), len(slugs))
+    evaluation = evaluate_masks(target_mask, visited, n_true=n_true)
 
     scores = []
-    for i, result in enumerate(results):
-        path = result['pages_visited']
-        p, r, f = evaluate(target_pages, path)
+    columns = ['precision', 'recall', 'fscore', 'n_predicted']
+    for i, (p, r, f, size) in enumerate(evaluation[columns].itertuples(index=False)):
         n, m = NMs[i]
-        scores.append([p,r,f,n,m,len(path)])
+        scores.append([p, r, f, n, m, int(size)])
 
     return scores
 
 
+@profiled()
 def page_freq_path_freq_ranking(results):
     '''
     Args:
@@ -301,32 +623,88 @@ def page_freq_path_freq_ranking(results):
     return page_scores
 
 
-def get_transition_matrix(G):
+def symmetrise(A, reciprocal="sum"):
     '''
-    Computes a transition probability matrix for a graph, using normalised edge weights.
+    Makes a weighted adjacency matrix undirected, without looping over edges.
 
     Args:
-        G: a weighted networkx graph
-    
+        A: a weighted adjacency matrix, as a sparse matrix
+        reciprocal: how to combine the weights of the edges u->v and v->u:
+                    - "sum": add them, W + W^T, as `biased_random_walks.ipynb` does when
+                      summing edge weights into an `nx.Graph`. Self-loops are counted
+                      once.
+                    - "max": keep the larger weight
+                    - "min": keep the smaller weight, so only pages linked in both
+                      directions stay connected
+
     Return:
-        csr_matrix(T_probs): a transition probability matrix as a a csr matrix
+        the symmetric adjacency matrix as a csr matrix
     '''
+    A = csr_matrix(A, dtype=np.float64)
+
+    if reciprocal == "sum":
+        S = A + A.T
+        S.setdiag(A.diagonal())
+    elif reciprocal == "max":
+        S = A.maximum(A.T)
+    elif reciprocal == "min":
+        S = A.minimum(A.T)
+    else:
+        raise ValueError(f"reciprocal must be 'sum', 'max' or 'min': {reciprocal}")
 
-    # Create array with edge weight
-    T = nx.adjacency_matrix(G, weight="edgeWeight").todense()
-    T_array = np.array(T)
+    S = csr_matrix(S)
+    S.eliminate_zeros()
 
-    # Transform edge weight into probabilities
+    return S
 
-    # Normalisation
-    sum_of_rows = T_array.sum(axis=1)
-    T_probs = T_array / sum_of_rows[:, np.newaxis]
 
-    # Rows with only 0s = nan. Replace nan values with 1/Tarray.shape[0]
-    np.nan_to_num(T_probs, nan=1 / T_array.shape[0], copy=False)
+def get_transition_matrix(G, symmetric=False, reciprocal="sum", dangling="uniform"):
+    '''
+    Computes a transition probability matrix for a graph, using normalised edge weights.
+    The matrix is built and normalised sparsely, so the directed and undirected
+    variants cost the same.
+
+    Args:
+        G: a weighted networkx graph
+        symmetric: set symmetric=True to treat the graph as undirected, combining
+                   the weights of reciprocal edges; see `symmetrise()`
+        reciprocal: how to combine reciprocal edge weights when symmetric=True,
+                    "sum", "max" or "min"
+        dangling: what to do with pages with no out-edges. "uniform" gives them a
+                  uniform 1/N transition to every page (the original behaviour);
+                  None leaves their rows empty, so random walks stop there.
+    
+    Return:
+        csr_matrix(T_probs): a transition probability matrix as a a csr matrix
+    '''
+    import networkx as nx
+
+    # Create sparse array with edge weight
+    T = csr_matrix(nx.adjacency_matrix(G, weight="edgeWeight"), dtype=np.float64)
+
+    if symmetric:
+        T = symmetrise(T, reciprocal=reciprocal)
+
+    # Transform edge weight into probabilities, normalising rows in place
+    row_normalise(T, copy=False)
+    T.eliminate_zeros()
+
+    # Rows with only 0s. Replace with 1/T.shape[0]
+    if dangling == "uniform":
+        n = T.shape[0]
+        empty_rows = np.flatnonzero(np.diff(T.indptr) == 0)
+        T = T + csr_matrix(
+            (
+                np.full(len(empty_rows) * n, 1 / n),
+                (np.repeat(empty_rows, n), np.tile(np.arange(n), len(empty_rows))),
+            ),
+            shape=T.shape,
+        )
+    elif dangling is not None:
+        raise ValueError(f"dangling must be 'uniform' or None: {dangling}")
 
     # Convert into a transition matrix (for random walks function)
-    return csr_matrix(T_probs)
+    return csr_matrix(T)
 
 def reformat_graph(G):
     '''
@@ -339,6 +717,7 @@ def reformat_graph(G):
     Return:
         G: networkx graph
     '''
+    import networkx as nx
 
     for index,data in G.nodes(data=True):
         data['properties'] = dict()
@@ -348,7 +727,151 @@ def reformat_graph(G):
 
     return G
 
-def add_additional_information(page_scores, G):
+
+# Document supertypes
+
+NEWS_AND_COMMS_DOCTYPES = {
+    "medical_safety_alert",
+    "drug_safety_update",
+    "news_article",
+    "news_story",
+    "press_release",
+    "world_location_news_article",
+    "world_news_story",
+    "fatality_notice",
+    "tax_tribunal_decision",
+    "utaac_decision",
+    "asylum_support_decision",
+    "employment_appeal_tribunal_decision",
+    "employment_tribunal_decision",
+    "service_standard_report",
+    "cma_case",
+    "decision",
+    "oral_statement",
+    "written_statement",
+    "authored_article",
+    "correspondence",
+    "speech",
+    "government_response",
+    "case_study",
+}
+
+SERVICE_DOCTYPES = {
+    "completed_transaction",
+    "local_transaction",
+    "form",
+    "calculator",
+    "smart_answer",
+    "simple_smart_answer",
+    "place",
+    "licence",
+    "step_by_step_nav",
+    "transaction",
+    "answer",
+    "guide",
+}
+
+GUIDANCE_AND_REG_DOCTYPES = {
+    "regulation",
+    "detailed_guide",
+    "manual",
+    "manual_section",
+    "guidance",
+    "map",
+    "calendar",
+    "statutory_guidance",
+    "notice",
+    "international_treaty",
+    "travel_advice",
+    "promotional",
+    "international_development_fund",
+    "countryside_stewardship_grant",
+    "esi_fund",
+    "business_finance_support_scheme",
+    "statutory_instrument",
+    "hmrc_manual",
+    "standard",
+}
+
+POLICY_AND_ENGAGE_DOCTYPES = {
+    "impact_assessment",
+    "policy_paper",
+    "open_consultation",
+    "closed_consultation",
+    "consultation_outcome",
+    "policy_and_engagement",
+}
+
+RESEARCH_AND_STATS_DOCTYPES = {
+    "dfid_research_output",
+    "independent_report",
+    "research",
+    "statistics",
+    "national_statistics",
+    "statistics_announcement",
+    "national_statistics_announcement",
+    "official_statistics_announcement",
+    "statistical_data_set",
+    "official_statistics",
+}
+
+TRANSPARENCY_DOCTYPES = {
+    "transparency",
+    "corporate_report",
+    "foi_release",
+    "aaib_report",
+    "raib_report",
+    "maib_report",
+}
+
+# documentType -> documentSupertype lookup table. Supertypes are listed in order of
+# precedence, so a document type in more than one set takes the first supertype, and
+# any document type not listed here is "other"
+DOCUMENT_SUPERTYPES = {}
+for _supertype, _doctypes in [
+    ("news and communication", NEWS_AND_COMMS_DOCTYPES),
+    ("services", SERVICE_DOCTYPES),
+    ("guidance and regulation", GUIDANCE_AND_REG_DOCTYPES),
+    ("policy and engagement", POLICY_AND_ENGAGE_DOCTYPES),
+    ("research and statistics", RESEARCH_AND_STATS_DOCTYPES),
+    ("transparency", TRANSPARENCY_DOCTYPES),
+]:
+    for _doctype in _doctypes:
+        DOCUMENT_SUPERTYPES.setdefault(_doctype, _supertype)
+
+
+def get_node_information(G):
+    '''
+    Builds a node attribute table for a graph, indexed by page path.
+
+    Args:
+        G: networkx graph, reformatted with `reformat_graph()`
+
+    Return:
+        df_info: pandas dataframe indexed by `pagePath`, with the columns
+                 `documentType`, `sessionHitsAll`, `entranceHit`, `exitHit`,
+                 `entranceAndExitHit` and `sessionHits`
+    '''
+    columns = [
+        "documentType",
+        "sessionHitsAll",
+        "entranceHit",
+        "exitHit",
+        "entranceAndExitHit",
+        "sessionHits",
+    ]
+    nodes = [info for _, info in G.nodes(data=True)]
+
+    df_info = pd.DataFrame(
+        {column: [info.get(column) for info in nodes] for column in columns},
+        index=pd.Index([info["properties"]["name"] for info in nodes], name="pagePath"),
+    )
+
+    # keep the first occurrence of each page path, so the join below is one-to-one
+    return df_info[~df_info.index.duplicated(keep="first")]
+
+
+def add_additional_information(page_scores, G, df_info=None, score="tfdf_max"):
     '''
     Add additional information to the random walk output: 
     - document type
@@ -362,174 +885,28 @@ def add_additional_information(page_scores, G):
     Args:
         page_scores: pandas dataframe returned by `page_freq_path_freq_ranking()`
         G: networkx graph
+        df_info: optional node attribute table returned by `get_node_information(G)`.
+                 Pass this in when enriching several rankings from the same graph, so
+                 the table is only built once.
+        score: the ranking score column to keep, e.g. "ppr_score" for the rankings
+               returned by `personalised_pagerank()`
 
     Return:
         df_merged: pandas dataframe with additional information
     '''
 
-    # Document supertypes
-    news_and_comms_doctypes = {
-        "medical_safety_alert",
-        "drug_safety_update",
-        "news_article",
-        "news_story",
-        "press_release",
-        "world_location_news_article",
-        "world_news_story",
-        "fatality_notice",
-        "fatality_notice",
-        "tax_tribunal_decision",
-        "utaac_decision",
-        "asylum_support_decision",
-        "employment_appeal_tribunal_decision",
-        "employment_tribunal_decision",
-        "employment_tribunal_decision",
-        "service_standard_report",
-        "cma_case",
-        "decision",
-        "oral_statement",
-        "written_statement",
-        "authored_article",
-        "correspondence",
-        "speech",
-        "government_response",
-        "case_study",
-    }
-
-    service_doctypes = {
-        "completed_transaction",
-        "local_transaction",
-        "form",
-        "calculator",
-        "smart_answer",
-        "simple_smart_answer",
-        "place",
-        "licence",
-        "step_by_step_nav",
-        "transaction",
-        "answer",
-        "guide",
-    }
-
-    guidance_and_reg_doctypes = {
-        "regulation",
-        "detailed_guide",
-        "manual",
-        "manual_section",
-        "guidance",
-        "map",
-        "calendar",
-        "statutory_guidance",
-        "notice",
-        "international_treaty",
-        "travel_advice",
-        "promotional",
-        "international_development_fund",
-        "countryside_stewardship_grant",
-        "esi_fund",
-        "business_finance_support_scheme",
-        "statutory_instrument",
-        "hmrc_manual",
-        "standard",
-    }
-
-    policy_and_engage_doctypes = {
-        "impact_assessment",
-        "policy_paper",
-        "open_consultation",
-        "policy_paper",
-        "closed_consultation",
-        "consultation_outcome",
-        "policy_and_engagement",
-    }
-
-    research_and_stats_doctypes = {
-        "dfid_research_output",
-        "independent_report",
-        "research",
-        "statistics",
-        "national_statistics",
-        "statistics_announcement",
-        "national_statistics_announcement",
-        "official_statistics_announcement",
-        "statistical_data_set",
-        "official_statistics",
-    }
-
-    transparency_doctypes = {
-        "transparency",
-        "corporate_report",
-        "foi_release",
-        "aaib_report",
-        "raib_report",
-        "maib_report",
-    }
-
-    # Create a df with `pagePath`: `documentType`, `sessionHitsAll`, `entranceHit`, `exitHit`, `entranceAndExitHit`
-    df_dict = {
-        info["properties"]["name"]: [
-            info["documentType"],
-            info["sessionHitsAll"],
-            info["entranceHit"],
-            info["exitHit"],
-            info["entranceAndExitHit"],
-            info["sessionHits"],
-        ]
-        for node, info in G.nodes(data=True)
-    }
-    df_dict = {
-        k: v for (k, v) in df_dict.items() if k in page_scores["pagePath"].tolist()
-    }
-    df_info = (
-        pd.DataFrame.from_dict(
-            df_dict,
-            orient="index",
-            columns=[
-                "documentType",
-                "sessionHitsAll",
-                "entranceHit",
-                "exitHit",
-                "entranceAndExitHit",
-                "sessionHits",
-            ],
-        )
-        .rename_axis("pagePath")
-        .reset_index()
-    )
-
-    # Create a df with document supertypes
-    document_type_dict = dict.fromkeys(list(set(df_info["documentType"])))
-
-    for docType, docSupertype in document_type_dict.items():
-        if docType in news_and_comms_doctypes:
-            document_type_dict[docType] = "news and communication"
+    if df_info is None:
+        df_info = get_node_information(G)
 
-        elif docType in service_doctypes:
-            document_type_dict[docType] = "services"
+    # hash join the ranking onto the node attribute table; pages that are not nodes of
+    # G are dropped, and the ranking order is kept
+    df_merged = page_scores.join(df_info, on="pagePath", how="inner")
 
-        elif docType in guidance_and_reg_doctypes:
-            document_type_dict[docType] = "guidance and regulation"
-
-        elif docType in policy_and_engage_doctypes:
-            document_type_dict[docType] = "policy and engagement"
-
-        elif docType in research_and_stats_doctypes:
-            document_type_dict[docType] = "research and statistics"
-
-        elif docType in transparency_doctypes:
-            document_type_dict[docType] = "transparency"
-
-        else:
-            document_type_dict[docType] = "other"
-
-    df_docSuper = pd.DataFrame(
-        document_type_dict.items(), columns=["documentType", "documentSupertype"]
+    # map every document type to its supertype in one pass
+    df_merged["documentSupertype"] = (
+        df_merged["documentType"].map(DOCUMENT_SUPERTYPES).fillna("other")
     )
 
-    # Merge dfs
-    df_merged = pd.merge(page_scores, df_info, on="pagePath")
-    df_merged = pd.merge(df_merged, df_docSuper, how="left")
-
     # Reoder and rename df columns
     df_merged = df_merged[
         [
@@ -541,9 +918,9 @@ def add_additional_information(page_scores, G):
             "exitHit",
             "entranceAndExitHit",
             "sessionHits",
-            "tfdf_max",
+            score,
         ]
-    ]
+    ].reset_index(drop=True)
     df_merged = df_merged.rename(
         columns={
             "pagePath": "page path",
@@ -558,4 +935,4 @@ def add_additional_information(page_scores, G):
         }
     )
 
-    return df_merged
\ No newline at end of file
+    return df_merged
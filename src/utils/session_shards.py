@@ -0,0 +1,285 @@
+"""
+Extract seed sessions from BigQuery in date shards, run concurrently.
+
+`extract_seed_sessions` over a long date range is one large query job, followed by one
+long download of its result. `extract_seed_sessions_sharded` splits the range into
+shards of a few days, runs the shard queries in a bounded thread pool, and streams
+each shard's result, page by page, into its own Parquet file. A shard file is only
+written once its query has finished, so after a failure, rerunning with the same
+arguments reuses the shards already extracted.
+
+`merge_shards` then joins the shards. Universal Analytics splits a session at
+midnight, and both parts keep the same `sessionId`; the part after a shard boundary
+starts again at `hitNumber` 1, and is flagged as an entrance. The merge numbers the
+hits of such a session on from the earlier part, and clears the entrance and exit
+flags at the boundary, so the session is one journey again. A session is only
+selected by a shard if it visits a seed page within that shard, so the part of a
+session on the other side of a shard boundary is missing if that part visits no seed
+page.
+
+Each shard's `sessionHits` only counts the sessions within the shard, and summing them
+would count a session split at a boundary twice. So `sessionHits` is counted once more,
+over the whole date range, by a lighter query of the number of sessions visiting each
+page of the merged sessions, which is also saved, and reused, as a Parquet file.
+
+Use `src.make_data.fake_bigquery.FakeBigQueryClient` as the client to run this
+without BigQuery.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from src.utils.create_functional_network import (
+    _page_session_hits_job,
+    _seed_sessions_job,
+)
+from src.utils.profiling import profiled
+
+DATE_FORMAT = "%Y%m%d"
+
+# the Parquet schema of a shard, so that every page of a result is written alike
+SHARD_COLUMNS = {
+    "sessionId": "string",
+    "hitNumber": "int64",
+    "pagePath": "string",
+    "documentType": "string",
+    "topLevelTaxons": "string",
+    "bottomLevelTaxons": "string",
+    "isEntrance": "bool",
+    "isExit": "bool",
+    "sessionHits": "int64",
+}
+
+
+def date_shards(
+    start_date: str, end_date: str, shard_days: int = 7
+) -> List[Tuple[str, str]]:
+    """
+    Split a date range into consecutive shards.
+
+    Args:
+        start_date: the first date, as YYYYMMDD
+        end_date: the last date, as YYYYMMDD
+        shard_days: the number of days in each shard; the last shard may be shorter
+    Returns:
+        A list of (first date, last date) of each shard, as YYYYMMDD.
+    """
+    start = datetime.strptime(start_date, DATE_FORMAT)
+    end = datetime.strptime(end_date, DATE_FORMAT)
+    if end < start:
+        raise ValueError("end_date must not be before start_date")
+
+    shards = []
+    while start <= end:
+        last = min(start + timedelta(days=shard_days - 1), end)
+        shards.append((start.strftime(DATE_FORMAT), last.strftime(DATE_FORMAT)))
+        start = last + timedelta(days=1)
+
+    return shards
+
+
+def _shard_path(
+    output_dir: Path,
+    shard: Tuple[str, str],
+    seed0_pages: Sequence[str],
+    seed1_pages: Sequence[str],
+    sample_percent: Optional[int],
+    name: str = "seed_sessions",
+) -> Path:
+    """The Parquet file of a shard, named by a hash of everything that selects it."""
+    digest = hashlib.sha256(
+        json.dumps([sorted(seed0_pages), sorted(seed1_pages), sample_percent]).encode()
+    ).hexdigest()[:16]
+
+    return output_dir / f"{name}_{shard[0]}_{shard[1]}_{digest}.parquet"
+
+
+def _extract_shard(
+    client,
+    shard: Tuple[str, str],
+    seed0_pages: Sequence[str],
+    seed1_pages: Sequence[str],
+    sample_percent: Optional[int],
+    path: Path,
+    page_size: int,
+) -> Path:
+    """Run one shard's query, and stream its result into a Parquet file."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if path.exists():
+        return path
+
+    job = _seed_sessions_job(
+        shard[0], shard[1], seed0_pages, seed1_pages, sample_percent, client
+    )
+    schema = pa.schema(
+        [(name, pa.type_for_alias(dtype)) for name, dtype in SHARD_COLUMNS.items()]
+    )
+
+    # write to a temporary file, so only complete shards are ever reused
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with pq.ParquetWriter(tmp, schema) as writer:
+        for frame in job.result(page_size=page_size).to_dataframe_iterable():
+            writer.write_table(
+                pa.Table.from_pandas(
+                    frame[list(SHARD_COLUMNS)], schema=schema, preserve_index=False
+                )
+            )
+    os.replace(tmp, path)
+
+    return path
+
+
+def _extract_page_session_hits(
+    client,
+    date_range: Tuple[str, str],
+    pages: Sequence[str],
+    sample_percent: Optional[int],
+    path: Path,
+) -> pd.Series:
+    """Run the page session hits query over the whole date range, once."""
+    if not path.exists():
+        job = _page_session_hits_job(
+            date_range[0], date_range[1], pages, sample_percent, client
+        )
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        job.to_dataframe().to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+
+    return pd.read_parquet(path).set_index("pagePath")["sessionHits"]
+
+
+def merge_shards(
+    shards: Sequence[pd.DataFrame], session_hits: pd.Series
+) -> pd.DataFrame:
+    """
+    Join the seed sessions of consecutive date shards, joining the parts of sessions
+    split at a shard boundary.
+
+    Args:
+        shards: the `extract_seed_sessions` results of each shard, in date order
+        session_hits: the number of sessions visiting each page over the whole date
+                      range, indexed by page path. It replaces the shards'
+                      `sessionHits`, which only count the sessions within a shard.
+    Returns:
+        A pd.DataFrame in the schema of `extract_seed_sessions`, ordered by
+        `sessionId` and `hitNumber`.
+    """
+    df = pd.concat(
+        [shard.assign(shard=i) for i, shard in enumerate(shards)], ignore_index=True
+    )
+    df = df.sort_values(["sessionId", "shard", "hitNumber"], kind="stable")
+
+    session = df["sessionId"].to_numpy()
+    shard = df["shard"].to_numpy()
+    same_session = session[1:] == session[:-1]
+    # hits where a session continues from the previous shard
+    continues = pd.Series(False, index=df.index)
+    continues.iloc[1:] = same_session & (shard[1:] != shard[:-1])
+    # hits where a session continues into the next shard
+    continued = pd.Series(False, index=df.index)
+    continued.iloc[:-1] = continues.iloc[1:].to_numpy()
+
+    split = df["sessionId"].isin(df.loc[continues, "sessionId"])
+    if split.any():
+        df.loc[split, "hitNumber"] = df[split].groupby("sessionId").cumcount() + 1
+        df["isEntrance"] = df["isEntrance"].astype(object).where(~continues, None)
+        df["isExit"] = df["isExit"].astype(object).where(~continued, None)
+
+    df["sessionHits"] = df["pagePath"].map(session_hits)
+
+    return df.drop(columns="shard").reset_index(drop=True)
+
+
+@profiled()
+def extract_seed_sessions_sharded(
+    start_date: str,
+    end_date: str,
+    seed0_pages: Sequence[str],
+    seed1_pages: Sequence[str],
+    sample_percent: Optional[int] = None,
+    shard_days: int = 7,
+    max_workers: int = 4,
+    output_dir: Optional[str] = None,
+    page_size: int = 100_000,
+    client=None,
+) -> pd.DataFrame:
+    """
+    `extract_seed_sessions`, run as concurrent queries over shards of the date range.
+
+    Args:
+        start_date: the first date, as YYYYMMDD
+        end_date: the last date, as YYYYMMDD
+        seed0_pages: see `extract_seed_sessions`
+        seed1_pages: see `extract_seed_sessions`
+        sample_percent: see `extract_seed_sessions`
+        shard_days: the number of days in each shard
+        max_workers: the most shard queries to run at once
+        output_dir: the folder of the shard Parquet files. Defaults to
+                    `seed_session_shards` in the `DIR_DATA_INTERIM` folder.
+        page_size: the number of rows downloaded, and written, at a time
+        client: a `google.cloud.bigquery.Client`, or a client with the same API.
+                Defaults to a client of the `govuk-bigquery-analytics` project,
+                shared by every shard.
+    Returns:
+        The merged sessions, as returned by `extract_seed_sessions`; see
+        `merge_shards`.
+    """
+    if client is None:
+        from google.cloud import bigquery
+
+        client = bigquery.Client(project="govuk-bigquery-analytics", location="EU")
+    if output_dir is None:
+        output_dir = Path(os.getenv("DIR_DATA_INTERIM", "data/interim"))
+        output_dir = output_dir / "seed_session_shards"
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    shards = date_shards(start_date, end_date, shard_days)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        paths = list(
+            pool.map(
+                lambda shard: _extract_shard(
+                    client,
+                    shard,
+                    seed0_pages,
+                    seed1_pages,
+                    sample_percent,
+                    _shard_path(
+                        output_dir, shard, seed0_pages, seed1_pages, sample_percent
+                    ),
+                    page_size,
+                ),
+                shards,
+            )
+        )
+
+    frames = [pd.read_parquet(path) for path in paths]
+    pages = sorted(set().union(*(frame["pagePath"] for frame in frames)))
+    session_hits = _extract_page_session_hits(
+        client,
+        (start_date, end_date),
+        pages,
+        sample_percent,
+        _shard_path(
+            output_dir,
+            (start_date, end_date),
+            seed0_pages,
+            seed1_pages,
+            sample_percent,
+            name="page_session_hits",
+        ),
+    )
+
+    df = merge_shards(frames, session_hits)
+    df.attrs["sample_fraction"] = (sample_percent or 100) / 100
+
+    return df
@@ -0,0 +1,408 @@
+"""
+A vectorised random walk engine over CSR arrays.
+
+`random_walk` in `src.utils.randomwalks` walks one step at a time in Python. The
+functions here advance every walker by one step with a handful of numpy operations,
+so thousands of walks from many seed pages run together.
+
+Walks are returned as a 2-D array of node ids, one row per walker and one column per
+step, starting with the start node. A walker that reaches a page with no out-edges (an
+absorbing state) stops there, and the rest of its row is filled with -1, matching
+`random_walk`.
+"""
+
+import importlib.util
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# marks the steps after a walker has stopped
+STOPPED = -1
+
+# what a walker does at a page with no out-edges; see `walk()`
+DANGLING_POLICIES = ("stop", "restart", "teleport")
+
+
+class WalkArrays(NamedTuple):
+    """
+    The CSR arrays of one graph layer, prepared for sampling.
+
+    Attributes:
+        indptr: the CSR row pointer
+        indices: the CSR column indices
+        cumulative: for weighted walks, the running total of edge weights with a
+                    leading 0, so edge `j` covers `[cumulative[j], cumulative[j + 1])`;
+                    None for unweighted walks
+        has_out_edges: a boolean array, True for nodes a walker can leave
+    """
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    cumulative: Optional[np.ndarray]
+    has_out_edges: np.ndarray
+
+
+def prepare(matrix: csr_matrix, weighted: bool = True) -> WalkArrays:
+    """
+    Prepare a CSR adjacency or transition probability matrix for walking.
+
+    Args:
+        matrix: a CSR matrix, where row `i` holds the out-edges of node `i`
+        weighted: if True, choose the next node in proportion to the edge weights, as
+                  `random_walk(p=True)` does. If False, choose uniformly among the
+                  out-edges, as `random_walk(p=False)` does.
+    Returns:
+        The `WalkArrays` of `matrix`.
+    """
+    matrix = csr_matrix(matrix)
+    matrix.eliminate_zeros()
+    indptr = matrix.indptr.astype(np.int64)
+    indices = matrix.indices.astype(np.int64)
+
+    if weighted:
+        cumulative = np.concatenate([[0.0], np.cumsum(matrix.data, dtype=np.float64)])
+        has_out_edges = cumulative[indptr[1:]] > cumulative[indptr[:-1]]
+    else:
+        cumulative = None
+        has_out_edges = np.diff(indptr) > 0
+
+    return WalkArrays(indptr, indices, cumulative, has_out_edges)
+
+
+def step(arrays: WalkArrays, nodes: np.ndarray, uniforms: np.ndarray) -> np.ndarray:
+    """
+    Move walkers one step, using one uniform random number per walker.
+
+    Args:
+        arrays: the `WalkArrays` of the graph
+        nodes: the current node of each walker; every node must have out-edges
+        uniforms: a uniform random number in [0, 1) per walker
+    Returns:
+        The next node of each walker.
+    """
+    start = arrays.indptr[nodes]
+    end = arrays.indptr[nodes + 1]
+
+    if arrays.cumulative is None:
+        position = start + (uniforms * (end - start)).astype(np.int64)
+    else:
+        low = arrays.cumulative[start]
+        target = low + uniforms * (arrays.cumulative[end] - low)
+        position = np.searchsorted(arrays.cumulative, target, side="right") - 1
+
+    return arrays.indices[np.clip(position, start, end - 1)]
+
+
+def numba_available() -> bool:
+    """True if numba is installed, so the "numba" walk backend can be used."""
+    return importlib.util.find_spec("numba") is not None
+
+
+def _use_numba(backend: str) -> bool:
+    """Resolve a walk backend: "numpy", "numba", or "auto" (numba if installed)."""
+    if backend == "numpy":
+        return False
+    if backend == "numba":
+        if not numba_available():
+            raise ImportError(
+                "The numba walk backend needs numba; install it, or use "
+                "backend='numpy' or backend='auto'"
+            )
+        return True
+    if backend == "auto":
+        return numba_available()
+
+    raise ValueError(f"backend must be 'numpy', 'numba' or 'auto': {backend}")
+
+
+def _move(
+    arrays: WalkArrays,
+    nodes: np.ndarray,
+    starts: np.ndarray,
+    uniforms: np.ndarray,
+    restarting: np.ndarray,
+    dangling: str,
+) -> np.ndarray:
+    """
+    The next node of each walker: its start node if it restarts, a new node if it is
+    at a dangling node, and otherwise a neighbour chosen with `step()`.
+    """
+    following = nodes.copy()
+    stuck = ~arrays.has_out_edges[nodes] & ~restarting
+    if dangling == "restart":
+        restarting = restarting | stuck
+    elif dangling == "teleport":
+        n_nodes = len(arrays.indptr) - 1
+        following[stuck] = np.minimum(
+            (uniforms[stuck] * n_nodes).astype(np.int64), n_nodes - 1
+        )
+
+    following[restarting] = starts[restarting]
+    moving = ~restarting & ~stuck
+    following[moving] = step(arrays, nodes[moving], uniforms[moving])
+
+    return following
+
+
+def walk(
+    arrays: WalkArrays,
+    starts: Sequence[int],
+    steps: int,
+    rng: Optional[np.random.Generator] = None,
+    alpha: float = 0.0,
+    dangling: str = "stop",
+    backend: str = "numpy",
+) -> np.ndarray:
+    """
+    Run one random walk from each start node, all walkers at once.
+
+    With a restart probability `alpha`, at each step a walker jumps back to its start
+    node with probability `alpha`, instead of following an edge. This keeps walks
+    close to the seed pages, rather than spending steps far from the whole user
+    journey.
+
+    `dangling` sets what a walker does at a page with no out-edges:
+    - "stop": the walk ends there, as `random_walk` does with an adjacency matrix
+    - "restart": the walker jumps back to its start node
+    - "teleport": the walker jumps to a page chosen uniformly at random, as the 1/N
+      rows of `get_transition_matrix(dangling="uniform")` do
+
+    Args:
+        arrays: the `WalkArrays` of the graph, from `prepare()`
+        starts: the start node id of each walker
+        steps: the number of steps to take
+        rng: a `numpy.random.Generator`. Defaults to a freshly seeded one.
+        alpha: the restart probability, in [0, 1)
+        dangling: "stop", "restart" or "teleport"
+        backend: "numpy"; "numba", to run the compiled kernel in
+                 `src.utils.walk_numba`; or "auto", to use numba if it is installed.
+                 Both backends give the same walks for the same `rng`.
+    Returns:
+        An int64 numpy array of shape (len(starts), steps + 1) of visited node ids,
+        padded with -1 after a walker stops.
+    """
+    if not 0 <= alpha < 1:
+        raise ValueError(f"alpha must be in [0, 1): {alpha}")
+    if dangling not in DANGLING_POLICIES:
+        raise ValueError(f"dangling must be one of {DANGLING_POLICIES}: {dangling}")
+
+    rng = np.random.default_rng() if rng is None else rng
+    if _use_numba(backend):
+        from src.utils import walk_numba
+
+        return walk_numba.walk(
+            arrays, starts, steps, rng, alpha=alpha, dangling=dangling
+        )
+
+    starts = np.asarray(starts, dtype=np.int64)
+
+    paths = np.full((len(starts), steps + 1), STOPPED, dtype=np.int64)
+    paths[:, 0] = starts
+    current = starts.copy()
+    walking = np.ones(len(starts), dtype=bool)
+
+    for t in range(1, steps + 1):
+        if dangling == "stop":
+            walking &= arrays.has_out_edges[np.maximum(current, 0)]
+            if not walking.any():
+                break
+        moving = np.flatnonzero(walking)
+
+        # one uniform to choose the edge (or teleport), and one for the restart
+        if alpha > 0:
+            uniforms = rng.random((len(starts), 2))
+            edge_uniforms = uniforms[moving, 1]
+            restarting = uniforms[moving, 0] < alpha
+        else:
+            edge_uniforms = rng.random(len(starts))[moving]
+            restarting = np.zeros(len(moving), dtype=bool)
+
+        current[moving] = _move(
+            arrays, current[moving], starts[moving], edge_uniforms, restarting, dangling
+        )
+        current[~walking] = STOPPED
+        paths[:, t] = current
+
+    return paths
+
+
+def edge_keys(arrays: WalkArrays) -> np.ndarray:
+    """
+    A sorted key per edge, `source * n + destination`, so an edge can be looked up
+    with a binary search.
+    """
+    n = len(arrays.indptr) - 1
+    sources = np.repeat(np.arange(n, dtype=np.int64), np.diff(arrays.indptr))
+    keys = sources * n + arrays.indices
+
+    # CSR indices are usually sorted within each row already
+    if (np.diff(keys) < 0).any():
+        keys = np.sort(keys)
+
+    return keys
+
+
+def walk_second_order(
+    arrays: WalkArrays,
+    starts: Sequence[int],
+    steps: int,
+    p: float = 1.0,
+    q: float = 1.0,
+    rng: Optional[np.random.Generator] = None,
+    keys: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Run second-order (node2vec) random walks, biased by where the walker has just
+    come from (Grover and Leskovec, 2016).
+
+    Having moved from page t to page v, the walker moves to a neighbour x of v with
+    probability proportional to the edge weight times:
+    - 1/p if x is t (returning)
+    - 1 if t links to x (staying close to t)
+    - 1/q otherwise (moving outwards)
+
+    So a small q explores outwards, away from the seeds, and a small p keeps walks
+    close to where they started. Rather than precomputing a sampling table for every
+    edge pair, which needs memory proportional to the sum of squared degrees and blows
+    up on hub pages, the next page is drawn by rejection sampling: a first-order
+    proposal is accepted with probability bias / max(bias). Only the sorted edge keys
+    are kept, to test whether t links to x.
+
+    Args:
+        arrays: the `WalkArrays` of the graph, from `prepare()`
+        starts: the start node id of each walker
+        steps: the number of steps to take
+        p: the return parameter
+        q: the in-out parameter
+        rng: a `numpy.random.Generator`. Defaults to a freshly seeded one.
+        keys: precomputed `edge_keys(arrays)`, when walking the same graph repeatedly
+    Returns:
+        An int64 numpy array of shape (len(starts), steps + 1) of visited node ids,
+        padded with -1 after a walker stops.
+    """
+    if p <= 0 or q <= 0:
+        raise ValueError("p and q must be positive")
+
+    rng = np.random.default_rng() if rng is None else rng
+    keys = edge_keys(arrays) if keys is None else keys
+    n = len(arrays.indptr) - 1
+    starts = np.asarray(starts, dtype=np.int64)
+    max_bias = max(1.0 / p, 1.0, 1.0 / q)
+
+    paths = np.full((len(starts), steps + 1), STOPPED, dtype=np.int64)
+    paths[:, 0] = starts
+    current = starts.copy()
+    previous = np.full(len(starts), STOPPED, dtype=np.int64)
+    walking = np.ones(len(starts), dtype=bool)
+
+    for t in range(1, steps + 1):
+        walking &= arrays.has_out_edges[np.maximum(current, 0)]
+        if not walking.any():
+            break
+
+        pending = np.flatnonzero(walking)
+        following = np.full(len(starts), STOPPED, dtype=np.int64)
+        while pending.size > 0:
+            proposal = step(arrays, current[pending], rng.random(pending.size))
+            came_from = previous[pending]
+
+            # the first step has no previous page, so it is a first-order step
+            bias = np.ones(pending.size)
+            has_previous = came_from != STOPPED
+            bias[has_previous & (proposal == came_from)] = 1.0 / p
+            outwards = has_previous & (proposal != came_from)
+            lookup = came_from[outwards] * n + proposal[outwards]
+            position = np.minimum(np.searchsorted(keys, lookup), len(keys) - 1)
+            bias[np.flatnonzero(outwards)[keys[position] != lookup]] = 1.0 / q
+
+            accepted = rng.random(pending.size) * max_bias < bias
+            following[pending[accepted]] = proposal[accepted]
+            pending = pending[~accepted]
+
+        previous = np.where(walking, current, STOPPED)
+        current = np.where(walking, following, STOPPED)
+        paths[:, t] = current
+
+    return paths
+
+
+def walk_layers(
+    layers: List[WalkArrays],
+    mixing: Sequence[float],
+    starts: Sequence[int],
+    steps: int,
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """
+    Run random walks over several graph layers that share node ids, such as the
+    structural (hyperlink) and functional (user movement) networks.
+
+    At each step a walker picks a layer with probability proportional to its mixing
+    weight, among the layers in which its current node has out-edges, then moves along
+    an edge of that layer. This walks the mixture of the layers' transition matrices
+    without building it.
+
+    Args:
+        layers: the `WalkArrays` of each layer, from `prepare()`
+        mixing: a non-negative mixing weight per layer
+        starts: the start node id of each walker
+        steps: the number of steps to take
+        rng: a `numpy.random.Generator`. Defaults to a freshly seeded one.
+    Returns:
+        An int64 numpy array of shape (len(starts), steps + 1) of visited node ids,
+        padded with -1 after a walker stops.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    starts = np.asarray(starts, dtype=np.int64)
+    mixing = np.asarray(mixing, dtype=np.float64)
+    if len(mixing) != len(layers) or (mixing < 0).any():
+        raise ValueError("mixing must have one non-negative weight per layer")
+
+    paths = np.full((len(starts), steps + 1), STOPPED, dtype=np.int64)
+    paths[:, 0] = starts
+    current = starts.copy()
+    walking = np.ones(len(starts), dtype=bool)
+
+    for t in range(1, steps + 1):
+        moving = np.flatnonzero(walking)
+        nodes = current[moving]
+
+        # weight of each layer for each walker, zero where the node cannot move
+        layer_weights = np.column_stack(
+            [layer.has_out_edges[nodes] * w for layer, w in zip(layers, mixing)]
+        )
+        totals = layer_weights.sum(axis=1)
+        stuck = totals == 0
+        walking[moving[stuck]] = False
+        current[moving[stuck]] = STOPPED
+        if not walking.any():
+            break
+
+        uniforms = rng.random((len(starts), 2))
+        moving, nodes = moving[~stuck], nodes[~stuck]
+        layer_cdf = np.cumsum(layer_weights[~stuck], axis=1) / totals[~stuck, None]
+        chosen = (uniforms[moving, 0, None] >= layer_cdf).sum(axis=1)
+        chosen = np.minimum(chosen, len(layers) - 1)
+
+        for i, layer in enumerate(layers):
+            in_layer = chosen == i
+            if in_layer.any():
+                current[moving[in_layer]] = step(
+                    layer, nodes[in_layer], uniforms[moving[in_layer], 1]
+                )
+        paths[:, t] = current
+
+    return paths
+
+
+def unique_visits(paths: np.ndarray) -> List[np.ndarray]:
+    """
+    The sorted, unique node ids visited by each walk, as `random_walk` returns them.
+
+    Args:
+        paths: a 2-D array of walks from `walk()` or `walk_layers()`
+    Returns:
+        A list of numpy arrays of node ids, one per walk.
+    """
+    return [np.unique(path[path != STOPPED]) for path in paths]
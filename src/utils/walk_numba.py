@@ -0,0 +1,143 @@
+"""
+A numba-compiled random walk kernel, the optional "numba" backend of
+`src.utils.walk_engine.walk()`.
+
+The numpy engine advances all walkers together, one step at a time, and has to track
+which walkers are still moving as they stop at different steps. Here each walker runs
+its whole walk in one iteration of a parallel `prange` loop, so stopped walkers cost
+nothing, and walkers are spread over all cores.
+
+Random numbers are not drawn inside the kernel. `walk()` draws every walker's uniforms
+from the caller's `numpy.random.Generator` up front, in the same order as the numpy
+engine, and each thread reads the uniforms of its own walkers. So for the same
+generator both backends give identical walks, whatever the number of threads. This
+holds `steps * len(starts)` uniforms in memory (twice that with restarts).
+
+Requires numba (`pip install numba`). Import this module through `walk_engine`, which
+falls back to numpy when numba is not installed.
+"""
+
+from typing import Sequence
+
+import numba
+import numpy as np
+
+from src.utils.walk_engine import DANGLING_POLICIES, STOPPED, WalkArrays
+
+
+@numba.njit(cache=True)
+def _neighbour(indptr, indices, cumulative, node, u):
+    """The neighbour of `node` chosen by the uniform `u`, as `walk_engine.step()`."""
+    start = indptr[node]
+    end = indptr[node + 1]
+    if cumulative.shape[0] == 0:
+        return indices[min(start + np.int64(u * (end - start)), end - 1)]
+
+    # the last edge whose cumulative weight is at most the target, as
+    # `np.searchsorted(side="right") - 1` does
+    low = cumulative[start]
+    target = low + u * (cumulative[end] - low)
+    lo, hi = start, end - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if cumulative[mid] <= target:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return indices[lo]
+
+
+@numba.njit(parallel=True, cache=True)
+def walk_kernel(
+    indptr, indices, cumulative, has_out_edges, starts, uniforms, alpha, dangling, paths
+):
+    """
+    Fill `paths` with one walk per start node.
+
+    Args:
+        indptr: the CSR row pointer, int64
+        indices: the CSR column indices, int64
+        cumulative: the running total of edge weights with a leading 0, for weighted
+                    walks; an empty array for unweighted walks
+        has_out_edges: a boolean array, True for nodes a walker can leave
+        starts: the start node of each walker, int64
+        uniforms: a float64 array of shape (steps, len(starts), k); the last column
+                  chooses the edge, and with restarts (k = 2) the first column decides
+                  whether to restart
+        alpha: the restart probability
+        dangling: the index of the dangling node policy in `DANGLING_POLICIES`
+        paths: an int64 array of shape (len(starts), steps + 1), filled with -1
+    """
+    steps = paths.shape[1] - 1
+    edge = uniforms.shape[2] - 1
+    n_nodes = indptr.shape[0] - 1
+
+    for w in numba.prange(starts.shape[0]):
+        current = starts[w]
+        paths[w, 0] = current
+
+        for t in range(1, steps + 1):
+            # stop at absorbing states
+            if dangling == 0 and not has_out_edges[current]:
+                break
+
+            if alpha > 0 and uniforms[t - 1, w, 0] < alpha:
+                current = starts[w]
+            elif not has_out_edges[current]:
+                if dangling == 1:
+                    current = starts[w]
+                else:
+                    u = uniforms[t - 1, w, edge]
+                    current = min(np.int64(u * n_nodes), n_nodes - 1)
+            else:
+                current = _neighbour(
+                    indptr, indices, cumulative, current, uniforms[t - 1, w, edge]
+                )
+
+            paths[w, t] = current
+
+
+def walk(
+    arrays: WalkArrays,
+    starts: Sequence[int],
+    steps: int,
+    rng: np.random.Generator,
+    alpha: float = 0.0,
+    dangling: str = "stop",
+) -> np.ndarray:
+    """
+    Run one random walk from each start node with the compiled kernel; see
+    `walk_engine.walk()`.
+
+    Args:
+        arrays: the `WalkArrays` of the graph, from `walk_engine.prepare()`
+        starts: the start node id of each walker
+        steps: the number of steps to take
+        rng: a `numpy.random.Generator`
+        alpha: the restart probability, in [0, 1)
+        dangling: "stop", "restart" or "teleport"
+    Returns:
+        An int64 numpy array of shape (len(starts), steps + 1) of visited node ids,
+        padded with -1 after a walker stops.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    uniforms = rng.random((steps, len(starts), 2 if alpha > 0 else 1))
+    paths = np.full((len(starts), steps + 1), STOPPED, dtype=np.int64)
+    cumulative = (
+        np.zeros(0) if arrays.cumulative is None else arrays.cumulative
+    ).astype(np.float64)
+
+    walk_kernel(
+        arrays.indptr,
+        arrays.indices,
+        cumulative,
+        arrays.has_out_edges,
+        starts,
+        uniforms,
+        float(alpha),
+        DANGLING_POLICIES.index(dangling),
+        paths,
+    )
+
+    return paths
@@ -0,0 +1,448 @@
+"""
+A local HTTP server answering whole user journey queries from a graph held in memory.
+
+Loading a functional graph and building its matrices costs far more than a single
+query, so the server loads the graph once, keeps it in compact CSR form, and answers
+JSON queries over HTTP on localhost:
+
+- `POST /walks`: random walk tf-df rankings from seed pages
+  (`page_freq_path_freq_ranking`)
+- `POST /ppr`: personalised PageRank rankings from seed pages
+- `POST /khop`: the pages within `k` hops of seed pages
+- `POST /evaluate`: precision, recall and F-beta of a `walks` or `ppr` ranking at every
+  score threshold, against pages known to belong to the journey
+- `GET /health` and `GET /stats`: the graph size, and the result cache statistics
+
+Queries run in a pool of worker processes, so slow queries do not block the others.
+Worker processes are forked with the graph already loaded where the platform allows,
+otherwise they load it once each. They are all started before the server listens, so
+no worker inherits a client connection, which would keep it open after the server
+closes it. Results are kept in an LRU cache keyed by the
+endpoint, the set of seed pages (so their order does not matter) and the other
+parameters; identical queries arriving together are only computed once.
+
+Start it with a networkx graph saved with `pickle.dump`, e.g. the one saved by the
+notebooks, then query it with any HTTP client:
+
+    python -m src.utils.wuj_server data/processed/graph.gpickle --port 8000
+    curl -X POST localhost:8000/walks -d '{"seed_pages": ["/find-a-job"]}'
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import pickle
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from src.utils import walk_engine
+from src.utils.csr_graph import from_networkx
+from src.utils.evaluation import threshold_scores
+from src.utils.neighbourhood import k_hop_nodes
+from src.utils.personalised_pagerank import ppr_power_iteration, restart_matrix
+from src.utils.randomwalks import (
+    _seed_ids,
+    _walk_from,
+    page_freq_path_freq_ranking,
+    walk_results,
+)
+
+# the parameters of each query endpoint, and their defaults; None means required
+QUERY_PARAMS = {
+    "walks": {
+        "seed_pages": None,
+        "steps": 100,
+        "repeats": 100,
+        "alpha": 0.0,
+        # pages without out-links jump anywhere, as in `get_transition_matrix()`
+        "dangling": "teleport",
+        "random_state": 0,
+        "top": 100,
+    },
+    "ppr": {"seed_pages": None, "restart": 0.15, "top": 100},
+    "khop": {"seed_pages": None, "k": 1, "direction": "both"},
+}
+QUERY_PARAMS["evaluate"] = {
+    "true_pages": None,
+    "method": "walks",
+    "beta": 2,
+    **{
+        name: default
+        for method in ("walks", "ppr")
+        for name, default in QUERY_PARAMS[method].items()
+        if name != "top"
+    },
+}
+
+# the largest request body, in bytes
+MAX_BODY = 10 * 2**20
+
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Server Error"}
+
+
+class GraphState(NamedTuple):
+    """
+    The compact in-memory form of a functional graph.
+
+    Attributes:
+        slugs: a numpy array of the page path of each node id
+        adjacency: the CSR matrix of edge weights
+        reversed_adjacency: its transpose, for `k_hop_nodes()`
+        arrays: the `WalkArrays` of weighted walks over `adjacency`
+    """
+
+    slugs: np.ndarray
+    adjacency: csr_matrix
+    reversed_adjacency: csr_matrix
+    arrays: walk_engine.WalkArrays
+
+
+_STATE: Optional[GraphState] = None
+
+
+def load_state(graph_path: str) -> GraphState:
+    """
+    Load a pickled networkx graph into a `GraphState`.
+
+    Args:
+        graph_path: the path of a networkx graph saved with `pickle.dump`, before or
+                    after `reformat_graph()`
+    Returns:
+        A `GraphState`.
+    """
+    with open(graph_path, "rb") as f:
+        graph = from_networkx(pickle.load(f))
+
+    return GraphState(
+        graph.slugs,
+        graph.matrix,
+        graph.matrix.T.tocsr(),
+        walk_engine.prepare(graph.matrix, weighted=True),
+    )
+
+
+def _init_worker(graph_path: str) -> None:
+    """Load the graph in a worker process, unless it was forked with it loaded."""
+    global _STATE
+    if _STATE is None:
+        _STATE = load_state(graph_path)
+
+
+def _worker_ready() -> None:
+    """A no-op, run once per worker to start it."""
+
+
+def _top(ranking: pd.DataFrame, top: Optional[int]) -> list:
+    return (ranking if top is None else ranking.head(top)).to_dict("records")
+
+
+def walk_query(params: Dict) -> Dict:
+    """Random walk tf-df ranking; see `QUERY_PARAMS["walks"]`."""
+    slugs = _STATE.slugs
+    seed_pages, seed_ids = _seed_ids(params["seed_pages"], slugs)
+    streams = np.random.SeedSequence(params["random_state"]).spawn(len(seed_ids))
+    walk_options = {"alpha": params["alpha"], "dangling": params["dangling"]}
+    paths = [
+        _walk_from(
+            _STATE.arrays,
+            [seed_id],
+            params["steps"],
+            params["repeats"],
+            stream,
+            walk_options,
+        )
+        for seed_id, stream in zip(seed_ids, streams)
+    ]
+
+    results = walk_results(slugs, seed_pages, paths, params["repeats"], "union", 1)
+    if results is None:
+        return {"seeds": seed_pages, "ranking": []}
+
+    ranking = page_freq_path_freq_ranking(results)
+    return {"seeds": seed_pages, "ranking": _top(ranking, params["top"])}
+
+
+def ppr_query(params: Dict) -> Dict:
+    """Personalised PageRank ranking; see `QUERY_PARAMS["ppr"]`."""
+    slugs = _STATE.slugs
+    seed_pages, seed_ids = _seed_ids(params["seed_pages"], slugs)
+    if len(seed_ids) == 0:
+        return {"seeds": seed_pages, "ranking": []}
+
+    scores = ppr_power_iteration(
+        _STATE.adjacency,
+        restart_matrix([seed_ids], len(slugs)),
+        restart=params["restart"],
+    )[:, 0]
+    nodes = np.flatnonzero(scores > 0)
+    ranking = pd.DataFrame({"pagePath": slugs[nodes], "ppr_score": scores[nodes]})
+    ranking = ranking.sort_values(
+        by="ppr_score", ascending=False, kind="mergesort", ignore_index=True
+    )
+
+    return {"seeds": seed_pages, "ranking": _top(ranking, params["top"])}
+
+
+def khop_query(params: Dict) -> Dict:
+    """Pages within `k` hops of the seed pages; see `QUERY_PARAMS["khop"]`."""
+    seed_pages, seed_ids = _seed_ids(params["seed_pages"], _STATE.slugs)
+    nodes = k_hop_nodes(
+        {"edges": _STATE.adjacency},
+        seed_ids,
+        k=params["k"],
+        direction=params["direction"],
+        reversed_layers={"edges": _STATE.reversed_adjacency},
+    )
+
+    return {"seeds": seed_pages, "pages": _STATE.slugs[nodes].tolist()}
+
+
+QUERIES = {"walks": walk_query, "ppr": ppr_query, "khop": khop_query}
+
+
+def normalise_query(endpoint: str, params: Dict) -> Dict:
+    """
+    Validate query parameters, fill in defaults, and sort and deduplicate page lists,
+    so equivalent queries share a cache entry.
+
+    Args:
+        endpoint: "walks", "ppr", "khop" or "evaluate"
+        params: the query parameters
+    Returns:
+        The full dictionary of query parameters.
+    """
+    if endpoint not in QUERY_PARAMS:
+        raise KeyError(endpoint)
+
+    defaults = QUERY_PARAMS[endpoint]
+    unknown = set(params) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {endpoint}: {sorted(unknown)}")
+    missing = [
+        name for name in defaults if defaults[name] is None and name not in params
+    ]
+    if missing:
+        raise ValueError(f"Missing parameters for {endpoint}: {missing}")
+
+    query = {**defaults, **params}
+    for name in ("seed_pages", "true_pages"):
+        if name in query:
+            if isinstance(query[name], str):
+                raise ValueError(f"{name} must be a list of page paths")
+            query[name] = sorted(set(query[name]))
+    if endpoint == "evaluate" and query["method"] not in ("walks", "ppr"):
+        raise ValueError(f"method must be 'walks' or 'ppr': {query['method']}")
+
+    return query
+
+
+class WUJServer:
+    """
+    Answers whole user journey queries from one graph, with a process pool and an LRU
+    cache of results.
+
+    Args:
+        graph_path: the path of a pickled networkx graph; see `load_state()`
+        workers: the number of worker processes. Defaults to the number of CPUs.
+        cache_size: the number of query results to keep
+    """
+
+    def __init__(
+        self, graph_path: str, workers: Optional[int] = None, cache_size: int = 256
+    ):
+        global _STATE
+        _STATE = load_state(graph_path)
+        self.n_nodes = len(_STATE.slugs)
+        self.n_edges = _STATE.adjacency.nnz
+
+        # forked workers inherit the loaded graph; spawned workers load it themselves
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(graph_path,),
+        )
+        # start every worker now, before `start()` opens any client connection: the
+        # pool starts workers lazily, and a worker forked later would inherit the open
+        # sockets of the connections being served
+        for future in [
+            self.pool.submit(_worker_ready) for _ in range(self.pool._max_workers)
+        ]:
+            future.result()
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[Tuple[str, str], asyncio.Future]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def query(self, endpoint: str, params: Dict) -> Dict:
+        """
+        Answer a query, from the cache if possible.
+
+        Args:
+            endpoint: "walks", "ppr", "khop" or "evaluate"
+            params: the query parameters; see `QUERY_PARAMS`
+        Returns:
+            The JSON-serialisable query result.
+        """
+        query = normalise_query(endpoint, params)
+        if endpoint == "evaluate":
+            return await self._evaluate(query)
+
+        key = (endpoint, json.dumps(query, sort_keys=True))
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return await asyncio.shield(self.cache[key])
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pool, QUERIES[endpoint], query)
+        self.cache[key] = future
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            # do not cache failures
+            if self.cache.get(key) is future:
+                del self.cache[key]
+            raise
+
+    async def _evaluate(self, query: Dict) -> Dict:
+        """Threshold scores of a full `walks` or `ppr` ranking."""
+        method = query["method"]
+        params = {name: query[name] for name in QUERY_PARAMS[method] if name in query}
+        result = await self.query(method, {**params, "top": None})
+        if not result["ranking"]:
+            return {"seeds": result["seeds"], "scores": [], "best": None}
+
+        score = "tfdf_max" if method == "walks" else "ppr_score"
+        ranking = pd.DataFrame(result["ranking"], columns=["pagePath", score])
+        scores = threshold_scores(
+            ranking, query["true_pages"], score=score, beta=query["beta"]
+        )
+        best = scores.loc[scores["fscore"].idxmax()]
+
+        return {
+            "seeds": result["seeds"],
+            "scores": scores.to_dict("records"),
+            "best": best.to_dict(),
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "nodes": self.n_nodes,
+            "edges": self.n_edges,
+            "cache_size": len(self.cache),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+        }
+
+    async def _respond(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        """The status code and JSON response of an HTTP request."""
+        endpoint = path.strip("/").split("?")[0]
+        if method == "GET" and endpoint in ("health", "stats"):
+            return 200, {"status": "ok", **self.stats()}
+        if method != "POST" or endpoint not in QUERY_PARAMS:
+            return 404, {"error": f"No such endpoint: {method} {path}"}
+
+        try:
+            params = json.loads(body or b"{}")
+            if not isinstance(params, dict):
+                raise ValueError("The request body must be a JSON object")
+            return 200, await self.query(endpoint, params)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": str(e)}
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer one HTTP/1.1 request per connection."""
+        try:
+            method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY:
+                status, response = 400, {"error": "The request body is too large"}
+            else:
+                body = await reader.readexactly(length)
+                status, response = await self._respond(method, path, body)
+        except (ValueError, asyncio.IncompleteReadError):
+            status, response = 400, {"error": "Malformed HTTP request"}
+        except Exception as e:
+            status, response = 500, {"error": f"{type(e).__name__}: {e}"}
+
+        content = json.dumps(response, default=float).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + content
+        )
+        await writer.drain()
+        writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000):
+        """
+        Start listening for HTTP requests.
+
+        Args:
+            host: the interface to listen on; localhost by default
+            port: the port to listen on; 0 picks a free port
+        Returns:
+            The `asyncio.Server`; its bound port is
+            `server.sockets[0].getsockname()[1]`.
+        """
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def _serve(args) -> None:
+    server = WUJServer(args.graph, workers=args.workers, cache_size=args.cache_size)
+    http = await server.start(args.host, args.port)
+    print(
+        f"Serving {server.n_nodes} pages and {server.n_edges} edges on "
+        f"http://{args.host}:{http.sockets[0].getsockname()[1]}"
+    )
+    try:
+        async with http:
+            await http.serve_forever()
+    finally:
+        server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("graph", help="a networkx graph saved with pickle.dump")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--cache-size", type=int, default=256)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
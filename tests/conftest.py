@@ -0,0 +1,34 @@
+import networkx as nx
+import pytest
+
+from src.make_data.make_synthetic_data import power_law_graph, session_hits
+from src.utils.randomwalks import get_transition_matrix, reformat_graph
+
+
+@pytest.fixture(scope="session")
+def page_graph():
+    """
+    A weighted directed graph of 200 pages, `/page-0` to `/page-199`, with power-law
+    degrees; repeated edges are merged, and their count is the `edgeWeight`.
+    """
+    G = nx.DiGraph()
+    G.add_nodes_from(f"/page-{i}" for i in range(200))
+    for u, v in nx.scale_free_graph(200, seed=0).edges():
+        edge = (f"/page-{u}", f"/page-{v}")
+        weight = G.edges[edge]["edgeWeight"] if G.has_edge(*edge) else 0
+        G.add_edge(*edge, edgeWeight=weight + 1)
+
+    return G
+
+
+@pytest.fixture(scope="session")
+def functional_graph(page_graph):
+    """`page_graph`, reformatted for random walks, and its transition matrix."""
+    G = reformat_graph(page_graph.copy())
+    return G, get_transition_matrix(G)
+
+
+@pytest.fixture(scope="session")
+def hits():
+    """Synthetic page hits over a 200-page graph."""
+    return session_hits(5000, power_law_graph(200))
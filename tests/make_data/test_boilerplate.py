@@ -0,0 +1,46 @@
+import io
+
+from src.make_data.boilerplate import LinkFrequencyIndex, normalise_link
+from src.make_data.make_topology_matrix import process_links, process_page_links
+from src.utils import create_functional_network
+
+CORPUS = {
+    f"/page-{i}": ["/help", "/help#contact", f"/content-{i}", "https://example.com"]
+    for i in range(30)
+}
+
+
+def test_normalise_link():
+    assert normalise_link("/help#contact") == "/help"
+    assert normalise_link("/search?q=tax#results") == "/search"
+    assert normalise_link("/") == "/"
+
+
+def test_index_matches_links_with_fragments_and_queries():
+    index = LinkFrequencyIndex.from_page_links(process_links(CORPUS))
+    assert index.boilerplate() == {"/help"}
+
+    # `process_page_links` keeps fragments, but they count as links to the page
+    index = LinkFrequencyIndex.from_page_links(process_page_links(CORPUS))
+    assert index.boilerplate() == {"/help"}
+    assert index.counts["/help"] == len(CORPUS)
+
+
+def test_identify_seed_pages_removes_boilerplate_sections(monkeypatch, tmp_path):
+    html = (
+        '<main><a href="/help#contact">Contact</a><a href="/apply?step=1">Apply</a>'
+        '<a href="/guide">Guide</a></main>'
+    )
+    monkeypatch.setenv("DIR_DATA_RAW", str(tmp_path))
+    monkeypatch.setattr(
+        create_functional_network.request,
+        "urlopen",
+        lambda url: io.BytesIO(html.encode("utf8")),
+    )
+
+    index = LinkFrequencyIndex.from_page_links(process_links(CORPUS))
+    seed1_pages = create_functional_network.identify_seed_pages(
+        ["/seed"], link_index=index
+    )
+
+    assert sorted(seed1_pages) == ["/apply?step=1", "/guide"]
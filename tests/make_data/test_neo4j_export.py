@@ -0,0 +1,164 @@
+import numpy as np
+import pytest
+
+from src.make_data.fake_neo4j import InMemoryNeo4jDriver
+from src.make_data.neo4j_export import export_to_graph_store, stream_edges
+from src.utils.graph_store import GraphStore
+
+
+@pytest.fixture
+def relationships(page_graph):
+    """
+    The edges of `page_graph` as `HYPERLINKS_TO` relationships, with every third one
+    missing its weight, interleaved with `USER_MOVEMENT` relationships of weight 2.
+    """
+    relationships = []
+    for i, (u, v, weight) in enumerate(page_graph.edges(data="edgeWeight")):
+        properties = {} if i % 3 == 0 else {"weight": weight}
+        relationships.append(
+            {
+                "source": u,
+                "destination": v,
+                "type": "HYPERLINKS_TO",
+                "properties": properties,
+            }
+        )
+        if i % 5 == 0:
+            relationships.append(
+                {
+                    "source": v,
+                    "destination": u,
+                    "type": "USER_MOVEMENT",
+                    "properties": {"weight": 2},
+                }
+            )
+
+    return relationships
+
+
+def expected_edges(relationships, edge_type):
+    edges = {}
+    for relationship in relationships:
+        if relationship["type"] == edge_type:
+            edge = (relationship["source"], relationship["destination"])
+            weight = relationship["properties"].get("weight", 1)
+            edges[edge] = edges.get(edge, 0) + weight
+
+    return edges
+
+
+def store_edges(store, edge_type):
+    layer = store.layers[edge_type].tocoo()
+    return {
+        (store.slugs[i], store.slugs[j]): weight
+        for i, j, weight in zip(layer.row, layer.col, layer.data)
+    }
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 50, 100000])
+def test_export_to_graph_store_matches_relationships(relationships, batch_size):
+    driver = InMemoryNeo4jDriver(relationships)
+    store = export_to_graph_store(
+        driver,
+        ["HYPERLINKS_TO", "USER_MOVEMENT"],
+        batch_size=batch_size,
+        progress=lambda n_batches, n_edges: None,
+    )
+
+    assert set(store.layers) == {"HYPERLINKS_TO", "USER_MOVEMENT"}
+    for edge_type in store.layers:
+        assert store_edges(store, edge_type) == expected_edges(relationships, edge_type)
+    assert len(driver.queries) == len(relationships) // batch_size + 1
+
+
+def test_export_to_graph_store_reports_progress(relationships):
+    calls = []
+    export_to_graph_store(
+        InMemoryNeo4jDriver(relationships),
+        ["HYPERLINKS_TO", "USER_MOVEMENT"],
+        batch_size=50,
+        progress=lambda n_batches, n_edges: calls.append((n_batches, n_edges)),
+    )
+
+    assert [n_batches for n_batches, _ in calls] == list(range(1, len(calls) + 1))
+    assert calls[-1][1] == len(relationships)
+
+
+def test_stream_edges_fills_null_weights():
+    driver = InMemoryNeo4jDriver(
+        [
+            {"source": "/a", "destination": "/b", "type": "NEXT"},
+            {
+                "source": "/b",
+                "destination": "/c",
+                "type": "NEXT",
+                "properties": {"weight": None},
+            },
+            {
+                "source": "/c",
+                "destination": "/a",
+                "type": "NEXT",
+                "properties": {"weight": 4},
+            },
+        ]
+    )
+    (batch,) = stream_edges(driver, ["NEXT"], batch_size=10)
+
+    assert batch["weight"].tolist() == [1.0, 1.0, 4.0]
+    assert batch["weight"].dtype == np.float64
+
+
+def test_export_to_graph_store_skips_other_edge_types(relationships):
+    store = export_to_graph_store(
+        InMemoryNeo4jDriver(relationships),
+        ["USER_MOVEMENT", "RELATED_LINK"],
+        batch_size=7,
+        progress=lambda n_batches, n_edges: None,
+    )
+
+    assert store_edges(store, "USER_MOVEMENT") == expected_edges(
+        relationships, "USER_MOVEMENT"
+    )
+    assert store.layers["RELATED_LINK"].nnz == 0
+    assert store.layers["RELATED_LINK"].shape == (store.n_nodes, store.n_nodes)
+
+
+def test_export_to_graph_store_with_where(relationships):
+    nodes = {f"/page-{i}": {"contentID": i} for i in range(200)}
+    driver = InMemoryNeo4jDriver(
+        relationships,
+        nodes=nodes,
+        where=lambda u, r, v, parameters: u["contentID"] in parameters["contentId"]
+        and v["contentID"] in parameters["contentId"],
+    )
+    store = export_to_graph_store(
+        driver,
+        ["HYPERLINKS_TO"],
+        where="u.contentID IN $contentId AND v.contentID IN $contentId",
+        parameters={"contentId": set(range(50))},
+        batch_size=7,
+        progress=lambda n_batches, n_edges: None,
+    )
+
+    kept = {f"/page-{i}" for i in range(50)}
+    assert store_edges(store, "HYPERLINKS_TO") == {
+        edge: weight
+        for edge, weight in expected_edges(relationships, "HYPERLINKS_TO").items()
+        if set(edge) <= kept
+    }
+
+
+def test_export_to_graph_store_saves(relationships, tmp_path):
+    path = tmp_path / "store.npz"
+    store = export_to_graph_store(
+        InMemoryNeo4jDriver(relationships),
+        ["HYPERLINKS_TO", "USER_MOVEMENT"],
+        batch_size=50,
+        progress=lambda n_batches, n_edges: None,
+        path=path,
+    )
+    loaded = GraphStore.load(path)
+
+    assert list(loaded.slugs) == list(store.slugs)
+    for edge_type, layer in store.layers.items():
+        assert (loaded.layers[edge_type] != layer).nnz == 0
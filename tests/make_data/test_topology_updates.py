@@ -0,0 +1,97 @@
+import numpy as np
+
+from src.make_data.make_topology_matrix import process_links
+from src.make_data.topology_updates import TopologyStore
+
+PAGE_LINKS = {
+    "/a": ["/b", "/c"],
+    "/b": ["/c"],
+    "/c": ["/a", "/d"],
+}
+
+
+def sorted_links(page_links):
+    return {page: sorted(links) for page, links in page_links.items()}
+
+
+def edges(store):
+    graph = store.graph
+    coo = graph.matrix.tocoo()
+    return {(graph.slugs[u], graph.slugs[v]) for u, v in zip(coo.row, coo.col)}
+
+
+def test_update_and_compact():
+    store = TopologyStore.from_page_links(PAGE_LINKS, max_pending=None)
+    assert store.page_links() == PAGE_LINKS
+    assert store.n_nodes == 4
+
+    store.set_links("/c", ["/a", "/a"])
+    store.add_links("/b", ["/a"])
+    store.set_links("/e", ["/a"])
+    assert store.n_pending == 3
+    assert store.out_links("/c") == ["/a"]
+
+    store.compact()
+    assert store.n_pending == 0
+    # "/d" is not linked to any more, and is not a source page
+    assert store.n_nodes == 4
+    assert edges(store) == {
+        ("/a", "/b"),
+        ("/a", "/c"),
+        ("/b", "/a"),
+        ("/b", "/c"),
+        ("/c", "/a"),
+        ("/e", "/a"),
+    }
+
+    store.remove_page("/e")
+    assert "/e" not in store.page_links()
+    assert ("/e", "/a") not in edges(store)
+    assert store.n_nodes == 3
+
+
+def test_compacts_past_max_pending():
+    store = TopologyStore(max_pending=2)
+    for i in range(2):
+        store.set_links(f"/page-{i}", ["/a"])
+        assert store.n_pending == i + 1
+    store.set_links("/page-2", ["/a"])
+
+    assert store.n_pending == 0
+    assert store.graph.matrix.nnz == 3
+
+
+def test_save_and_load(tmp_path):
+    store = TopologyStore.from_page_links(PAGE_LINKS)
+    store.set_links("/b", ["/d"], content_hash="abc")
+    store.save(tmp_path / "topology.npz")
+
+    loaded = TopologyStore.load(tmp_path / "topology.npz")
+
+    assert loaded.page_links() == store.page_links()
+    assert loaded.hashes == {"/a": None, "/b": "abc", "/c": None}
+    assert list(loaded.graph.slugs) == list(store.graph.slugs)
+    assert (loaded.graph.matrix != store.graph.matrix).nnz == 0
+    assert loaded.graph.matrix.dtype == np.float64
+
+    loaded.set_links("/a", ["/e"])
+    assert edges(loaded) == {("/a", "/e"), ("/b", "/d"), ("/c", "/a"), ("/c", "/d")}
+
+
+def test_update_from_html(tmp_path):
+    def write(page, links):
+        path = tmp_path / f"{page.strip('/')}.html"
+        path.write_text("".join(f'<a href="{link}">link</a>' for link in links))
+        return path
+
+    html = {page: links + ["https://example.com"] for page, links in PAGE_LINKS.items()}
+    file_info = {page: write(page, links) for page, links in html.items()}
+    store = TopologyStore()
+    assert store.update_from_html(file_info) == list(PAGE_LINKS)
+    assert sorted_links(store.page_links()) == sorted_links(process_links(html))
+
+    write("/b", ["/d#contact"])
+    del file_info["/c"]
+    assert store.update_from_html(file_info, remove_missing=True) == ["/b", "/c"]
+    assert sorted_links(store.page_links()) == {"/a": ["/b", "/c"], "/b": ["/d"]}
+    assert store.update_from_html(file_info) == []
@@ -0,0 +1,73 @@
+import networkx as nx
+import pytest
+
+from src.utils.centrality import (
+    approximate_betweenness,
+    degree_centrality,
+    eigenvector_centrality,
+    pagerank,
+)
+from src.utils.csr_graph import from_networkx
+
+
+def _scores(ranking, score):
+    return dict(zip(ranking["pagePath"], ranking[score]))
+
+
+def _assert_close(scores, expected, abs=1e-6):
+    assert scores.keys() == expected.keys()
+    for page, value in expected.items():
+        assert scores[page] == pytest.approx(value, abs=abs)
+
+
+def test_from_networkx(page_graph):
+    graph = from_networkx(page_graph)
+
+    assert graph.n_nodes == page_graph.number_of_nodes()
+    assert graph.n_edges == page_graph.number_of_edges()
+    assert graph.matrix.sum() == page_graph.size(weight="edgeWeight")
+
+
+def test_degree_centrality(page_graph):
+    ranking = degree_centrality(from_networkx(page_graph))
+
+    _assert_close(
+        _scores(ranking, "degree_centrality"), nx.degree_centrality(page_graph)
+    )
+    assert ranking["degree_centrality"].is_monotonic_decreasing
+
+
+@pytest.mark.parametrize("weighted", [True, False])
+def test_pagerank(page_graph, weighted):
+    ranking = pagerank(from_networkx(page_graph), weighted=weighted, tol=1e-10)
+    expected = nx.pagerank(
+        page_graph, weight="edgeWeight" if weighted else None, tol=1e-10
+    )
+
+    _assert_close(_scores(ranking, "pagerank"), expected)
+
+
+def test_eigenvector_centrality(page_graph):
+    ranking = eigenvector_centrality(from_networkx(page_graph), max_iter=1000)
+    expected = nx.eigenvector_centrality(page_graph, max_iter=1000)
+
+    _assert_close(_scores(ranking, "eigenvector_centrality"), expected, abs=1e-4)
+
+
+@pytest.mark.parametrize("directed", [True, False])
+def test_exact_betweenness(page_graph, directed):
+    graph = from_networkx(page_graph)
+    G = page_graph if directed else page_graph.to_undirected()
+    expected = nx.betweenness_centrality(G)
+
+    ranking = approximate_betweenness(graph, n_pivots=graph.n_nodes, directed=directed)
+    _assert_close(_scores(ranking, "betweenness"), expected)
+
+
+def test_approximate_betweenness_within_epsilon(page_graph):
+    expected = nx.betweenness_centrality(page_graph)
+
+    ranking = approximate_betweenness(
+        from_networkx(page_graph), epsilon=0.05, random_state=0
+    )
+    _assert_close(_scores(ranking, "betweenness"), expected, abs=0.05)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+
+from src.utils.evaluation import cutoff_scores, evaluate_masks, threshold_scores
+from src.utils.randomwalks import evaluate
+
+COLUMNS = ["threshold", "n_predicted", "precision", "recall", "fscore"]
+
+
+@pytest.fixture
+def page_scores():
+    """A ranking of 10 pages with tied scores; the true pages are the even ones."""
+    return pd.DataFrame(
+        {
+            "pagePath": [f"/page-{i}" for i in range(10)],
+            "tfdf_max": [0.5, 0.9, 0.9, 0.1, 0.5, 0.7, 0.2, 0.2, 0.9, 0.3],
+        }
+    )
+
+
+def test_evaluate_without_predictions():
+    assert evaluate(["/a"], []) == (0.0, 0.0, 0.0)
+    assert evaluate([], ["/a"]) == (0.0, 0.0, 0.0)
+    assert evaluate(["/a"], ["/b"]) == (0.0, 0.0, 0.0)
+
+
+def test_cutoff_scores_match_evaluate():
+    rng = np.random.default_rng(0)
+    true_mask = rng.random(50) < 0.3
+    ranking = rng.permutation(50)[:30]
+    true_pages = np.flatnonzero(true_mask).tolist() + [-1]
+
+    scores = cutoff_scores(ranking, true_mask, n_true=len(true_pages))
+    assert scores["n_predicted"].tolist() == list(range(1, 31))
+    for k, row in enumerate(scores.itertuples(index=False), start=1):
+        assert (row.precision, row.recall, row.fscore) == pytest.approx(
+            evaluate(true_pages, ranking[:k].tolist())
+        )
+
+
+def test_cutoff_scores_of_empty_ranking():
+    scores = cutoff_scores(np.zeros(0, dtype=int), np.ones(5, dtype=bool))
+
+    assert len(scores) == 0
+    assert list(scores.columns) == COLUMNS[1:]
+
+
+def test_threshold_scores_match_evaluate(page_scores):
+    true_pages = [f"/page-{i}" for i in range(0, 10, 2)]
+
+    scores = threshold_scores(page_scores, true_pages)
+    assert list(scores.columns) == COLUMNS
+    assert scores["threshold"].tolist() == [0.9, 0.7, 0.5, 0.3, 0.2, 0.1]
+    for row in scores.itertuples(index=False):
+        predicted = page_scores.loc[
+            page_scores["tfdf_max"] >= row.threshold, "pagePath"
+        ].tolist()
+        assert row.n_predicted == len(predicted)
+        assert (row.precision, row.recall, row.fscore) == pytest.approx(
+            evaluate(true_pages, predicted)
+        )
+
+
+def test_threshold_scores_of_empty_ranking(page_scores):
+    scores = threshold_scores(page_scores.iloc[:0], ["/page-0"])
+
+    assert len(scores) == 0
+    assert list(scores.columns) == COLUMNS
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_evaluate_masks_match_evaluate(sparse):
+    rng = np.random.default_rng(1)
+    true_mask = rng.random(40) < 0.25
+    predicted_masks = rng.random((8, 40)) < 0.2
+    predicted_masks[0] = False
+
+    scores = evaluate_masks(
+        true_mask, csr_matrix(predicted_masks) if sparse else predicted_masks
+    )
+    assert len(scores) == 8
+    for mask, row in zip(predicted_masks, scores.itertuples(index=False)):
+        assert row.n_predicted == np.count_nonzero(mask)
+        assert (row.precision, row.recall, row.fscore) == pytest.approx(
+            evaluate(np.flatnonzero(true_mask), np.flatnonzero(mask))
+        )
@@ -0,0 +1,89 @@
+import networkx as nx
+import pytest
+
+from src.utils.csr_graph import from_networkx
+from src.utils.graph_diagnostics import (
+    component_sizes,
+    connected_components,
+    eccentricity,
+    estimate_diameter,
+    hop_distances,
+    suggest_walk_length,
+)
+
+
+@pytest.fixture(scope="module")
+def largest_component(page_graph):
+    """The largest weakly connected component of `page_graph`, undirected."""
+    pages = max(nx.weakly_connected_components(page_graph), key=len)
+    return page_graph.subgraph(pages).to_undirected()
+
+
+@pytest.mark.parametrize("connection", ["weak", "strong"])
+def test_connected_components(page_graph, connection):
+    components = {
+        "weak": nx.weakly_connected_components,
+        "strong": nx.strongly_connected_components,
+    }[connection](page_graph)
+    expected = sorted(map(sorted, components), key=lambda pages: (-len(pages), pages))
+
+    graph = from_networkx(page_graph)
+    found = [sorted(pages) for pages in connected_components(graph, connection)]
+    assert sorted(found, key=lambda pages: (-len(pages), pages)) == expected
+    assert component_sizes(graph, connection) == [len(pages) for pages in expected]
+
+
+def test_hop_distances(page_graph):
+    seeds = ["/page-0", "/page-1"]
+    graph = page_graph.copy()
+    graph.add_edges_from(("source", seed) for seed in seeds)
+    expected = {
+        page: hops - 1
+        for page, hops in nx.single_source_shortest_path_length(graph, "source").items()
+        if page != "source"
+    }
+
+    distances = hop_distances(from_networkx(page_graph), seeds + ["/missing"])
+    assert dict(zip(distances["pagePath"], distances["hops"])) == expected
+    assert distances["hops"].is_monotonic_increasing
+
+    limited = hop_distances(from_networkx(page_graph), seeds, max_hops=1)
+    assert set(limited["pagePath"]) == {p for p, h in expected.items() if h <= 1}
+
+
+def test_suggest_walk_length(page_graph):
+    graph = from_networkx(page_graph)
+    hops = hop_distances(graph, ["/page-0"])["hops"]
+
+    assert suggest_walk_length(graph, ["/page-0"], coverage=1) == hops.max()
+    assert suggest_walk_length(graph, ["/missing"]) == 0
+
+
+def test_eccentricity(largest_component):
+    graph = from_networkx(largest_component)
+    pages = list(largest_component)[:10]
+
+    assert eccentricity(graph, pages).to_dict() == nx.eccentricity(
+        largest_component, v=pages
+    )
+
+
+def test_ifub_diameter(page_graph, largest_component):
+    diameter = estimate_diameter(from_networkx(page_graph), method="ifub")
+
+    assert diameter["lower_bound"] == diameter["upper_bound"]
+    assert diameter["lower_bound"] == nx.diameter(largest_component)
+
+
+def test_double_sweep_lower_bound(page_graph):
+    diameter = estimate_diameter(from_networkx(page_graph), method="double_sweep")
+    # the longest finite directed shortest path
+    directed_diameter = max(
+        max(lengths.values())
+        for _, lengths in nx.all_pairs_shortest_path_length(page_graph)
+    )
+
+    assert diameter["upper_bound"] is None
+    assert 0 < diameter["lower_bound"] <= directed_diameter
+    with pytest.raises(ValueError):
+        estimate_diameter(from_networkx(page_graph), method="exact")
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils import walk_engine
+from src.utils.graph_store import GraphStore
+
+LINKS = pd.DataFrame(
+    {
+        "sourcePagePath": ["/a", "/a", "/b", "/c"],
+        "destinationPagePath": ["/b", "/c", "/c", "/a"],
+        "edgeWeight": [1.0, 3.0, 2.0, 1.0],
+    }
+)
+MOVES = pd.DataFrame(
+    {
+        "sourcePagePath": ["/a", "/b", "/b", "/d"],
+        "destinationPagePath": ["/d", "/a", "/d", "/a"],
+        "edgeWeight": [2.0, 1.0, 1.0, 5.0],
+    }
+)
+
+
+@pytest.fixture
+def store():
+    store = GraphStore()
+    store.add_edges("HYPERLINKS_TO", LINKS)
+    store.add_edges("USER_MOVEMENT", MOVES)
+    return store
+
+
+def _dense(store, T):
+    return pd.DataFrame(T.toarray(), index=store.slugs, columns=store.slugs)
+
+
+def test_mixed_transition_matrix(store):
+    T = _dense(store, store.transition_matrix({"HYPERLINKS_TO": 1, "USER_MOVEMENT": 3}))
+
+    # /a has out-edges in both layers, mixed 1:3
+    assert T.loc["/a"].to_dict() == pytest.approx(
+        {"/a": 0, "/b": 0.25 * 0.25, "/c": 0.25 * 0.75, "/d": 0.75}
+    )
+    assert T.loc["/b"].to_dict() == pytest.approx(
+        {"/a": 0.75 * 0.5, "/b": 0, "/c": 0.25, "/d": 0.75 * 0.5}
+    )
+    # /c and /d only have out-edges in one layer, which takes all the probability
+    assert T.loc["/c", "/a"] == pytest.approx(1)
+    assert T.loc["/d", "/a"] == pytest.approx(1)
+    np.testing.assert_allclose(T.sum(axis=1), 1)
+
+
+def test_transition_matrix_of_one_layer(store):
+    T = _dense(store, store.transition_matrix({"HYPERLINKS_TO": 1}))
+
+    assert T.loc["/a"].to_dict() == pytest.approx(
+        {"/a": 0, "/b": 0.25, "/c": 0.75, "/d": 0}
+    )
+    # /d has no hyperlinks, so its row is empty
+    assert T.loc["/d"].sum() == 0
+    with pytest.raises(KeyError):
+        store.transition_matrix({"MISSING": 1})
+    with pytest.raises(ValueError):
+        store.transition_matrix({"HYPERLINKS_TO": -1})
+
+
+def test_walk_layers_follow_the_mixed_transition_matrix(store):
+    mixing = {"HYPERLINKS_TO": 1, "USER_MOVEMENT": 3}
+    T = store.transition_matrix(mixing).toarray()
+    layers = [store.walk_arrays(edge_type) for edge_type in mixing]
+    n_walks = 20000
+
+    for start in range(store.n_nodes):
+        paths = walk_engine.walk_layers(
+            layers,
+            list(mixing.values()),
+            np.full(n_walks, start),
+            1,
+            rng=np.random.default_rng(start),
+        )
+        frequencies = np.bincount(paths[:, 1], minlength=store.n_nodes) / n_walks
+        np.testing.assert_allclose(frequencies, T[start], atol=0.02)
+
+
+def test_walks_stop_at_pages_without_out_edges(store):
+    arrays = store.walk_arrays("HYPERLINKS_TO")
+    d = store.node_ids(["/d"])[0]
+
+    paths = walk_engine.walk(arrays, [d, d], 3, rng=np.random.default_rng(0))
+    assert (paths[:, 0] == d).all()
+    assert (paths[:, 1:] == walk_engine.STOPPED).all()
+
+    paths = walk_engine.walk_layers([arrays], [1], [d], 3)
+    assert paths.tolist() == [[d, -1, -1, -1]]
+
+
+def test_random_walks(store, capsys):
+    results = store.random_walks(
+        ["/a", "/missing"], steps=5, repeats=10, random_state=0
+    )
+
+    assert "could not be found" in capsys.readouterr().out
+    assert results["seeds"] == ["/a"]
+    assert len(results["paths_taken"]) == 1
+    assert len(results["paths_taken"][0]) == 10
+    assert all("/a" in path for path in results["paths_taken"][0])
+    assert results["pages_visited"] <= set(store.slugs)
+    assert results == store.random_walks(["/a"], steps=5, repeats=10, random_state=0)
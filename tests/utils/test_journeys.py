@@ -0,0 +1,60 @@
+import pandas as pd
+
+from src.utils.evaluation import threshold_scores
+from src.utils.journeys import run_journeys
+from src.utils.randomwalks import (
+    add_additional_information,
+    page_freq_path_freq_ranking,
+    repeat_random_walks,
+)
+
+JOURNEYS = {
+    "two seeds": ["/page-1", "/page-2"],
+    "one missing seed": ["/page-3", "/missing"],
+    "no seeds": ["/missing"],
+}
+
+
+def test_run_journeys_matches_repeat_random_walks(functional_graph):
+    G, T = functional_graph
+    true_pages = {"two seeds": ["/page-1", "/page-5"], "no seeds": ["/page-1"]}
+    options = dict(n_jobs=1, random_state=7, alpha=0.2, verbose=0)
+
+    output = run_journeys(JOURNEYS, G, T, 10, 30, true_pages=true_pages, **options)
+
+    assert list(output) == list(JOURNEYS)
+    for name, seed_pages in JOURNEYS.items():
+        expected = repeat_random_walks(
+            10, 30, T, G, seed_pages, True, "union", 1, **options
+        )
+        assert output[name]["results"] == expected
+        if expected is None:
+            assert output[name]["ranking"] is None
+            continue
+
+        page_scores = page_freq_path_freq_ranking(expected)
+        pd.testing.assert_frame_equal(
+            output[name]["ranking"], add_additional_information(page_scores, G)
+        )
+        if name in true_pages:
+            pd.testing.assert_frame_equal(
+                output[name]["evaluation"],
+                threshold_scores(page_scores, true_pages[name]),
+            )
+
+    assert output["two seeds"]["results"]["seeds"] == ["/page-1", "/page-2"]
+    assert output["one missing seed"]["results"]["seeds"] == ["/page-3"]
+    assert "evaluation" not in output["one missing seed"]
+    assert output["no seeds"]["evaluation"] is None
+
+
+def test_run_journeys_builds_the_transition_matrix(functional_graph):
+    G, T = functional_graph
+    options = dict(n_jobs=1, random_state=0, verbose=0)
+
+    output = run_journeys({"journey": ["/page-1"]}, G, steps=5, repeats=10, **options)
+    expected = repeat_random_walks(
+        5, 10, T, G, ["/page-1"], True, "union", 1, **options
+    )
+
+    assert output["journey"]["results"] == expected
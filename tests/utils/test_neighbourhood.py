@@ -0,0 +1,104 @@
+import networkx as nx
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from src.utils.neighbourhood import (
+    k_hop_nodes,
+    k_hop_subgraph,
+    reverse_layers,
+    taxon_prefix_mask,
+    whitelist_mask,
+)
+
+
+@pytest.fixture(scope="module")
+def layers(page_graph):
+    """Two edge types over the pages of `page_graph`: its edges, and a chain."""
+    n = page_graph.number_of_nodes()
+    graph = nx.convert_node_labels_to_integers(page_graph)
+    chain = csr_matrix((np.ones(n - 1), (np.arange(n - 1), np.arange(1, n))), (n, n))
+
+    return {"LINKS": nx.to_scipy_sparse_array(graph, format="csr"), "NEXT": chain}
+
+
+def _ego(layers, edge_types, seeds, k, direction):
+    """The nodes within `k` hops of `seeds`, with networkx."""
+    G = nx.DiGraph()
+    for edge_type in edge_types:
+        G.add_edges_from(zip(*layers[edge_type].nonzero()))
+    G.add_nodes_from(range(layers["LINKS"].shape[0]))
+    if direction == "in":
+        G = G.reverse()
+    elif direction == "both":
+        G = G.to_undirected()
+
+    return sorted(set().union(*(nx.ego_graph(G, seed, radius=k) for seed in seeds)))
+
+
+@pytest.mark.parametrize("direction", ["out", "in", "both"])
+@pytest.mark.parametrize("k", [0, 1, 2])
+def test_k_hop_nodes(layers, direction, k):
+    seeds = [0, 5]
+
+    nodes = k_hop_nodes(layers, seeds, k=k, direction=direction)
+    assert nodes.tolist() == _ego(layers, ["LINKS", "NEXT"], seeds, k, direction)
+
+    nodes = k_hop_nodes(
+        layers,
+        seeds,
+        k=k,
+        edge_types=["LINKS"],
+        direction=direction,
+        reversed_layers=reverse_layers(layers),
+    )
+    assert nodes.tolist() == _ego(layers, ["LINKS"], seeds, k, direction)
+
+
+def test_k_hop_nodes_never_enter_masked_nodes(layers):
+    mask = np.ones(layers["NEXT"].shape[0], dtype=bool)
+    mask[[3, 7]] = False
+
+    nodes = k_hop_nodes(layers, [0, 3], k=10, edge_types=["NEXT"], node_mask=mask)
+    assert nodes.tolist() == [0, 1, 2]
+
+
+def test_k_hop_nodes_arguments(layers):
+    with pytest.raises(ValueError):
+        k_hop_nodes(layers, [0], direction="sideways")
+    with pytest.raises(KeyError):
+        k_hop_nodes(layers, [0], edge_types=["MISSING"])
+    with pytest.raises(ValueError):
+        k_hop_nodes({}, [0])
+
+
+def test_k_hop_subgraph(layers):
+    slugs = np.array([f"/page-{i}" for i in range(layers["NEXT"].shape[0])])
+
+    subgraphs, node_map = k_hop_subgraph(
+        layers,
+        slugs,
+        ["/page-10", "/missing"],
+        k=2,
+        edge_types=["NEXT"],
+        direction="out",
+    )
+    assert node_map.tolist() == [10, 11, 12]
+    assert list(subgraphs) == ["NEXT"]
+    assert subgraphs["NEXT"].slugs.tolist() == ["/page-10", "/page-11", "/page-12"]
+    assert subgraphs["NEXT"].matrix.toarray().tolist() == [
+        [0, 1, 0],
+        [0, 0, 1],
+        [0, 0, 0],
+    ]
+
+
+def test_node_masks():
+    assert whitelist_mask(["a", "b", None, "c"], {"a", "c"}).tolist() == [
+        True,
+        False,
+        False,
+        True,
+    ]
+    taxons = ["/business/tax|/money", ["/education"], None, " /money/benefits"]
+    assert taxon_prefix_mask(taxons, ["/money"]).tolist() == [True, False, False, True]
@@ -0,0 +1,29 @@
+import pytest
+
+from src.utils.personalised_pagerank import personalised_pagerank, restart_matrix
+
+
+def test_restart_matrix_without_seed_sets():
+    assert restart_matrix([], 5).shape == (5, 0)
+
+
+@pytest.mark.parametrize("method", ["power", "push"])
+def test_personalised_pagerank_without_seeds_in_graph(functional_graph, method):
+    G, T = functional_graph
+
+    ranking = personalised_pagerank(T, G, ["/missing"], method=method)
+    assert ranking.empty
+
+    rankings = personalised_pagerank(
+        T, G, {"a": ["/missing"], "b": ["/also-missing"]}, method=method
+    )
+    assert list(rankings) == ["a", "b"]
+    assert all(ranking.empty for ranking in rankings.values())
+
+
+def test_personalised_pagerank_mixes_found_and_missing_seed_sets(functional_graph):
+    G, T = functional_graph
+
+    rankings = personalised_pagerank(T, G, {"a": ["/missing"], "b": ["/page-1"]})
+    assert rankings["a"].empty
+    assert rankings["b"]["ppr_score"].sum() == pytest.approx(1, abs=1e-6)
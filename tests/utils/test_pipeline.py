@@ -0,0 +1,63 @@
+import pytest
+
+from src.utils.create_functional_network import extract_nodes_and_edges
+from src.utils.pipeline import Pipeline, _nodes_and_edges
+
+PARAMS = {"seed0_pages": ["/page-1"], "n_bootstrap": 0, "random_state": 0}
+
+
+@pytest.fixture
+def sessions_path(hits, tmp_path):
+    path = tmp_path / "sessions.parquet"
+    hits.to_parquet(path)
+    return str(path)
+
+
+def test_sample_percent_cannot_rescale_a_sessions_file(hits, sessions_path, tmp_path):
+    pipeline = Pipeline(cache_dir=tmp_path / "cache")
+    params = {**PARAMS, "sessions_path": sessions_path}
+
+    with pytest.raises(ValueError):
+        pipeline.run(
+            {**params, "sample_percent": 10}, targets=["nodes_and_edges"], verbose=0
+        )
+
+    outputs = pipeline.run(params, targets=["nodes_and_edges"], verbose=0)
+    _, edges = outputs["nodes_and_edges"]
+    _, expected = extract_nodes_and_edges(hits.copy())
+    assert edges["edgeWeight"].sum() == expected["edgeWeight"].sum()
+
+
+def test_nodes_and_edges_rescale_by_the_sessions_sample_fraction(hits):
+    sessions = hits.copy()
+    sessions.attrs["sample_fraction"] = 0.5
+    params = {**PARAMS, "bootstrap_random_state": 0}
+
+    _, edges = _nodes_and_edges({"sessions": sessions}, params)
+    _, expected = extract_nodes_and_edges(hits.copy())
+    assert edges["edgeWeight"].sum() == 2 * expected["edgeWeight"].sum()
+
+
+def test_walk_random_state_does_not_rebuild_the_graph(sessions_path, tmp_path):
+    pipeline = Pipeline(cache_dir=tmp_path / "cache")
+    params = {**PARAMS, "sessions_path": sessions_path}
+    pipeline.run(params, targets=["nodes_and_edges"], verbose=0)
+
+    targets = ["nodes_and_edges", "walks"]
+    assert pipeline.plan({**params, "random_state": 1}, targets) == {
+        "nodes_and_edges": "load",
+        "graph": "run",
+        "reformatted_graph": "run",
+        "pruned_graph": "run",
+        "transition_matrix": "run",
+        "walks": "run",
+    }
+    assert pipeline.plan({**params, "bootstrap_random_state": 1}, targets) == {
+        "sessions": "load",
+        "nodes_and_edges": "run",
+        "graph": "run",
+        "reformatted_graph": "run",
+        "pruned_graph": "run",
+        "transition_matrix": "run",
+        "walks": "run",
+    }
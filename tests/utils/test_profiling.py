@@ -0,0 +1,98 @@
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.profiling import (
+    TRACEMALLOC_ENV_VARIABLE,
+    add_hook,
+    profiled,
+    remove_hook,
+)
+
+
+@pytest.fixture
+def records():
+    collected = []
+    add_hook(collected.append)
+    yield collected
+    remove_hook(collected.append)
+
+
+@profiled(outputs=("graph", "frame"))
+def build(edges, rows):
+    return nx.DiGraph(edges), pd.DataFrame({"x": range(rows)})
+
+
+@profiled("failing stage")
+def fail(values):
+    raise ValueError("bad values")
+
+
+def test_profiled_off_without_hooks(monkeypatch):
+    monkeypatch.delenv("WUJ_PROFILE", raising=False)
+    collected = []
+    add_hook(collected.append)
+    remove_hook(collected.append)
+
+    graph, frame = build([(1, 2), (2, 3)], 4)
+
+    assert collected == []
+    assert graph.number_of_edges() == 2
+    assert len(frame) == 4
+
+
+def test_profiled_records_sizes(records):
+    build([(1, 2), (2, 3)], 4)
+
+    assert len(records) == 1
+    record = records[0]
+    assert record["stage"] == "build"
+    assert record["inputs"] == {"edges": {"items": 2}}
+    assert record["outputs"] == {
+        "graph": {"nodes": 3, "edges": 2},
+        "frame": {"rows": 4},
+    }
+    assert record["error"] is None
+    assert record["wall_seconds"] >= 0
+    assert record["tracemalloc_peak_mb"] is None
+
+
+def test_profiled_records_errors(records):
+    with pytest.raises(ValueError):
+        fail([1, 2, 3])
+
+    assert [record["stage"] for record in records] == ["failing stage"]
+    assert records[0]["inputs"] == {"values": {"items": 3}}
+    assert records[0]["outputs"] is None
+    assert records[0]["error"] == "ValueError"
+
+
+def test_nested_stages_keep_their_peaks(records, monkeypatch):
+    monkeypatch.setenv(TRACEMALLOC_ENV_VARIABLE, "1")
+    tracing = []
+
+    @profiled()
+    def inner():
+        return np.ones(2**17)
+
+    @profiled()
+    def outer():
+        large = np.ones(2**21)
+        del large
+        inner()
+        tracing.append(tracemalloc.is_tracing())
+        inner()
+
+    assert not tracemalloc.is_tracing()
+    outer()
+
+    peaks = {record["stage"]: record["tracemalloc_peak_mb"] for record in records}
+    assert [record["stage"] for record in records] == ["inner", "inner", "outer"]
+    # 2**17 and 2**21 float64s are 1 MB and 16 MB
+    assert 1 <= peaks["inner"] < 2
+    assert peaks["outer"] >= 16
+    assert tracing == [True]
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,68 @@
+import networkx as nx
+import pytest
+
+from src.utils.pruning import prune_graph
+from src.utils.randomwalks import getSlugs
+
+
+def networkx_top_k(G, k):
+    """The `k` heaviest out-edges of each page, ties broken by node order."""
+    order = {node: i for i, node in enumerate(G)}
+    edges = set()
+    for u in G:
+        out_edges = sorted(
+            G.out_edges(u, data="edgeWeight"), key=lambda e: (-e[2], order[e[1]])
+        )
+        edges.update((u, v) for u, v, _ in out_edges[:k])
+
+    return edges
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 5])
+def test_k_core_matches_networkx(page_graph, k):
+    undirected = nx.Graph(page_graph)
+    undirected.remove_edges_from(list(nx.selfloop_edges(undirected)))
+
+    pruned, report = prune_graph(page_graph, k_core=k, drop_isolates=False)
+
+    assert set(pruned) == set(nx.k_core(undirected, k))
+    assert set(pruned.edges) == set(page_graph.subgraph(pruned).edges)
+    assert list(report["step"]) == ["input", "k_core"]
+    assert report["nodes"].iloc[-1] == pruned.number_of_nodes()
+    assert report["edges"].iloc[-1] == pruned.number_of_edges()
+
+
+@pytest.mark.parametrize("k", [1, 2, 4])
+def test_top_k_matches_networkx(page_graph, k):
+    pruned, report = prune_graph(page_graph, top_k=k, drop_isolates=False)
+
+    assert set(pruned.edges) == networkx_top_k(page_graph, k)
+    assert all(pruned.out_degree(node) <= k for node in pruned)
+    assert report["edges_removed"].iloc[-1] == (
+        page_graph.number_of_edges() - pruned.number_of_edges()
+    )
+
+
+def test_prune_graph_keeps_attributes_and_protected_pages(page_graph):
+    protected = ["/page-150", "/page-199"]
+
+    pruned, report = prune_graph(
+        page_graph, min_edge_weight=2, protected_pages=protected
+    )
+
+    heavy = {(u, v) for u, v, w in page_graph.edges(data="edgeWeight") if w >= 2}
+    assert set(pruned.edges) == heavy
+    assert set(protected) <= set(pruned)
+    assert all(pruned.degree(node) > 0 or node in protected for node in pruned)
+    assert all(pruned.edges[edge] == page_graph.edges[edge] for edge in pruned.edges)
+    assert list(report["step"]) == ["input", "min_edge_weight", "drop_isolates"]
+
+
+def test_prune_reformatted_graph(functional_graph):
+    G, _ = functional_graph
+
+    pruned, _ = prune_graph(G, k_core=2)
+
+    assert list(pruned) == list(range(pruned.number_of_nodes()))
+    slugs = getSlugs(pruned)
+    assert slugs == [slug for slug in getSlugs(G) if slug in set(slugs)]
@@ -0,0 +1,190 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from src.utils import walk_engine
+from src.utils.randomwalks import (
+    evaluate,
+    evaluate_mask,
+    get_transition_matrix,
+    getSlugs,
+    pages_mask,
+    repeat_random_walks,
+    repeat_second_order_walks,
+    symmetrise,
+    walk_results,
+    walk_stability,
+)
+
+
+def dense_transition_matrix(G):
+    """The dense computation `get_transition_matrix` used before it was sparse."""
+    T = np.array(nx.adjacency_matrix(G, weight="edgeWeight").todense())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        T_probs = T / T.sum(axis=1)[:, np.newaxis]
+    np.nan_to_num(T_probs, nan=1 / T.shape[0], copy=False)
+
+    return T_probs
+
+
+def combine_sets(paths_taken, combine, level):
+    """The set-based union and intersection `repeat_random_walks` used before masks."""
+    if combine == "union":
+        if level == 0:
+            return [{page for path in paths for page in path} for paths in paths_taken]
+        return {page for paths in paths_taken for path in paths for page in path}
+
+    if level == 0:
+        return [set.intersection(*map(set, paths)) for paths in paths_taken]
+    return set.intersection(
+        *[{page for path in paths for page in path} for paths in paths_taken]
+    )
+
+
+def summed_undirected_graph(G):
+    """The per-edge `nx.Graph` loop in `biased_random_walks.ipynb`."""
+    H = nx.Graph()
+    H.add_nodes_from(G)
+    for u, v, weight in G.edges(data="edgeWeight"):
+        if H.has_edge(u, v):
+            H.edges[u, v]["edgeWeight"] += weight
+        else:
+            H.add_edge(u, v, edgeWeight=weight)
+
+    return H
+
+
+def test_transition_matrix_matches_dense(page_graph):
+    T = get_transition_matrix(page_graph)
+
+    assert any(page_graph.out_degree(page) == 0 for page in page_graph)
+    np.testing.assert_allclose(T.toarray(), dense_transition_matrix(page_graph))
+
+
+def test_transition_matrix_without_dangling_rows(page_graph):
+    T = get_transition_matrix(page_graph, dangling=None).toarray()
+    dangling = [page_graph.out_degree(page) == 0 for page in page_graph]
+
+    np.testing.assert_allclose(T.sum(axis=1), np.where(dangling, 0.0, 1.0))
+    np.testing.assert_allclose(
+        T[~np.array(dangling)],
+        dense_transition_matrix(page_graph)[~np.array(dangling)],
+    )
+
+
+def test_symmetric_transition_matrix_matches_undirected_graph(page_graph):
+    T = get_transition_matrix(page_graph, symmetric=True)
+    H = summed_undirected_graph(page_graph)
+
+    assert any(page_graph.has_edge(page, page) for page in page_graph)
+    np.testing.assert_allclose(T.toarray(), dense_transition_matrix(H))
+
+
+@pytest.mark.parametrize("reciprocal, combine", [("max", max), ("min", min)])
+def test_symmetrise_reciprocal(page_graph, reciprocal, combine):
+    A = nx.adjacency_matrix(page_graph, weight="edgeWeight")
+    S = symmetrise(A, reciprocal=reciprocal).toarray()
+    W = A.toarray()
+
+    expected = np.array(
+        [[combine(W[i, j], W[j, i]) for j in range(len(W))] for i in range(len(W))]
+    )
+    np.testing.assert_array_equal(S, expected)
+    np.testing.assert_array_equal(S, S.T)
+
+
+def test_symmetrise_rejects_unknown_rule(page_graph):
+    A = nx.adjacency_matrix(page_graph, weight="edgeWeight")
+
+    with pytest.raises(ValueError, match="reciprocal"):
+        symmetrise(A, reciprocal="mean")
+    with pytest.raises(ValueError, match="dangling"):
+        get_transition_matrix(page_graph, dangling="teleport")
+
+
+def test_walks_without_seeds_in_graph(functional_graph, capsys):
+    G, T = functional_graph
+
+    assert (
+        repeat_random_walks(5, 3, T, G, ["/missing"], True, "union", verbose=0) is None
+    )
+    assert repeat_second_order_walks(5, 3, T, G, ["/missing"], True, "union") is None
+    assert capsys.readouterr().out.count("No pages found") == 2
+
+
+def test_second_order_walks_from_seed(functional_graph):
+    G, T = functional_graph
+
+    results = repeat_second_order_walks(
+        5, 3, T, G, ["/page-1"], True, "union", level=1, p=2, q=0.5, random_state=0
+    )
+    assert results["seeds"] == ["/page-1"]
+    assert "/page-1" in results["pages_visited"]
+    assert len(results["paths_taken"][0]) == 3
+
+
+@pytest.mark.parametrize("combine", ["union", "intersection"])
+@pytest.mark.parametrize("level", [0, 1])
+def test_walk_results_masks_match_sets(functional_graph, combine, level):
+    G, T = functional_graph
+    slugs = np.array(getSlugs(G), dtype=object)
+    arrays = walk_engine.prepare(T)
+    rng = np.random.default_rng(0)
+    seed_ids = [1, 2, 3]
+    paths = [
+        walk_engine.walk(arrays, np.repeat(seed_id, 4), 3, rng) for seed_id in seed_ids
+    ]
+    results = walk_results(slugs, list(slugs[seed_ids]), paths, 4, combine, level)
+
+    assert results["pages_visited"] == combine_sets(
+        results["paths_taken"], combine, level
+    )
+
+
+def test_evaluate_mask_matches_evaluate(page_graph):
+    slugs = np.array(list(page_graph), dtype=object)
+    true_pages = [f"/page-{i}" for i in range(0, 40, 2)] + ["/missing"]
+    predicted_pages = [f"/page-{i}" for i in range(30)]
+
+    assert evaluate_mask(
+        pages_mask(true_pages, slugs),
+        pages_mask(predicted_pages, slugs),
+        n_true=len(true_pages),
+    ) == pytest.approx(evaluate(true_pages, predicted_pages))
+
+
+def test_walk_stability():
+    previous = np.array([4, 3, 0, 1, 0])
+    counts = np.array([8, 6, 1, 2, 0])
+
+    stability = walk_stability(previous, counts, top_k=2)
+    assert stability["jaccard"] == pytest.approx(3 / 4)
+    assert stability["rank_correlation"] == pytest.approx(1.0)
+    assert walk_stability(previous, previous) == {
+        "jaccard": 1.0,
+        "rank_correlation": 1.0,
+    }
+
+
+def test_adaptive_walks_stop_early(functional_graph):
+    G, T = functional_graph
+    seeds = ["/page-1", "/page-2"]
+    options = dict(verbose=0, random_state=0, tolerance=0.05, batch_size=20)
+
+    results = repeat_random_walks(5, 1000, T, G, seeds, True, "union", 1, **options)
+    assert 40 <= results["repeats"] < 1000
+    assert results["repeats"] % 20 == 0
+    assert min(results["stability"].values()) >= 0.95
+    assert all(len(paths) == results["repeats"] for paths in results["paths_taken"])
+
+    again = repeat_random_walks(5, 1000, T, G, seeds, True, "union", 1, **options)
+    assert again["paths_taken"] == results["paths_taken"]
+
+
+def test_adaptive_walks_stop_at_repeats(functional_graph):
+    G, T = functional_graph
+    options = dict(verbose=0, random_state=0, tolerance=0.0, batch_size=20)
+
+    results = repeat_random_walks(5, 50, T, G, ["/page-1"], True, "union", 1, **options)
+    assert results["repeats"] == 50
+    assert len(results["paths_taken"][0]) == 50
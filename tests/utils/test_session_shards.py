@@ -0,0 +1,149 @@
+import pandas as pd
+import pytest
+
+from src.make_data.fake_bigquery import FakeBigQueryClient, daily_tables
+from src.utils.create_functional_network import extract_seed_sessions
+from src.utils.session_shards import (
+    date_shards,
+    extract_seed_sessions_sharded,
+    merge_shards,
+)
+
+START, END = "20220101", "20220128"
+
+
+def _seeds(hits):
+    top = hits["pagePath"].value_counts().index.tolist()
+    return top[:3], top[3:10]
+
+
+def _comparable(df):
+    """`df` in a canonical row order and dtypes, to compare extraction results."""
+    df = df.sort_values(["sessionId", "hitNumber", "pagePath"], ignore_index=True)
+    return df.astype({"sessionId": str, "pagePath": str, "sessionHits": "int64"})
+
+
+def test_date_shards():
+    assert date_shards("20220125", "20220205", 7) == [
+        ("20220125", "20220131"),
+        ("20220201", "20220205"),
+    ]
+    with pytest.raises(ValueError):
+        date_shards("20220205", "20220125")
+
+
+def test_sharded_sessions_equal_unsharded(hits, tmp_path):
+    # without sessions split at midnight, every session is within one shard
+    tables = daily_tables(hits, START, n_days=28, midnight_fraction=0)
+    seed0_pages, seed1_pages = _seeds(hits)
+
+    unsharded = extract_seed_sessions(
+        START, END, seed0_pages, seed1_pages, client=FakeBigQueryClient(tables)
+    )
+    sharded = extract_seed_sessions_sharded(
+        START,
+        END,
+        seed0_pages,
+        seed1_pages,
+        shard_days=5,
+        output_dir=tmp_path,
+        page_size=500,
+        client=FakeBigQueryClient(tables),
+    )
+
+    pd.testing.assert_frame_equal(
+        _comparable(sharded)[list(unsharded)],
+        _comparable(unsharded),
+        check_dtype=False,
+    )
+
+
+def test_sharded_session_hits_count_split_sessions_once(hits, tmp_path):
+    tables = daily_tables(hits, START, n_days=28, midnight_fraction=0.2)
+    seed0_pages, seed1_pages = _seeds(hits)
+
+    unsharded = extract_seed_sessions(
+        START, END, seed0_pages, seed1_pages, client=FakeBigQueryClient(tables)
+    )
+    sharded = extract_seed_sessions_sharded(
+        START,
+        END,
+        seed0_pages,
+        seed1_pages,
+        shard_days=1,
+        output_dir=tmp_path,
+        client=FakeBigQueryClient(tables),
+    )
+
+    expected = unsharded.groupby("pagePath")["sessionHits"].first()
+    session_hits = sharded.groupby("pagePath")["sessionHits"].first()
+    pd.testing.assert_series_equal(
+        session_hits, expected.loc[session_hits.index], check_dtype=False
+    )
+
+
+def test_sharded_queries_respect_max_workers(hits, tmp_path):
+    client = FakeBigQueryClient(
+        daily_tables(hits, START, n_days=28), seconds_per_day=0.01
+    )
+
+    extract_seed_sessions_sharded(
+        START,
+        END,
+        *_seeds(hits),
+        shard_days=2,
+        max_workers=3,
+        output_dir=tmp_path,
+        client=client,
+    )
+
+    # 14 shards, and the page session hits query
+    assert len(client.queries) == 15
+    assert 1 < client.max_running <= 3
+
+
+def test_shard_files_are_reused(hits, tmp_path):
+    tables = daily_tables(hits, START, n_days=28)
+    arguments = dict(shard_days=7, output_dir=tmp_path)
+
+    first = extract_seed_sessions_sharded(
+        START, END, *_seeds(hits), client=FakeBigQueryClient(tables), **arguments
+    )
+    client = FakeBigQueryClient(tables)
+    rerun = extract_seed_sessions_sharded(
+        START, END, *_seeds(hits), client=client, **arguments
+    )
+
+    assert client.queries == []
+    pd.testing.assert_frame_equal(rerun, first)
+
+    # a different sample is a different set of shards
+    extract_seed_sessions_sharded(
+        START, END, *_seeds(hits), sample_percent=50, client=client, **arguments
+    )
+    assert len(client.queries) == 5
+
+
+def test_merge_shards_renumbers_sessions_split_at_a_boundary():
+    columns = ["sessionId", "hitNumber", "pagePath", "isEntrance", "isExit"]
+    before = pd.DataFrame(
+        [["a", 1, "/one", True, None], ["a", 2, "/two", None, True]], columns=columns
+    )
+    after = pd.DataFrame(
+        [["a", 1, "/three", True, True], ["b", 1, "/one", True, True]], columns=columns
+    )
+    session_hits = pd.Series({"/one": 2, "/two": 1, "/three": 1})
+
+    merged = merge_shards(
+        [before.assign(sessionHits=0), after.assign(sessionHits=0)], session_hits
+    )
+
+    a = merged[merged["sessionId"] == "a"]
+    assert a["hitNumber"].tolist() == [1, 2, 3]
+    assert a["pagePath"].tolist() == ["/one", "/two", "/three"]
+    assert a["isEntrance"].tolist() == [True, None, None]
+    assert a["isExit"].tolist() == [None, None, True]
+
+    b = merged[merged["sessionId"] == "b"]
+    assert b[["hitNumber", "isEntrance", "isExit"]].values.tolist() == [[1, True, True]]
+    assert merged["sessionHits"].tolist() == [2, 1, 1, 2]
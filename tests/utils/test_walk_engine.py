@@ -0,0 +1,86 @@
+from unittest import mock
+
+import networkx as nx
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from src.utils import walk_engine
+
+
+def test_walk_backends_without_numba(functional_graph):
+    G, T = functional_graph
+    arrays = walk_engine.prepare(T)
+
+    with mock.patch.object(walk_engine, "numba_available", return_value=False):
+        with pytest.raises(ImportError, match="numba"):
+            walk_engine.walk(arrays, [0], 5, backend="numba")
+
+        np.testing.assert_array_equal(
+            walk_engine.walk(
+                arrays, [0, 1], 5, np.random.default_rng(0), backend="auto"
+            ),
+            walk_engine.walk(arrays, [0, 1], 5, np.random.default_rng(0)),
+        )
+
+    with pytest.raises(ValueError, match="backend"):
+        walk_engine.walk(arrays, [0], 5, backend="cuda")
+
+
+@pytest.fixture
+def chain():
+    """The walk arrays of a chain 0 -> 1 -> 2 -> 3, where page 3 has no out-edges."""
+    return walk_engine.prepare(csr_matrix(np.eye(4, k=1)))
+
+
+@pytest.mark.parametrize(
+    "dangling, path",
+    [
+        ("stop", [0, 1, 2, 3, -1, -1, -1, -1]),
+        ("restart", [0, 1, 2, 3, 0, 1, 2, 3]),
+    ],
+)
+def test_dangling_policies(chain, dangling, path):
+    paths = walk_engine.walk(chain, [0, 0], 7, dangling=dangling)
+
+    np.testing.assert_array_equal(paths, [path, path])
+
+
+def test_dangling_teleport(chain):
+    paths = walk_engine.walk(
+        chain, np.full(4000, 3), 1, np.random.default_rng(0), dangling="teleport"
+    )
+
+    frequencies = np.bincount(paths[:, 1], minlength=4) / 4000
+    np.testing.assert_allclose(frequencies, 0.25, atol=0.03)
+
+
+def test_restarts(chain):
+    paths = walk_engine.walk(
+        chain, np.zeros(4000, dtype=int), 3, np.random.default_rng(0), alpha=0.4
+    )
+
+    # every step follows the chain, or jumps back to the start
+    previous, current = paths[:, :-1], paths[:, 1:]
+    assert np.all((current == previous + 1) | (current == 0) | (current == -1))
+    np.testing.assert_allclose(np.mean(paths[:, 1] == 0), 0.4, atol=0.03)
+
+
+def test_dangling_policies_on_adjacency_matrix(page_graph):
+    arrays = walk_engine.prepare(nx.adjacency_matrix(page_graph, weight="edgeWeight"))
+    starts = np.repeat(np.arange(0, 200, 10), 20)
+
+    rng = np.random.default_rng(0)
+    stopped = {}
+    for dangling in walk_engine.DANGLING_POLICIES:
+        paths = walk_engine.walk(arrays, starts, 30, rng, dangling=dangling)
+        stopped[dangling] = bool(np.any(paths == walk_engine.STOPPED))
+
+    assert stopped == {"stop": True, "restart": False, "teleport": False}
+
+
+def test_walk_rejects_invalid_policies(chain):
+    with pytest.raises(ValueError, match="dangling"):
+        walk_engine.walk(chain, [0], 5, dangling="wait")
+    with pytest.raises(ValueError, match="alpha"):
+        walk_engine.walk(chain, [0], 5, alpha=1.0)
@@ -0,0 +1,45 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from src.utils import walk_engine
+from src.utils.randomwalks import repeat_random_walks
+
+pytest.importorskip("numba")
+
+
+@pytest.mark.parametrize("weighted", [True, False])
+@pytest.mark.parametrize("alpha", [0.0, 0.3])
+@pytest.mark.parametrize("dangling", ["stop", "restart", "teleport"])
+def test_numba_walks_match_numpy(page_graph, weighted, alpha, dangling):
+    A = nx.adjacency_matrix(page_graph, weight="edgeWeight")
+    arrays = walk_engine.prepare(A, weighted=weighted)
+    starts = np.repeat(np.arange(0, 200, 10), 5)
+
+    walks = {
+        backend: walk_engine.walk(
+            arrays,
+            starts,
+            20,
+            np.random.default_rng(0),
+            alpha=alpha,
+            dangling=dangling,
+            backend=backend,
+        )
+        for backend in ["numpy", "numba"]
+    }
+    np.testing.assert_array_equal(walks["numba"], walks["numpy"])
+
+
+def test_numba_random_walks_match_numpy(functional_graph):
+    G, T = functional_graph
+    seeds = ["/page-1", "/page-2"]
+    options = dict(verbose=0, random_state=0)
+
+    results = {
+        backend: repeat_random_walks(
+            10, 20, T, G, seeds, True, "union", 1, backend=backend, **options
+        )
+        for backend in ["numpy", "numba"]
+    }
+    assert results["numba"] == results["numpy"]
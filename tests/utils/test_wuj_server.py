@@ -0,0 +1,103 @@
+import asyncio
+import json
+import pickle
+
+import pytest
+
+from src.utils.wuj_server import WUJServer
+
+
+@pytest.fixture(scope="module")
+def server(functional_graph, tmp_path_factory):
+    G, _ = functional_graph
+    path = tmp_path_factory.mktemp("wuj_server") / "graph.gpickle"
+    with open(path, "wb") as f:
+        pickle.dump(G, f)
+
+    server = WUJServer(str(path), workers=2)
+    yield server
+    server.close()
+
+
+async def _request(port, method, path, body=None):
+    """Send one request, and read the response until the server closes it."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    content = b"" if body is None else json.dumps(body).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Length: {len(content)}\r\n\r\n".encode("latin-1") + content
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(content)
+
+
+def _run(server, *requests):
+    """Start the server on a free port, and send requests to it concurrently."""
+
+    async def main():
+        http = await server.start(port=0)
+        port = http.sockets[0].getsockname()[1]
+        async with http:
+            return await asyncio.wait_for(
+                asyncio.gather(*(_request(port, *request) for request in requests)),
+                timeout=60,
+            )
+
+    return asyncio.run(main())
+
+
+def test_workers_start_before_listening(server):
+    assert len(server.pool._processes) == server.pool._max_workers
+
+
+def test_health(server):
+    [(status, response)] = _run(server, ("GET", "/health"))
+    assert status == 200
+    assert response["nodes"] == server.n_nodes
+
+
+def test_queries_close_their_connections(server):
+    seeds = {"seed_pages": ["/page-1", "/page-2"]}
+    responses = _run(
+        server,
+        ("POST", "/walks", {**seeds, "steps": 10, "repeats": 10}),
+        ("POST", "/ppr", seeds),
+        ("POST", "/khop", seeds),
+    )
+
+    assert [status for status, _ in responses] == [200, 200, 200]
+    walks, ppr, khop = (response for _, response in responses)
+    assert walks["seeds"] == ppr["seeds"] == khop["seeds"] == seeds["seed_pages"]
+    assert walks["ranking"] and ppr["ranking"]
+    assert set(seeds["seed_pages"]) <= set(khop["pages"])
+
+
+def test_bad_requests(server):
+    responses = _run(
+        server,
+        ("POST", "/walks", {"seed_pages": "/page-1"}),
+        ("POST", "/ppr", {"pages": ["/page-1"]}),
+        ("GET", "/missing"),
+    )
+
+    assert [status for status, _ in responses] == [400, 400, 404]
+
+
+def test_evaluate(server):
+    true_pages = ["/page-1", "/page-2", "/page-3"]
+    responses = _run(
+        server,
+        ("POST", "/evaluate", {"seed_pages": ["/page-1"], "true_pages": true_pages}),
+        ("POST", "/evaluate", {"seed_pages": ["/missing"], "true_pages": true_pages}),
+    )
+
+    assert [status for status, _ in responses] == [200, 200]
+    (_, found), (_, missing) = responses
+    assert found["seeds"] == ["/page-1"]
+    assert found["scores"]
+    assert found["best"]["fscore"] == max(row["fscore"] for row in found["scores"])
+    assert missing == {"seeds": [], "scores": [], "best": None}